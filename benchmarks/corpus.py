@@ -0,0 +1,196 @@
+from __future__ import annotations
+
+import argparse
+import array
+import math
+import random
+import shutil
+import struct
+import subprocess
+import wave
+from pathlib import Path
+
+from PIL import Image
+
+
+# 生成器有改动（尺寸、数量、内容）时加一，旧语料自动作废重新生成
+CORPUS_VERSION = 1
+
+SEED = 20240601
+
+# (宽, 高)：小图、常见照片、大图各占一部分
+IMAGE_SIZES = [(640, 480), (1280, 720), (1920, 1080), (3000, 2000), (800, 800), (4000, 3000)]
+
+# (格式, 扩展名, 是否带透明)
+IMAGE_KINDS = [
+    ("JPEG", ".jpg", False),
+    ("PNG", ".png", False),
+    ("PNG", ".png", True),
+    ("WEBP", ".webp", False),
+    ("WEBP", ".webp", True),
+    ("TIFF", ".tif", True),
+]
+
+AUDIO_SECONDS = [2, 5, 15, 45]
+SAMPLE_RATE = 44100
+
+# scale=1 时各类文件的数量
+IMAGE_COUNT = 24
+AUDIO_COUNT = 8
+MIDI_COUNT = 16
+
+
+def _image(rng: random.Random, size: tuple[int, int], alpha: bool) -> Image.Image:
+    """渐变底图 + 一块噪声：既有易压缩的平滑区域，也有难压缩的细节。"""
+    w, h = size
+    r = Image.linear_gradient("L").resize(size)
+    g = Image.radial_gradient("L").resize(size)
+    b = r.rotate(rng.choice((90, 180, 270)), expand=False)
+    img = Image.merge("RGB", (r, g, b))
+
+    nw, nh = max(1, w // 4), max(1, h // 4)
+    noise = Image.frombytes("RGB", (nw, nh), rng.randbytes(nw * nh * 3))
+    img.paste(noise, (rng.randrange(0, w - nw + 1), rng.randrange(0, h - nh + 1)))
+
+    if alpha:
+        mask = Image.radial_gradient("L").resize(size)
+        img.putalpha(mask)
+    return img
+
+
+def _write_wav(path: Path, rng: random.Random, seconds: int, kind: str) -> None:
+    n = SAMPLE_RATE * seconds
+    freq = rng.choice((220.0, 440.0, 880.0))
+    samples = array.array("h")
+    if kind == "sine":
+        step = 2 * math.pi * freq / SAMPLE_RATE
+        for i in range(n):
+            v = int(12000 * math.sin(step * i))
+            samples.extend((v, v))
+    else:
+        # 噪声：用固定种子的随机字节，保证每次生成完全一致
+        samples.frombytes(rng.randbytes(n * 4))
+        for i in range(len(samples)):
+            samples[i] //= 4
+
+    with wave.open(str(path), "wb") as f:
+        f.setnchannels(2)
+        f.setsampwidth(2)
+        f.setframerate(SAMPLE_RATE)
+        f.writeframes(samples.tobytes())
+
+
+def _vlq(value: int) -> bytes:
+    out = [value & 0x7F]
+    value >>= 7
+    while value:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    return bytes(reversed(out))
+
+
+def _chunk(tag: bytes, data: bytes) -> bytes:
+    return tag + struct.pack(">I", len(data)) + data
+
+
+def _midi_bytes(rng: random.Random, bars: int, tracks: int) -> bytes:
+    """手写 SMF（格式 1，480 tick/四分音符）：时值带轻微抖动，夹杂很短的休止符，覆盖量化与去休止符路径。"""
+    division = 480
+    tempo = rng.choice((400000, 500000, 600000))
+
+    conductor = b"".join(
+        [
+            b"\x00\xff\x51\x03" + tempo.to_bytes(3, "big"),
+            b"\x00\xff\x58\x04\x04\x02\x18\x08",  # 4/4
+            b"\x00\xff\x2f\x00",
+        ]
+    )
+    chunks = [_chunk(b"MTrk", conductor)]
+
+    for t in range(tracks):
+        events = bytearray()
+        channel = t % 16
+        base = 48 + 12 * (t % 3)
+        pending = 0  # 距上一个事件的 tick
+        total = bars * 4 * division
+        now = 0
+        while now < total:
+            dur = rng.choice((120, 240, 480, 960)) + rng.randint(-15, 15)
+            note = base + rng.randint(0, 12)
+            events += _vlq(pending) + bytes((0x90 | channel, note, rng.randint(60, 110)))
+            events += _vlq(dur) + bytes((0x80 | channel, note, 0))
+            now += dur
+            # 偶尔插入很短的休止
+            pending = rng.choice((0, 0, 0, 10, 30, 240))
+            now += pending
+        events += b"\x00\xff\x2f\x00"
+        chunks.append(_chunk(b"MTrk", bytes(events)))
+
+    header = _chunk(b"MThd", struct.pack(">HHH", 1, len(chunks), division))
+    return header + b"".join(chunks)
+
+
+def _generate(root: Path, scale: int) -> None:
+    rng = random.Random(SEED)
+
+    img_dir = root / "images"
+    img_dir.mkdir(parents=True)
+    for i in range(IMAGE_COUNT * scale):
+        fmt, ext, alpha = IMAGE_KINDS[i % len(IMAGE_KINDS)]
+        # 错开尺寸与格式的组合，每种格式都有大小不同的图
+        size = IMAGE_SIZES[(i + i // len(IMAGE_KINDS)) % len(IMAGE_SIZES)]
+        img = _image(rng, size, alpha)
+        kwargs = {"quality": 90} if fmt in ("JPEG", "WEBP") else {}
+        img.save(img_dir / f"img_{i:03d}{ext}", format=fmt, **kwargs)
+
+    audio_dir = root / "audio"
+    audio_dir.mkdir(parents=True)
+    ffmpeg = shutil.which("ffmpeg")
+    for i in range(AUDIO_COUNT * scale):
+        seconds = AUDIO_SECONDS[i % len(AUDIO_SECONDS)]
+        kind = "sine" if i % 2 == 0 else "noise"
+        wav = audio_dir / f"aud_{i:03d}_{kind}_{seconds}s.wav"
+        _write_wav(wav, rng, seconds, kind)
+        # 一半转成 FLAC（需要 ffmpeg；没有时只保留 WAV）
+        if ffmpeg and i % 4 in (1, 2):
+            flac = wav.with_suffix(".flac")
+            subprocess.run(
+                [ffmpeg, "-y", "-hide_banner", "-loglevel", "error", "-i", str(wav), "-bitexact", str(flac)],
+                check=True,
+            )
+            wav.unlink()
+
+    midi_dir = root / "midi"
+    midi_dir.mkdir(parents=True)
+    for i in range(MIDI_COUNT * scale):
+        bars = (8, 16, 32, 64)[i % 4]
+        tracks = 1 + i % 4
+        (midi_dir / f"mid_{i:03d}.mid").write_bytes(_midi_bytes(rng, bars, tracks))
+
+
+def ensure_corpus(cache_dir: Path, scale: int = 1) -> Path:
+    """返回语料目录（images / audio / midi）；不存在时按固定种子生成，内容每次一致。"""
+    root = Path(cache_dir) / f"v{CORPUS_VERSION}_x{scale}"
+    if (root / ".complete").exists():
+        return root
+
+    tmp = root.with_name(root.name + ".tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    _generate(tmp, scale)
+    (tmp / ".complete").write_text("ok", encoding="utf-8")
+    shutil.rmtree(root, ignore_errors=True)
+    tmp.rename(root)
+    return root
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.corpus", description="生成基准测试语料")
+    parser.add_argument("--cache-dir", required=True)
+    parser.add_argument("--scale", type=int, default=1)
+    args = parser.parse_args(argv)
+    print(ensure_corpus(Path(args.cache_dir), max(1, args.scale)))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
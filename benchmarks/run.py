@@ -0,0 +1,334 @@
+from __future__ import annotations
+
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from .corpus import CORPUS_VERSION
+
+
+# 用法（仓库根目录）：
+#   uv run python -m benchmarks.run                       # 跑全部 task，与 benchmarks/baseline.json 对比
+#   uv run python -m benchmarks.run --update-baseline     # 把本次结果存为基线
+#   uv run python -m benchmarks.run --tasks image.resize --concurrency 1,2,4,8 --output out.json
+#   uv run python -m benchmarks.run --tasks image.resize_convert --encoder-profiles default,fastest,balanced,smallest
+#
+# 每个组合在独立子进程里执行 `python -m atmob_pillow run ...`，峰值内存与 CPU 时间只算这一组
+# （含进程池子进程与 ffmpeg）。基线只和同一台机器上的结果比较才有意义。
+#
+# 注意：Linux 上子进程 exec 后仍继承父进程的峰值 RSS，所以本进程要保持很小：
+# 语料也在子进程里生成，music21 等重量级模块只在最后读版本号时才导入。
+
+BENCH_DIR = Path(__file__).resolve().parent
+DEFAULT_BASELINE = BENCH_DIR / "baseline.json"
+DEFAULT_CACHE_DIR = BENCH_DIR / ".corpus"
+
+# task_id -> (语料子目录, task 参数)
+TASKS: dict[str, tuple[str, dict]] = {
+    "image.resize": ("images", {"target_w": 800}),
+    "image.convert": ("images", {"output_format": "webp", "quality": 85}),
+    "image.resize_convert": ("images", {"target_w": 800, "output_format": "jpg", "quality": 85}),
+    "audio.convert": ("audio", {"output_format": "mp3", "bitrate_kbps": 192}),
+    "midi.to_xml": ("midi", {"quantize_mode": "1/16", "remove_tiny_rests": True}),
+}
+
+
+def _split(raw: str) -> list[str]:
+    return [p.strip() for p in raw.split(",") if p.strip()]
+
+
+def _missing_dependency(task_id: str) -> str:
+    if task_id.startswith("audio.") and shutil.which("ffmpeg") is None:
+        return "未找到 ffmpeg"
+    if task_id.startswith("midi.") and importlib.util.find_spec("music21") is None:
+        return "未安装 music21"
+    return ""
+
+
+def _wait(proc: subprocess.Popen) -> tuple[float | None, float | None]:
+    """等待子进程结束，返回 (CPU 秒数, 峰值 RSS MB)；平台不支持 wait4 时为 None。"""
+    if not hasattr(os, "wait4"):
+        proc.wait()
+        return None, None
+
+    # wait4 的资源统计包含该进程已回收的子进程（进程池 worker、ffmpeg）
+    _, status, usage = os.wait4(proc.pid, 0)
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    cpu = usage.ru_utime + usage.ru_stime
+    # Linux 的 ru_maxrss 单位为 KB，macOS 为字节
+    rss = usage.ru_maxrss / (1 << 20) if sys.platform == "darwin" else usage.ru_maxrss / 1024
+    return cpu, rss
+
+
+def _run_case(
+    task_id: str, in_dir: Path, params: dict, concurrency: int, backend: str, encoder_profile: str = "default"
+) -> dict:
+    with tempfile.TemporaryDirectory(prefix="atmob_bench_") as out_dir:
+        cmd = [
+            sys.executable,
+            "-m",
+            "atmob_pillow",
+            "run",
+            task_id,
+            "--in",
+            str(in_dir),
+            "--out",
+            out_dir,
+            "--concurrency",
+            str(concurrency),
+            "--backend",
+            backend,
+            "--no-incremental",
+            "--params-json",
+            json.dumps(params),
+        ]
+        if task_id.startswith("image."):
+            cmd += ["--encoder-profile", encoder_profile]
+        start = time.perf_counter()
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+        stdout = proc.stdout.read()
+        proc.stdout.close()
+        cpu, rss = _wait(proc)
+        wall = time.perf_counter() - start
+
+    done = {}
+    for line in stdout.splitlines():
+        try:
+            event = json.loads(line)
+        except ValueError:
+            continue
+        if event.get("event") == "done":
+            done = event
+
+    stats = done.get("stats") or {}
+    per_file = stats.get("per_file") or {}
+    encode = (stats.get("stages") or {}).get("encode") or {}
+    return {
+        "task": task_id,
+        "backend": backend,
+        "concurrency": concurrency,
+        "encoder_profile": encoder_profile,
+        "exit_code": proc.returncode,
+        "files": stats.get("files", 0),
+        "failed": done.get("failed", 0),
+        # 吞吐按批处理本身的墙钟时间计算，不含解释器启动
+        "files_per_sec": stats.get("files_per_sec", 0.0),
+        "mb_per_sec": stats.get("mb_in_per_sec", 0.0),
+        "file_p50_seconds": per_file.get("p50", 0.0),
+        "file_p95_seconds": per_file.get("p95", 0.0),
+        "encode_seconds": encode.get("total", 0.0),
+        "bytes_out": stats.get("bytes_out", 0),
+        "wall_seconds": round(wall, 3),
+        "peak_rss_mb": round(rss, 1) if rss is not None else None,
+        # 可超过 100%：400% 表示平均占满 4 个核
+        "cpu_percent": round(cpu / wall * 100, 1) if cpu is not None and wall > 0 else None,
+    }
+
+
+def _best_of(runs: list[dict]) -> dict:
+    best = max(runs, key=lambda r: r["files_per_sec"])
+    if len(runs) > 1:
+        best = dict(best, repeats=len(runs))
+    return best
+
+
+def _key(result: dict) -> tuple:
+    # 旧基线没有 encoder_profile，视为 default
+    return result["task"], result["backend"], result["concurrency"], result.get("encoder_profile", "default")
+
+
+def profile_costs(results: list[dict]) -> list[dict]:
+    """同一 (task, backend, concurrency) 下各编码预设相对 default 的吞吐倍数、编码耗时与输出体积比例。"""
+    base = {_key(r)[:3]: r for r in results if r.get("encoder_profile", "default") == "default"}
+    rows = []
+    for r in results:
+        b = base.get(_key(r)[:3])
+        if b is None or r is b or not b.get("files_per_sec") or not b.get("bytes_out"):
+            continue
+        rows.append(
+            {
+                "task": r["task"],
+                "backend": r["backend"],
+                "concurrency": r["concurrency"],
+                "encoder_profile": r["encoder_profile"],
+                "speedup": round(r["files_per_sec"] / b["files_per_sec"], 3),
+                "encode_seconds": r["encode_seconds"],
+                "default_encode_seconds": b["encode_seconds"],
+                "size_ratio": round(r["bytes_out"] / b["bytes_out"], 4),
+            }
+        )
+    return rows
+
+
+def compare(results: list[dict], baseline: dict, tolerance: float) -> list[dict]:
+    """与基线按 (task, backend, concurrency, encoder_profile) 对比吞吐；ratio < 1 - tolerance 记为退化。"""
+    base = {_key(r): r for r in baseline.get("results", [])}
+    rows = []
+    for r in results:
+        b = base.get(_key(r))
+        if b is None or not b.get("files_per_sec"):
+            continue
+        ratio = r["files_per_sec"] / b["files_per_sec"]
+        rows.append(
+            {
+                "task": r["task"],
+                "backend": r["backend"],
+                "concurrency": r["concurrency"],
+                "encoder_profile": r.get("encoder_profile", "default"),
+                "baseline_files_per_sec": b["files_per_sec"],
+                "files_per_sec": r["files_per_sec"],
+                "ratio": round(ratio, 3),
+                "regressed": ratio < 1 - tolerance,
+            }
+        )
+    return rows
+
+
+def _environment() -> dict:
+    from PIL import __version__ as pillow_version
+
+    env = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "pillow": pillow_version,
+        "corpus_version": CORPUS_VERSION,
+    }
+    if importlib.util.find_spec("music21") is not None:
+        import music21
+
+        env["music21"] = str(music21.VERSION_STR)
+    ffmpeg = shutil.which("ffmpeg")
+    if ffmpeg:
+        out = subprocess.run([ffmpeg, "-version"], capture_output=True, text=True).stdout
+        env["ffmpeg"] = out.splitlines()[0] if out else ffmpeg
+    return env
+
+
+def _build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.run", description="批处理性能基准")
+    parser.add_argument("--tasks", default=",".join(TASKS), help="逗号分隔的 task id")
+    parser.add_argument("--concurrency", default="1,4", help="逗号分隔的并发数")
+    parser.add_argument("--backends", default="thread,process", help="逗号分隔的并发方式")
+    parser.add_argument(
+        "--encoder-profiles",
+        default="default",
+        help="逗号分隔的图片编码预设（见 processor.ENCODER_PROFILES），每个预设单独跑一遍并与 default 对比",
+    )
+    parser.add_argument("--scale", type=int, default=1, help="语料规模倍数（scale=1 约 50 个文件）")
+    parser.add_argument("--repeat", type=int, default=1, help="每个组合重复次数，取最快一次")
+    parser.add_argument("--cache-dir", default=str(DEFAULT_CACHE_DIR), help="语料缓存目录")
+    parser.add_argument("--output", default="", help="结果 JSON 写入该文件（默认输出到 stdout）")
+    parser.add_argument("--baseline", default=str(DEFAULT_BASELINE), help="对比的基线 JSON")
+    parser.add_argument("--update-baseline", action="store_true", help="把本次结果写入 --baseline")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="吞吐下降超过该比例记为退化")
+    return parser
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = _build_parser().parse_args(argv)
+
+    unknown = [t for t in _split(args.tasks) if t not in TASKS]
+    if unknown:
+        print(f"未知 task: {', '.join(unknown)}", file=sys.stderr)
+        return 2
+
+    print("准备语料…", file=sys.stderr)
+    corpus = Path(
+        subprocess.run(
+            [
+                sys.executable,
+                "-m",
+                "benchmarks.corpus",
+                "--cache-dir",
+                args.cache_dir,
+                "--scale",
+                str(max(1, args.scale)),
+            ],
+            check=True,
+            capture_output=True,
+            text=True,
+            cwd=BENCH_DIR.parent,
+        ).stdout.strip()
+    )
+
+    results: list[dict] = []
+    skipped: list[dict] = []
+    for task_id in _split(args.tasks):
+        reason = _missing_dependency(task_id)
+        if reason:
+            skipped.append({"task": task_id, "reason": reason})
+            print(f"跳过 {task_id}: {reason}", file=sys.stderr)
+            continue
+
+        sub_dir, params = TASKS[task_id]
+        # 编码预设只对图片 task 有意义
+        profiles = _split(args.encoder_profiles) if task_id.startswith("image.") else ["default"]
+        for concurrency in (int(c) for c in _split(args.concurrency)):
+            # 并发数为 1 时两种方式都是顺序执行，只跑一次
+            backends = ["thread"] if concurrency <= 1 else _split(args.backends)
+            for backend in backends:
+                for profile in profiles:
+                    runs = [
+                        _run_case(task_id, corpus / sub_dir, params, concurrency, backend, profile)
+                        for _ in range(max(1, args.repeat))
+                    ]
+                    result = _best_of(runs)
+                    results.append(result)
+                    print(
+                        f"{task_id:<22} {backend:<8} x{concurrency:<3} {profile:<9} "
+                        f"{result['files_per_sec']:>8.2f} 个/秒 {result['mb_per_sec']:>8.2f} MB/s "
+                        f"RSS {result['peak_rss_mb']} MB CPU {result['cpu_percent']}%",
+                        file=sys.stderr,
+                    )
+
+    report = {"environment": _environment(), "results": results, "skipped": skipped}
+
+    costs = profile_costs(results)
+    if costs:
+        report["encoder_profiles"] = costs
+        for row in costs:
+            print(
+                f"{row['task']:<22} {row['backend']:<8} x{row['concurrency']:<3} {row['encoder_profile']:<9} "
+                f"吞吐 {row['speedup']:.2f}x，编码 {row['default_encode_seconds']:.2f}s -> {row['encode_seconds']:.2f}s，"
+                f"体积 {(row['size_ratio'] - 1) * 100:+.1f}%（相对 default）",
+                file=sys.stderr,
+            )
+
+    exit_code = 0
+    baseline_path = Path(args.baseline)
+    if args.update_baseline:
+        baseline_path.write_text(json.dumps(report, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+        print(f"已写入基线: {baseline_path}", file=sys.stderr)
+    elif baseline_path.exists():
+        baseline = json.loads(baseline_path.read_text(encoding="utf-8"))
+        rows = compare(results, baseline, args.tolerance)
+        report["comparison"] = rows
+        for row in rows:
+            flag = "退化" if row["regressed"] else "ok"
+            print(
+                f"{row['task']:<22} {row['backend']:<8} x{row['concurrency']:<3} {row['encoder_profile']:<9} "
+                f"{row['baseline_files_per_sec']:>8.2f} -> {row['files_per_sec']:>8.2f} ({row['ratio']:.2f}) {flag}",
+                file=sys.stderr,
+            )
+        if any(row["regressed"] for row in rows):
+            exit_code = 1
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n", encoding="utf-8")
+    else:
+        print(text)
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
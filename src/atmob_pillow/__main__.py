@@ -1,7 +1,26 @@
 from __future__ import annotations
 
-from .main import main
+import multiprocessing
+import sys
 
 
-if __name__ == "__main__":
+def _main() -> None:
+    argv = sys.argv[1:]
+    if argv and argv[0] in ("run", "list", "-h", "--help"):
+        # 命令行模式：不 import Qt，无桌面环境也可运行
+        from .cli import main as cli_main
+
+        sys.exit(cli_main(argv))
+
+    from . import startup_timing
+
+    startup_timing.start()
+    from .main import main
+
     main()
+
+
+if __name__ == "__main__":
+    # 打包后的 exe 使用进程池时必须先调用（否则子进程会重新启动整个 GUI）
+    multiprocessing.freeze_support()
+    _main()
@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import os
+import time
+from dataclasses import dataclass
+from typing import Callable
+
+
+# 自动并发（并发数 = 0）：从 CPU 核数和 task 的资源类型出发，按滑动时间窗测吞吐（个/秒），
+# 逐步加减并发数（爬山法），找到吞吐最高的档位后停在那里。
+
+@dataclass(frozen=True)
+class ResourceProfile:
+    start_per_cpu: float  # 初始并发 = 核数 × 该系数
+    max_per_cpu: float  # 并发上限 = 核数 × 该系数
+
+
+# task.resource_profile 的取值：
+# - cpu：本进程内计算（Pillow / music21），超过核数基本没有收益
+# - subprocess：每个文件启动外部进程（ffmpeg），同时协调每个进程的 -threads
+# - io：以磁盘 / 网络读写为主，可以明显多于核数
+RESOURCE_PROFILES: dict[str, ResourceProfile] = {
+    "cpu": ResourceProfile(start_per_cpu=1.0, max_per_cpu=2.0),
+    "subprocess": ResourceProfile(start_per_cpu=1.0, max_per_cpu=2.0),
+    "io": ResourceProfile(start_per_cpu=2.0, max_per_cpu=8.0),
+}
+
+# 吞吐至少提高这么多才算“更快”，低于这个幅度视为噪声
+_GAIN = 0.05
+
+# 每个窗口至少持续的时间（秒）
+_WINDOW_SECONDS = 1.0
+
+# 稳定后吞吐跌到最佳值的这个比例以下（例如换成了大文件），重新开始搜索
+_RETUNE_RATIO = 0.5
+
+
+def profile_for(task) -> ResourceProfile:
+    return RESOURCE_PROFILES.get(getattr(task, "resource_profile", "cpu"), RESOURCE_PROFILES["cpu"])
+
+
+class AutoTuner:
+    """爬山法调整并发数：先往上加，吞吐不再明显提高就回到最佳档位往下试，两次掉头后固定。
+
+    只在执行线程内使用（非线程安全）。
+    """
+
+    def __init__(
+        self,
+        start: int,
+        max_level: int,
+        min_level: int = 1,
+        on_change: Callable[[int, int, float], None] | None = None,
+    ) -> None:
+        self.min_level = max(1, min_level)
+        self.max_level = max(self.min_level, max_level)
+        self.level = min(self.max_level, max(self.min_level, start))
+        self.settled = False
+        self._on_change = on_change
+
+        self._direction = 1
+        self._reversals = 0
+        self._best_tp = 0.0
+        self._best_level = self.level
+        self.reset_window()
+
+    @classmethod
+    def for_task(cls, task, max_concurrency: int, on_change=None) -> AutoTuner:
+        profile = profile_for(task)
+        cpus = os.cpu_count() or 1
+        max_level = min(max_concurrency, max(1, round(cpus * profile.max_per_cpu)))
+        start = max(1, round(cpus * profile.start_per_cpu))
+        return cls(start, max_level, on_change=on_change)
+
+    def reset_window(self) -> None:
+        """丢弃当前窗口（暂停恢复后、并发数刚变化时），避免把等待时间算进吞吐。"""
+        self._window_start = time.monotonic()
+        self._window_done = 0
+
+    def record(self, count: int = 1) -> bool:
+        """记录完成的文件数；窗口结束时调整并发数，变化时返回 True。"""
+        self._window_done += count
+        elapsed = time.monotonic() - self._window_start
+        # 窗口至少覆盖每个并发位完成一个文件，小文件也至少持续 _WINDOW_SECONDS
+        if elapsed < _WINDOW_SECONDS or self._window_done < max(3, self.level):
+            return False
+
+        tp = self._window_done / elapsed
+        self.reset_window()
+        return self._step(tp)
+
+    def _step(self, tp: float) -> bool:
+        if self.settled:
+            if tp >= self._best_tp * _RETUNE_RATIO:
+                return False
+            # 负载特征变了：以当前档位为起点重新搜索
+            self.settled = False
+            self._reversals = 0
+            self._direction = 1
+            self._best_tp = 0.0
+
+        # 往下走时吞吐持平也接受：同样快就用更少的并发
+        improved = tp > self._best_tp * (1 + _GAIN) or (self._direction < 0 and tp >= self._best_tp * (1 - _GAIN))
+        if improved:
+            self._best_tp = tp
+            self._best_level = self.level
+            nxt = self.level + self._direction * self._step_size()
+            if self.min_level <= nxt <= self.max_level:
+                return self._set(nxt, tp)
+        # 没有提升（或到了边界）：掉头，从最佳档位往另一侧试
+        self._reversals += 1
+        self._direction = -self._direction
+        nxt = self._best_level + self._direction * self._step_size(self._best_level)
+        if self._reversals >= 2 or not (self.min_level <= nxt <= self.max_level):
+            self.settled = True
+            return self._set(self._best_level, tp)
+        return self._set(nxt, tp)
+
+    def _step_size(self, level: int | None = None) -> int:
+        return max(1, round((level or self.level) * 0.25))
+
+    def _set(self, level: int, tp: float) -> bool:
+        if level == self.level:
+            return False
+        old, self.level = self.level, level
+        if self._on_change is not None:
+            self._on_change(old, level, tp)
+        return True
@@ -0,0 +1,300 @@
+from __future__ import annotations
+
+import argparse
+import json
+import signal
+import sys
+from pathlib import Path
+
+from .engine import (
+    AUTO_CONCURRENCY,
+    AUTO_MEMORY_BUDGET,
+    BACKENDS,
+    DEFAULT_INFLIGHT_FACTOR,
+    BatchRunner,
+    RunControl,
+    result_message,
+    result_ok,
+)
+from .pipeline import DEFAULT_QUEUE_DEPTH
+from .prefetch import DEFAULT_PREFETCH_MB
+from .processor import ENCODER_PROFILES, RESAMPLE_FILTERS, RESIZE_PRESETS
+from .tasks.registry import create_task, list_runnable_task_ids
+from .writer import DEFAULT_WRITE_BUFFER_MB, FSYNC_POLICIES
+
+
+# 注意：本模块不能 import PySide6，保证无桌面环境（渲染节点 / cron）也能运行
+
+_TRUE_VALUES = {"1", "true", "yes", "on"}
+
+
+def _task_defaults(task_id: str) -> dict:
+    task = create_task(task_id, {"active_task_id": task_id})
+    if task is None:
+        return {}
+    return {k: v for k, v in vars(task).items() if not k.startswith("_")}
+
+
+def _coerce(value: str, default):
+    """按 task 上默认值的类型转换命令行传入的字符串。"""
+    if isinstance(default, bool):
+        return value.strip().lower() in _TRUE_VALUES
+    if isinstance(default, int):
+        return int(value)
+    if isinstance(default, float):
+        return float(value)
+    return value
+
+
+def _concurrency(value: str) -> int:
+    if value.strip().lower() == "auto":
+        return AUTO_CONCURRENCY
+    return int(value)
+
+
+def _memory_budget(value: str) -> int:
+    raw = value.strip().lower()
+    if raw == "auto":
+        return AUTO_MEMORY_BUDGET
+    if raw in ("off", "none"):
+        return -1
+    return int(raw)
+
+
+def _parse_params(task_id: str, pairs: list[str], raw_json: str) -> dict:
+    defaults = _task_defaults(task_id)
+    params: dict = {}
+    if raw_json:
+        params.update(json.loads(raw_json))
+    for pair in pairs:
+        key, sep, value = pair.partition("=")
+        key = key.strip()
+        if not sep or not key:
+            raise ValueError(f"参数格式应为 key=value: {pair}")
+        params[key] = _coerce(value, defaults.get(key, ""))
+    return params
+
+
+def _build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="python -m atmob_pillow",
+        description="星檬-工具箱 命令行批处理（不依赖 Qt）",
+    )
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_run = sub.add_parser("run", help="批量处理一个文件夹（或单个文件）")
+    p_run.add_argument("task_id", help="task id，例如 image.resize_convert（用 list 查看）")
+    p_run.add_argument("--in", dest="input_dir", default="", help="输入文件夹")
+    p_run.add_argument("--file", dest="single_file", default="", help="只处理单个文件（忽略 --in）")
+    p_run.add_argument("--out", dest="output_dir", default="", help="输出文件夹（默认当前目录）")
+    p_run.add_argument("--recursive", action="store_true", help="包含子文件夹（输出保持相同的目录结构）")
+    p_run.add_argument(
+        "--no-incremental",
+        action="store_true",
+        help="关闭增量清单：回到“输出已存在即跳过”",
+    )
+    p_run.add_argument(
+        "--hash",
+        action="store_true",
+        help="增量清单额外记录输入内容哈希（仅修改时间变化的文件按内容判断）",
+    )
+    p_run.add_argument(
+        "--concurrency",
+        type=_concurrency,
+        default=1,
+        help="并发数；auto 或 0 为自动（按吞吐自动加减）",
+    )
+    p_run.add_argument("--backend", choices=BACKENDS, default="thread", help="并发方式")
+    p_run.add_argument(
+        "--inflight-factor",
+        type=int,
+        default=DEFAULT_INFLIGHT_FACTOR,
+        help="在途任务上限 = 该系数 × 并发数（控制内存占用）",
+    )
+    p_run.add_argument(
+        "--memory-budget",
+        type=_memory_budget,
+        default=AUTO_MEMORY_BUDGET,
+        metavar="MB",
+        help="图片 task 在途文件预计内存之和的上限（MB）；auto（默认）为物理内存的一半，off 不限制",
+    )
+    p_run.add_argument(
+        "--prefetch",
+        type=int,
+        default=0,
+        metavar="N",
+        help="输入在慢速 / 网络存储上时，提前读取后面 N 个文件（图片 / MIDI 读进内存，音频复制到本地临时目录）；0 关闭",
+    )
+    p_run.add_argument(
+        "--prefetch-mb",
+        type=int,
+        default=DEFAULT_PREFETCH_MB,
+        help="预读数据合计上限（MB）",
+    )
+    p_run.add_argument(
+        "--pipeline",
+        default="",
+        metavar="SPEC",
+        help="图片 task 按 decode / transform / encode 分段执行，各段单独设置 worker 数，"
+        "例如 decode=1,transform=1,encode=3:process（此时忽略 --concurrency / --backend）",
+    )
+    p_run.add_argument(
+        "--pipeline-queue",
+        type=int,
+        default=DEFAULT_QUEUE_DEPTH,
+        help="流水线每段输入队列的上限（文件数）",
+    )
+    p_run.add_argument(
+        "--fsync",
+        choices=FSYNC_POLICIES,
+        default="none",
+        help="输出改名为最终文件名前的 fsync：none（交给系统回写，默认）/ file（文件内容）/ full（再加所在目录）",
+    )
+    p_run.add_argument(
+        "--write-buffer-mb",
+        type=int,
+        default=DEFAULT_WRITE_BUFFER_MB,
+        help="已编码、等待写盘的数据合计上限（MB），超过后计算端暂停等写盘",
+    )
+    p_run.add_argument(
+        "--resize-mode",
+        choices=tuple(RESIZE_PRESETS),
+        default="",
+        help="缩放速度/质量预设：quality（完整解码）/ balanced / fast（缩略图）",
+    )
+    p_run.add_argument("--resample", choices=tuple(RESAMPLE_FILTERS), default="", help="重采样滤镜（默认跟随预设）")
+    p_run.add_argument(
+        "--encoder-profile",
+        choices=tuple(ENCODER_PROFILES),
+        default="",
+        help="图片编码速度/体积预设：default（原行为）/ fastest / balanced / smallest",
+    )
+    p_run.add_argument(
+        "--param",
+        action="append",
+        default=[],
+        metavar="KEY=VALUE",
+        help="task 参数，可重复，例如 --param target_w=300 --param output_format=webp",
+    )
+    p_run.add_argument("--params-json", default="", help="以 JSON 对象传入 task 参数")
+    p_run.add_argument(
+        "--format",
+        choices=("jsonl", "text"),
+        default="jsonl",
+        help="输出格式：jsonl（每行一个 JSON 事件，默认）或 text",
+    )
+
+    sub.add_parser("list", help="列出可用的 task 及其参数默认值")
+    return parser
+
+
+def _cmd_list() -> int:
+    for task_id in list_runnable_task_ids():
+        print(json.dumps({"task_id": task_id, "params": _task_defaults(task_id)}, ensure_ascii=False))
+    return 0
+
+
+def _cmd_run(args: argparse.Namespace) -> int:
+    if args.task_id not in list_runnable_task_ids():
+        print(f"未知 task: {args.task_id}", file=sys.stderr)
+        return 2
+
+    try:
+        params = _parse_params(args.task_id, args.param, args.params_json)
+    except ValueError as e:
+        print(str(e), file=sys.stderr)
+        return 2
+
+    if args.resize_mode:
+        params["resize_mode"] = args.resize_mode
+    if args.resample:
+        params["resample"] = args.resample
+    if args.encoder_profile:
+        params["encoder_profile"] = args.encoder_profile
+    params["concurrency"] = args.concurrency
+    params["backend"] = args.backend
+    params["recursive"] = args.recursive
+    params["inflight_factor"] = args.inflight_factor
+    params["memory_budget_mb"] = args.memory_budget
+    params["prefetch"] = args.prefetch
+    params["prefetch_mb"] = args.prefetch_mb
+    params["pipeline"] = args.pipeline
+    params["pipeline_queue"] = args.pipeline_queue
+    params["write_fsync"] = args.fsync
+    params["write_buffer_mb"] = args.write_buffer_mb
+    params["incremental"] = not args.no_incremental
+    params["manifest_hash"] = args.hash
+    if args.single_file:
+        params["image_mode"] = "single"
+        params["single_file"] = args.single_file
+    elif not args.input_dir:
+        print("请通过 --in 指定输入文件夹，或通过 --file 指定单个文件", file=sys.stderr)
+        return 2
+
+    output_dir = args.output_dir or str(Path.cwd())
+    as_json = args.format == "jsonl"
+
+    def emit(event: dict) -> None:
+        print(json.dumps(event, ensure_ascii=False), flush=True)
+
+    def on_log(msg: str) -> None:
+        if as_json:
+            emit({"event": "log", "message": msg})
+        else:
+            print(msg, flush=True)
+
+    def on_progress(processed: int, total: int) -> None:
+        if as_json:
+            emit({"event": "progress", "processed": processed, "total": total})
+
+    def on_result(result) -> None:
+        if not as_json:
+            print(result_message(result), flush=True)
+            return
+        output_path = getattr(result, "output_path", None)
+        emit(
+            {
+                "event": "result",
+                "success": result_ok(result),
+                "message": result_message(result),
+                "output_path": str(output_path) if output_path else None,
+            }
+        )
+
+    # Ctrl+C：第一次停止派发并等待在途文件完成，第二次立即终止；SIGTERM 直接终止
+    control = RunControl()
+    signal.signal(signal.SIGINT, lambda *_: control.cancel(force=control.cancelled))
+    if hasattr(signal, "SIGTERM"):
+        signal.signal(signal.SIGTERM, lambda *_: control.cancel(force=True))
+
+    runner = BatchRunner(
+        args.task_id,
+        params,
+        args.input_dir,
+        output_dir,
+        on_log=on_log,
+        on_progress=on_progress,
+        on_result=on_result,
+        control=control,
+    )
+    runner.run()
+
+    summary = runner.summary()
+    if as_json:
+        emit({"event": "done", **summary})
+    else:
+        print(f"完成: 成功 {summary['succeeded']} / 共 {summary['processed']}，失败 {summary['failed']}")
+    if summary["cancelled"]:
+        return 130
+    return 1 if summary["failed"] or summary["error"] else 0
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = _build_parser().parse_args(argv)
+    if args.command == "list":
+        return _cmd_list()
+    return _cmd_run(args)
+
+
+if __name__ == "__main__":  # pragma: no cover
+    sys.exit(main())
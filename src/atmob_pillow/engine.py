@@ -0,0 +1,1011 @@
+from __future__ import annotations
+
+import json
+import os
+import queue
+import signal
+import sqlite3
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Callable, Iterable, Iterator
+
+from . import pipeline, prefetch, writer
+from .autotune import AutoTuner
+from .manifest import Manifest
+from .pipeline import StageConfig, StageItem
+from .scan import iter_files
+from .stats import PipelineStats, RunStats
+from .tasks.common import TaskResult, result_output_paths
+from .tasks.registry import create_task
+
+
+# 执行后端：
+# - thread：线程池。适合 ffmpeg 这类子进程任务，或以磁盘 IO 为主的任务
+# - process：进程池。适合 music21 / Pillow 编解码这类 CPU 密集任务，可绕开 GIL
+BACKENDS = ("thread", "process")
+
+# 进程池每批默认携带的文件数（批越大 IPC 次数越少，但尾部负载越不均衡）
+DEFAULT_CHUNK_SIZE = 8
+
+# 在途任务上限 = INFLIGHT_FACTOR × 并发数：扫描器只在有空位时才继续往下读，
+# 无论目录多大，内存里的 Future / 路径数量都保持恒定
+DEFAULT_INFLIGHT_FACTOR = 4
+
+# 并发数上限；0 表示自动（见 autotune）
+MAX_CONCURRENCY = 128
+AUTO_CONCURRENCY = 0
+
+# 内存预算（MB）：task 提供 estimate_memory(path) 时，在途文件的预计占用之和不超过预算；
+# 0 表示自动（物理内存的一半），负数表示不限制
+AUTO_MEMORY_BUDGET = 0
+
+Job = tuple[Path, Path]  # (输入文件, 输出目录)
+
+# 等待结果时的轮询间隔：保证暂停/取消在这个时间内生效
+_POLL_INTERVAL = 0.2
+
+
+class RunControl:
+    """批处理的取消 / 暂停开关，GUI 线程与执行线程共用（线程安全）。
+
+    - pause()：不再派发新文件，在途的照常完成；resume() 从原位置继续，不重新扫描
+    - cancel()：不再派发新文件，丢弃排队中的，等待在途的完成后结束
+    - cancel(force=True)：同上，并立即终止在途任务（ffmpeg 子进程、进程池子进程）
+    """
+
+    def __init__(self) -> None:
+        self._cancel = threading.Event()
+        self._resume = threading.Event()
+        self._resume.set()
+        self._lock = threading.Lock()
+        self._force_hooks: list[Callable[[], None]] = []
+        self.force = False
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    @property
+    def paused(self) -> bool:
+        return not self._resume.is_set()
+
+    def pause(self) -> None:
+        if not self.cancelled:
+            self._resume.clear()
+
+    def resume(self) -> None:
+        self._resume.set()
+
+    def cancel(self, force: bool = False) -> None:
+        self._cancel.set()
+        self._resume.set()
+        if not force:
+            return
+        with self._lock:
+            self.force = True
+            hooks = list(self._force_hooks)
+        for hook in hooks:
+            try:
+                hook()
+            except Exception:
+                pass
+
+    def on_force(self, hook: Callable[[], None]) -> None:
+        """注册强制取消时执行的回调；已经强制取消时立即执行。"""
+        with self._lock:
+            self._force_hooks.append(hook)
+            forced = self.force
+        if forced:
+            hook()
+
+    def wait_while_paused(self) -> None:
+        self._resume.wait()
+
+
+def physical_memory() -> int:
+    """物理内存总量（字节）；无法获取时返回 0。"""
+    if os.name == "nt":
+        import ctypes
+
+        class MemoryStatusEx(ctypes.Structure):
+            _fields_ = [
+                ("dwLength", ctypes.c_ulong),
+                ("dwMemoryLoad", ctypes.c_ulong),
+                ("ullTotalPhys", ctypes.c_ulonglong),
+                ("ullAvailPhys", ctypes.c_ulonglong),
+                ("ullTotalPageFile", ctypes.c_ulonglong),
+                ("ullAvailPageFile", ctypes.c_ulonglong),
+                ("ullTotalVirtual", ctypes.c_ulonglong),
+                ("ullAvailVirtual", ctypes.c_ulonglong),
+                ("ullAvailExtendedVirtual", ctypes.c_ulonglong),
+            ]
+
+        status = MemoryStatusEx()
+        status.dwLength = ctypes.sizeof(MemoryStatusEx)
+        if ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status)):
+            return int(status.ullTotalPhys)
+        return 0
+    try:
+        return int(os.sysconf("SC_PAGE_SIZE")) * int(os.sysconf("SC_PHYS_PAGES"))
+    except (AttributeError, OSError, ValueError):
+        return 0
+
+
+def memory_budget_bytes(budget_mb) -> int:
+    """把 memory_budget_mb 参数换算成字节；0 表示不限制。"""
+    mb = int(AUTO_MEMORY_BUDGET if budget_mb in (None, "") else budget_mb)
+    if mb < 0:
+        return 0
+    if mb == AUTO_MEMORY_BUDGET:
+        return physical_memory() // 2
+    return mb * 1024 * 1024
+
+
+def _estimate_memory(estimate: Callable[[Path], int], p: Path) -> int:
+    try:
+        return max(0, int(estimate(p)))
+    except Exception:
+        # 读不了文件头：交给 process_one 报告失败，这里按 0 计
+        return 0
+
+
+def _terminate_workers(executor: ProcessPoolExecutor) -> None:
+    terminate = getattr(executor, "terminate_workers", None)  # Python 3.14+
+    if terminate is not None:
+        terminate()
+        return
+    for proc in list((getattr(executor, "_processes", None) or {}).values()):
+        proc.terminate()
+
+
+def build_task(task_id: str, params: dict):
+    """创建 task，并把参数塞到 task 对象上。
+
+    Worker 与进程池子进程共用这一份逻辑，保证两边拿到的 task 完全一致。
+    """
+
+    task = create_task(task_id, params)
+    if task is None:
+        return None
+
+    for k, v in params.items():
+        if hasattr(task, k):
+            setattr(task, k, v)
+    return task
+
+
+def result_message(result) -> str:
+    return getattr(result, "message", str(result))
+
+
+def run_one(task, p: Path, out_dir: Path):
+    """执行单个文件；异常转成失败信息，不中断整批。"""
+    try:
+        return task.process_one(p, out_dir)
+    except Exception as e:
+        return f"失败: {p.name} ({e})"
+    finally:
+        prefetch.discard(p)
+
+
+def _run_batch(task, batch: list[Job]) -> list:
+    return [run_one(task, p, out_dir) for p, out_dir in batch]
+
+
+# ---- 进程池：子进程内同一组 task_id + params 的 task 只创建一次 ----
+
+_proc_tasks: dict[str, object] = {}
+
+# 子进程内最多缓存的 task 数（常驻进程池会跨批次收到不同参数）
+_PROC_TASK_CACHE_SIZE = 8
+
+
+def _task_key(task_id: str, params: dict) -> str:
+    return json.dumps([task_id, params], sort_keys=True, default=str)
+
+
+def _proc_task(task_id: str, params: dict):
+    key = _task_key(task_id, params)
+    task = _proc_tasks.get(key)
+    if task is None:
+        if len(_proc_tasks) >= _PROC_TASK_CACHE_SIZE:
+            _proc_tasks.clear()
+        task = _proc_tasks[key] = build_task(task_id, params)
+    return task
+
+
+def _on_terminate(signum, _frame) -> None:
+    """进程池子进程收到 SIGTERM（强制取消，见 _terminate_workers）。
+
+    task 能取消（例如 ffmpeg 子进程）时让它终止自己的子进程：当前文件随即以“已取消”结束并清理临时文件，
+    之后的文件直接返回取消，进程随进程池关闭退出。没有可取消的 task 时按默认方式立即退出。
+    """
+    cancels = [cancel for task in list(_proc_tasks.values()) if callable(cancel := getattr(task, "cancel", None))]
+    for cancel in cancels:
+        cancel()
+    if not cancels:
+        signal.signal(signum, signal.SIG_DFL)
+        os.kill(os.getpid(), signum)
+
+
+def _init_process(task_id: str, params: dict) -> None:
+    if hasattr(signal, "SIGTERM"):
+        signal.signal(signal.SIGTERM, _on_terminate)
+    task = _proc_task(task_id, params)
+    # 一次性准备（导入重量级依赖、固定运行环境），之后每个文件直接复用
+    warm_up = getattr(task, "warm_up", None)
+    if callable(warm_up):
+        warm_up()
+
+
+def _run_chunk(
+    task_id: str, params: dict, batch: list[Job], payloads: dict | None = None, parallelism: int = 0
+) -> list:
+    # 主进程预读的数据随任务一起发过来
+    for p, payload in (payloads or {}).items():
+        prefetch.put(p, payload)
+    task = _proc_task(task_id, params)
+    # set_parallelism 只在主进程的 task 上调用过：子进程的 task 随每批拿到当前并发数（自动并发会变）
+    set_parallelism = getattr(task, "set_parallelism", None)
+    if parallelism > 0 and callable(set_parallelism):
+        set_parallelism(parallelism)
+    return _run_batch(task, batch)
+
+
+# ---- 常驻进程池：有 warm_up 的 task（启动代价高）跨批次复用同一个进程池 ----
+
+_pools: dict[str, tuple[ProcessPoolExecutor, int]] = {}  # task_id -> (进程池, 进程数)
+_pools_lock = threading.Lock()
+
+
+def _shared_pool(task_id: str, params: dict, workers: int) -> ProcessPoolExecutor:
+    """取出 task_id 对应的常驻进程池；进程数不同或进程池已损坏时重建。"""
+    with _pools_lock:
+        entry = _pools.get(task_id)
+        if entry is not None:
+            pool, n = entry
+            if n == workers and not getattr(pool, "_broken", False):
+                return pool
+            pool.shutdown(wait=False, cancel_futures=True)
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_process, initargs=(task_id, params))
+        _pools[task_id] = (pool, workers)
+        return pool
+
+
+def _discard_pool(task_id: str, pool: ProcessPoolExecutor) -> None:
+    with _pools_lock:
+        entry = _pools.get(task_id)
+        if entry is not None and entry[0] is pool:
+            del _pools[task_id]
+
+
+def shutdown_worker_pools() -> None:
+    """关闭所有常驻进程池（GUI 退出时调用；命令行进程退出时会自动回收）。"""
+    with _pools_lock:
+        pools = [pool for pool, _ in _pools.values()]
+        _pools.clear()
+    for pool in pools:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def iter_results(
+    task_id: str,
+    params: dict,
+    task,
+    jobs: Iterable[Job],
+    concurrency: int,
+    backend: str = "thread",
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    inflight_factor: int = DEFAULT_INFLIGHT_FACTOR,
+    control: RunControl | None = None,
+    on_log: Callable[[str], None] | None = None,
+    memory_budget: int = 0,
+    prefetch_ahead: int = 0,
+    prefetch_budget: int = prefetch.DEFAULT_PREFETCH_MB * 1024 * 1024,
+) -> Iterator:
+    """按完成顺序逐个产出 (输入文件, 处理结果)，结果为 TaskResult 或失败信息字符串。
+
+    jobs 可以是流式生成器（例如边扫描边产出），拿到第一个文件就开始处理。
+    已提交未完成的文件数不超过 inflight_factor × concurrency（线程/进程一致），
+    达到上限时暂停读取 jobs，等有结果回来再补位。
+    control 用于暂停 / 取消：被取消而未执行的文件不会产出结果。
+
+    - concurrency<=1：在当前线程顺序执行
+    - concurrency=0（AUTO_CONCURRENCY）：自动并发，池按上限创建，AutoTuner 控制同时执行的文件数；
+      此时逐个提交（不攒批），在途文件数就是实际并发数
+    - thread：线程池，直接复用传入的 task
+    - process：进程池，子进程按 task_id + params 重新创建 task；
+      有空闲进程时单个提交，进程都忙时攒满 chunk_size 个再提交，以降低 IPC 开销
+      task 提供 warm_up() 时进程池常驻，每个进程只预热一次，同一会话内的后续批次直接复用
+
+    task 可以提供 set_parallelism(n)：并发数确定或变化时调用（例如据此设置 ffmpeg 的 -threads）。
+
+    memory_budget（字节，0 为不限制）：task 提供 estimate_memory(path) 时，派发前先估算每个文件的内存峰值，
+    在途文件的预计占用之和不超过预算（进程池一批内的文件依次处理，按其中最大的计）；
+    小文件照常满并发，大文件自动减少同时处理的个数，单个文件超出预算时等在途文件完成后单独处理。
+
+    prefetch_ahead>0 且 task 声明了 input_prefetch 时，IO 线程池提前读取后面 prefetch_ahead 个输入
+    （读进内存或复制到本地临时目录，见 prefetch），预读数据合计不超过 prefetch_budget 字节；
+    进程池此时逐个提交，预读数据随任务发给子进程。
+
+    结果可能带有尚未写盘的 outputs（编码好的内容，见 TaskResult.outputs），交给 writer.write_behind 落盘。
+    """
+
+    control = control or RunControl()
+    log = on_log or (lambda _msg: None)
+    set_parallelism = getattr(task, "set_parallelism", None)
+    if not callable(set_parallelism):
+        set_parallelism = None
+    parallelism = 0  # 当前并发数，进程池随每批发给子进程的 task
+
+    tuner: AutoTuner | None = None
+    if concurrency == AUTO_CONCURRENCY:
+
+        def on_change(old: int, new: int, tp: float) -> None:
+            nonlocal parallelism
+            parallelism = new
+            if set_parallelism is not None:
+                set_parallelism(new)
+            settled = "，已稳定" if tuner is not None and tuner.settled else ""
+            log(f"自动并发: {old} -> {new}（上一窗口 {tp:.2f} 个/秒{settled}）")
+
+        tuner = AutoTuner.for_task(task, MAX_CONCURRENCY, on_change=on_change)
+        concurrency = tuner.max_level
+        log(f"自动并发: 从 {tuner.level} 开始（上限 {tuner.max_level}）")
+
+    parallelism = tuner.level if tuner is not None else max(1, concurrency)
+    if set_parallelism is not None:
+        set_parallelism(parallelism)
+
+    # 强制取消：让 task 终止自己启动的子进程（例如 ffmpeg）
+    task_cancel = getattr(task, "cancel", None)
+    if callable(task_cancel):
+        control.on_force(task_cancel)
+
+    estimate = getattr(task, "estimate_memory", None) if memory_budget > 0 else None
+    if not callable(estimate):
+        estimate = None
+
+    prefetcher: prefetch.Prefetcher | None = None
+    mode = getattr(task, "input_prefetch", "")
+    if prefetch_ahead > 0 and mode in prefetch.PREFETCH_MODES:
+        prefetcher = prefetch.Prefetcher(mode, prefetch_ahead, prefetch_budget)
+        jobs = prefetcher.iter(jobs)
+        where = "内存" if mode == "memory" else "本地临时目录"
+        log(f"预读: 提前读取 {prefetch_ahead} 个文件到{where}（上限 {prefetch_budget // 2**20} MB）")
+
+    def close_prefetch() -> None:
+        if prefetcher is not None:
+            prefetcher.close()
+            log(f"预读: 共 {prefetcher.files} 个文件，{prefetcher.bytes_read / 2**20:.1f} MB")
+
+    if tuner is None and concurrency <= 1:
+        try:
+            for p, out_dir in jobs:
+                control.wait_while_paused()
+                if control.cancelled:
+                    return
+                result = run_one(task, p, out_dir)
+                if prefetcher is not None:
+                    prefetcher.release(p)
+                yield p, result
+        finally:
+            close_prefetch()
+        return
+
+    shared = False
+    if backend == "process":
+        shared = callable(getattr(task, "warm_up", None))
+        if shared:
+            executor = _shared_pool(task_id, params, concurrency)
+        else:
+            executor = ProcessPoolExecutor(
+                max_workers=concurrency,
+                initializer=_init_process,
+                initargs=(task_id, params),
+            )
+        size = max(1, int(chunk_size))
+
+        def force_stop() -> None:
+            # 被终止的常驻进程池不能再用，下次运行重建
+            if shared:
+                _discard_pool(task_id, executor)
+            _terminate_workers(executor)
+
+        control.on_force(force_stop)
+
+        def submit(batch: list[Job]):
+            payloads = None
+            if prefetcher is not None:
+                payloads = {p: payload for p, _ in batch if (payload := prefetch.take(p)) is not None}
+            return executor.submit(_run_chunk, task_id, params, batch, payloads, parallelism)
+
+    else:
+        executor = ThreadPoolExecutor(max_workers=concurrency)
+        size = 1
+
+        def submit(batch: list[Job]):
+            return executor.submit(_run_batch, task, batch)
+
+    if tuner is not None or prefetcher is not None:
+        size = 1
+
+    limit = max(concurrency, int(inflight_factor) * concurrency)
+    done: queue.SimpleQueue = queue.SimpleQueue()
+    in_flight: dict = {}  # future -> batch
+    in_flight_jobs = 0
+    in_flight_memory: dict = {}  # future -> 预计内存（字节）
+    memory_in_use = 0
+    batch: list[Job] = []  # 攒批中（尚未提交）的文件
+    batch_memory = 0
+
+    def dispatch() -> None:
+        nonlocal batch, in_flight_jobs, batch_memory, memory_in_use
+        fut = submit(batch)
+        in_flight[fut] = batch
+        in_flight_jobs += len(batch)
+        in_flight_memory[fut] = batch_memory
+        memory_in_use += batch_memory
+        if prefetcher is not None:
+            # 处理完（或被撤销）就释放预读额度：预读可能正等着它
+            def release(_fut, paths=[p for p, _ in batch]) -> None:
+                for path in paths:
+                    prefetcher.release(path)
+
+            fut.add_done_callback(release)
+        batch = []
+        batch_memory = 0
+        fut.add_done_callback(done.put)
+
+    def can_dispatch() -> bool:
+        return not control.paused and not control.cancelled
+
+    def collect() -> list[tuple[Path, object]]:
+        nonlocal in_flight_jobs, memory_in_use
+        try:
+            fut = done.get(timeout=_POLL_INTERVAL)
+        except queue.Empty:
+            return []
+        finished = in_flight.pop(fut)
+        in_flight_jobs -= len(finished)
+        memory_in_use -= in_flight_memory.pop(fut, 0)
+        if tuner is not None and not control.paused:
+            tuner.record(len(finished))
+        if fut.cancelled():
+            results = []
+        else:
+            try:
+                results = list(zip((p for p, _ in finished), fut.result()))
+            except Exception as e:  # 子进程异常退出等：整批记为失败
+                # 强制取消时进程池被终止，这批视为已取消
+                results = [] if control.cancelled else [(p, f"失败: {p.name} ({e})") for p, _ in finished]
+        # 有 worker 空出来了：攒了一半的批直接提交，不等扫描器
+        if batch and len(in_flight) < concurrency and can_dispatch():
+            dispatch()
+        return results
+
+    try:
+        for job in jobs:
+            # 自动并发：在途文件数达到当前档位时先等空位
+            while tuner is not None and in_flight and len(in_flight) >= tuner.level and not control.cancelled:
+                yield from collect()
+
+            # 暂停：不再派发新文件（也不再读扫描器），但继续回收在途结果
+            if control.paused:
+                while control.paused and not control.cancelled:
+                    if in_flight:
+                        yield from collect()
+                    else:
+                        control.wait_while_paused()
+                if tuner is not None:
+                    # 暂停期间不计入吞吐
+                    tuner.reset_window()
+            if control.cancelled:
+                break
+
+            if estimate is not None:
+                need = _estimate_memory(estimate, job[0])
+                # 加入后超出预算：先等在途文件完成腾出内存（一个都不在途时直接派发）
+                while in_flight and memory_in_use + max(batch_memory, need) > memory_budget and not control.cancelled:
+                    yield from collect()
+                if control.cancelled:
+                    break
+                if need > memory_budget:
+                    log(f"内存预算: {job[0].name} 预计占用 {need / 2**20:.0f} MB，超过预算，单独处理")
+                batch_memory = max(batch_memory, need)
+
+            batch.append(job)
+            if len(batch) >= size or len(in_flight) < concurrency:
+                dispatch()
+
+            # 边提交边回收已完成的结果
+            while not done.empty():
+                yield from collect()
+
+            # 背压：在途已满则阻塞等待，暂不读取下一个文件
+            while in_flight and in_flight_jobs + len(batch) >= limit and not control.cancelled:
+                yield from collect()
+
+        if control.cancelled:
+            # 丢弃攒批中的，撤销尚未开始的；已经在跑的等它结束（强制取消时已被终止）
+            batch = []
+            for fut in list(in_flight):
+                fut.cancel()
+        elif batch:
+            dispatch()
+
+        while in_flight:
+            yield from collect()
+    finally:
+        if shared:
+            # 常驻进程池留给下一批：只撤销本批未开始的，等已在跑的结束
+            for fut in list(in_flight):
+                fut.cancel()
+            wait(list(in_flight))
+        else:
+            executor.shutdown(wait=True, cancel_futures=True)
+        close_prefetch()
+
+
+# ---- 分阶段流水线（见 pipeline）：decode / transform / encode 各用自己的 worker 池 ----
+
+
+def _run_stage_local(task, stage: str, item: StageItem) -> tuple[StageItem, TaskResult | None]:
+    return item, pipeline.run_stage(task, stage, item)
+
+
+def _run_stage_proc(
+    task_id: str, params: dict, stage: str, item: StageItem, payload: bytes | Path | None = None
+) -> tuple[StageItem, TaskResult | None]:
+    # 进程段：item（含已解码的图片）pickle 过来，处理完连同中间结果一起传回
+    if payload is not None:
+        prefetch.put(item.input_path, payload)
+    try:
+        return item, pipeline.run_stage(_proc_task(task_id, params), stage, item)
+    finally:
+        if payload is not None:
+            prefetch.discard(item.input_path)
+
+
+def iter_pipeline(
+    task_id: str,
+    params: dict,
+    task,
+    jobs: Iterable[Job],
+    stages: dict[str, StageConfig],
+    queue_depth: int = pipeline.DEFAULT_QUEUE_DEPTH,
+    control: RunControl | None = None,
+    on_log: Callable[[str], None] | None = None,
+    memory_budget: int = 0,
+    prefetch_ahead: int = 0,
+    prefetch_budget: int = prefetch.DEFAULT_PREFETCH_MB * 1024 * 1024,
+    metrics: PipelineStats | None = None,
+) -> Iterator:
+    """与 iter_results 相同的产出，但把每个文件拆成 PIPELINE_STAGES 各段，交给各段自己的 worker 池。
+
+    task 须支持流水线（pipeline.supports_pipeline）。stages 为各段的 worker 数与线程 / 进程，
+    每段的输入队列最多 queue_depth 个文件：下游队列满时上游不再开始新的文件，队列之间不会无限堆积。
+    在途文件 = 各段 worker + 各段队列，不另设 inflight 上限。
+
+    memory_budget / prefetch_ahead 同 iter_results：预计内存在文件进入流水线时计入、产出结果时扣除；
+    预读数据在 decode 段完成后即释放。metrics 记录各段利用率与队列深度。
+    """
+
+    control = control or RunControl()
+    log = on_log or (lambda _msg: None)
+    names = pipeline.PIPELINE_STAGES
+    depth_limit = max(1, int(queue_depth))
+
+    set_parallelism = getattr(task, "set_parallelism", None)
+    if callable(set_parallelism):
+        set_parallelism(sum(cfg.workers for cfg in stages.values()))
+
+    estimate = getattr(task, "estimate_memory", None) if memory_budget > 0 else None
+    if not callable(estimate):
+        estimate = None
+
+    prefetcher: prefetch.Prefetcher | None = None
+    mode = getattr(task, "input_prefetch", "")
+    if prefetch_ahead > 0 and mode in prefetch.PREFETCH_MODES:
+        prefetcher = prefetch.Prefetcher(mode, prefetch_ahead, prefetch_budget)
+        jobs = prefetcher.iter(jobs)
+        log(f"预读: 提前读取 {prefetch_ahead} 个文件（上限 {prefetch_budget // 2**20} MB）")
+
+    executors: dict[str, ThreadPoolExecutor | ProcessPoolExecutor] = {}
+    for name in names:
+        cfg = stages[name]
+        if cfg.backend == "process":
+            executor = ProcessPoolExecutor(max_workers=cfg.workers, initializer=_init_process, initargs=(task_id, params))
+            control.on_force(lambda executor=executor: _terminate_workers(executor))
+        else:
+            executor = ThreadPoolExecutor(max_workers=cfg.workers, thread_name_prefix=f"stage-{name}")
+        executors[name] = executor
+
+    waiting: dict[str, deque[StageItem]] = {name: deque() for name in names}  # 各段的输入队列
+    running = {name: 0 for name in names}
+    in_flight: dict = {}  # future -> (段名, item, 开始时间)
+    done: queue.SimpleQueue = queue.SimpleQueue()
+    memory: dict[Path, int] = {}  # 流水线中的文件 -> 预计内存
+    memory_in_use = 0
+    held: Job | None = None  # 内存预算不足、等待进入流水线的文件
+    jobs_iter = iter(jobs)
+    exhausted = False
+
+    def sample() -> None:
+        if metrics is not None:
+            metrics.queue_depths({name: len(q) for name, q in waiting.items()})
+
+    def leave(path: Path) -> None:
+        nonlocal memory_in_use
+        memory_in_use -= memory.pop(path, 0)
+        if prefetcher is not None:
+            prefetcher.release(path)
+
+    def start_ready() -> None:
+        # 从下游往上游启动：先腾出下游的队列，上游才能开始新的文件
+        for i in range(len(names) - 1, -1, -1):
+            name = names[i]
+            cfg = stages[name]
+            downstream = waiting[names[i + 1]] if i + 1 < len(names) else None
+            while waiting[name] and running[name] < cfg.workers:
+                # 为正在处理的文件在下游队列预留位置
+                if downstream is not None and len(downstream) + running[name] >= depth_limit:
+                    break
+                item = waiting[name].popleft()
+                if cfg.backend == "process":
+                    payload = prefetch.take(item.input_path) if prefetcher is not None and i == 0 else None
+                    fut = executors[name].submit(_run_stage_proc, task_id, params, name, item, payload)
+                else:
+                    fut = executors[name].submit(_run_stage_local, task, name, item)
+                running[name] += 1
+                in_flight[fut] = (name, item, time.perf_counter())
+                if prefetcher is not None and i == 0:
+                    # decode 段结束（或被撤销）就释放预读额度：本线程可能正在 admit 里等它
+                    fut.add_done_callback(lambda _fut, path=item.input_path: prefetcher.release(path))
+                fut.add_done_callback(done.put)
+        sample()
+
+    def collect() -> list[tuple[Path, object]]:
+        try:
+            futures = [done.get(timeout=_POLL_INTERVAL)]
+        except queue.Empty:
+            return []
+        while not done.empty():
+            futures.append(done.get())
+
+        results = []
+        for fut in futures:
+            name, item, started = in_flight.pop(fut)
+            running[name] -= 1
+            path = item.input_path
+            if metrics is not None:
+                metrics.stage_done(name, time.perf_counter() - started)
+            if fut.cancelled():
+                leave(path)
+                continue
+            try:
+                item, result = fut.result()
+            except Exception as e:  # 子进程异常退出等
+                # 强制取消时进程池被终止，视为已取消
+                leave(path)
+                if not control.cancelled:
+                    results.append((path, f"失败: {path.name} ({e})"))
+                continue
+            if result is not None:
+                leave(path)
+                results.append((path, result))
+            elif name == names[-1]:
+                leave(path)
+                results.append((path, f"失败: {path.name} (encode 段没有返回结果)"))
+            elif control.cancelled:
+                leave(path)
+            else:
+                waiting[names[names.index(name) + 1]].append(item)
+        start_ready()
+        return results
+
+    def admit() -> bool:
+        """让下一个文件进入 decode 队列；没有可进入的（扫描结束、队列满、等内存）时返回 False。"""
+        nonlocal held, exhausted, memory_in_use
+        if control.paused or control.cancelled or len(waiting[names[0]]) >= depth_limit:
+            return False
+        if held is None:
+            if exhausted:
+                return False
+            if prefetcher is not None and in_flight and prefetcher.full():
+                # 预读额度已满时取下一个文件会在预读里等额度；先回收在途结果、启动排队中的 decode
+                return False
+            job = next(jobs_iter, None)
+            if job is None:
+                exhausted = True
+                return False
+            held = job
+        p, out_dir = held
+        need = _estimate_memory(estimate, p) if estimate is not None else 0
+        if memory and memory_in_use + need > memory_budget:
+            return False
+        if estimate is not None and need > memory_budget:
+            log(f"内存预算: {p.name} 预计占用 {need / 2**20:.0f} MB，超过预算，单独处理")
+        held = None
+        memory[p] = need
+        memory_in_use += need
+        waiting[names[0]].append(StageItem(p, out_dir))
+        start_ready()
+        return True
+
+    try:
+        while True:
+            while admit():
+                pass
+            if control.cancelled:
+                # 丢弃排队中的，撤销尚未开始的；已经在跑的等它结束，结果不再进入下一段
+                for q in waiting.values():
+                    while q:
+                        leave(q.popleft().input_path)
+                for fut in list(in_flight):
+                    fut.cancel()
+                sample()
+            if not in_flight:
+                if control.cancelled or (exhausted and held is None and not any(waiting.values())):
+                    break
+                if control.paused:
+                    control.wait_while_paused()
+                    continue
+            yield from collect()
+    finally:
+        for executor in executors.values():
+            executor.shutdown(wait=True, cancel_futures=True)
+        sample()
+        if prefetcher is not None:
+            prefetcher.close()
+
+
+def result_ok(result) -> bool:
+    if isinstance(result, str):
+        return False
+    return bool(getattr(result, "success", getattr(result, "ok", False)))
+
+
+class BatchRunner:
+    """与 Qt 无关的批处理主循环。
+
+    GUI 的 Worker 和命令行共用这一份逻辑：Worker 把回调转成 Qt 信号，
+    命令行把回调输出成 JSON 行。
+    """
+
+    def __init__(
+        self,
+        task_id: str,
+        params: dict,
+        input_dir: str,
+        output_dir: str,
+        on_log: Callable[[str], None] | None = None,
+        on_progress: Callable[[int, int], None] | None = None,
+        on_result: Callable[[object], None] | None = None,
+        control: RunControl | None = None,
+    ) -> None:
+        self._task_id = task_id
+        self._params = dict(params)
+        self._input_dir = input_dir
+        self._output_dir = output_dir
+        self._on_log = on_log or (lambda _msg: None)
+        self._on_progress = on_progress or (lambda _done, _total: None)
+        self._on_result = on_result or (lambda result: self._on_log(result_message(result)))
+        self.control = control or RunControl()
+
+        self.total = 0
+        self.processed = 0
+        self.succeeded = 0
+        self.error = ""  # 整批无法开始时的原因（参数/输入无效）
+        self.stats = RunStats()
+
+    def summary(self) -> dict:
+        return {
+            "task_id": self._task_id,
+            "output_dir": self._output_dir,
+            "total": self.total,
+            "processed": self.processed,
+            "succeeded": self.succeeded,
+            "failed": self.processed - self.succeeded,
+            "error": self.error,
+            "cancelled": self.control.cancelled,
+            "stats": self.stats.to_dict(),
+        }
+
+    def _fail(self, msg: str) -> str:
+        self.error = msg
+        self._on_log(msg)
+        return self._output_dir
+
+    def _report(self, result, path: Path | None = None) -> None:
+        if path is not None:
+            self.stats.add(path, result)
+        self.processed += 1
+        if result_ok(result):
+            self.succeeded += 1
+        self._on_result(result)
+        self._on_progress(self.processed, self.total)
+
+    def _finish_stats(self) -> None:
+        self.stats.finish()
+        for line in self.stats.report_lines():
+            self._on_log(line)
+
+    def run(self) -> str:
+        """执行整批，返回输出目录。"""
+        self.stats = RunStats()  # 从这里开始计墙钟时间
+        task = build_task(self._task_id, self._params)
+        if task is None:
+            return self._fail(f"未知工具或参数不完整: {self._task_id}")
+        profile = getattr(task, "encoder_profile", None)
+        if profile is not None:
+            self.stats.encoder_profile = (profile or "default").lower()
+
+        # 预检：依赖缺失 / 参数不可用时整批直接失败，不必逐个文件尝试
+        preflight = getattr(task, "preflight", None)
+        if callable(preflight):
+            err = preflight()
+            if err:
+                return self._fail(err)
+
+        # 0 表示自动并发（见 autotune）
+        raw = self._params.get("concurrency", 1)
+        concurrency = int(1 if raw in (None, "") else raw)
+        concurrency = max(AUTO_CONCURRENCY, min(MAX_CONCURRENCY, concurrency))
+
+        backend = (self._params.get("backend") or "thread").lower()
+        if backend not in BACKENDS:
+            backend = "thread"
+
+        # 分阶段流水线：支持的 task（图片）按段设置 worker 数，此时不用 concurrency / backend
+        stage_configs: dict[str, StageConfig] = {}
+        if (self._params.get("pipeline") or "").strip():
+            try:
+                stage_configs = pipeline.parse_pipeline(self._params["pipeline"])
+            except ValueError as e:
+                return self._fail(f"流水线设置有误: {e}")
+            if stage_configs and not pipeline.supports_pipeline(task):
+                self._on_log("当前工具不支持分阶段流水线，按普通方式处理")
+                stage_configs = {}
+
+        out_dir = Path(self._output_dir)
+        out_dir.mkdir(parents=True, exist_ok=True)
+        self._output_dir = str(out_dir)
+
+        # 写盘：编码结果由写入线程原子写入（临时名 + 改名），fsync 策略见 writer.FSYNC_POLICIES
+        fsync = writer.normalize_fsync(self._params.get("write_fsync"))
+        write_buffer_mb = int(self._params.get("write_buffer_mb", 0) or writer.DEFAULT_WRITE_BUFFER_MB)
+
+        mode = (self._params.get("image_mode") or "batch").lower()
+        single_file = (self._params.get("single_file") or "").strip()
+
+        # 单文件模式
+        if mode == "single" and single_file:
+            p = Path(single_file)
+            if not p.exists() or not p.is_file():
+                return self._fail(f"输入文件无效: {p}")
+
+            self.total = 1
+            self._on_progress(0, 1)
+            self._report(writer.write_outputs(p, run_one(task, p, out_dir), fsync), p)
+            self._finish_stats()
+            self._on_log("全部处理完成")
+            return self._output_dir
+
+        # 批量模式
+        in_dir = Path(self._input_dir)
+        if not in_dir.exists() or not in_dir.is_dir():
+            return self._fail(f"输入文件夹无效: {in_dir}")
+
+        # 增量：由清单判断是否需要重建，task 本身不再按“输出已存在”跳过
+        manifest: Manifest | None = None
+        if self._params.get("incremental", True):
+            self._params["overwrite"] = True
+            task.overwrite = True
+            try:
+                manifest = Manifest(out_dir, task, use_hash=bool(self._params.get("manifest_hash", False)))
+            except sqlite3.Error as e:
+                self._params["overwrite"] = task.overwrite = False
+                self._on_log(f"增量清单不可用，改为按“输出已存在”跳过: {e}")
+        stats: dict[Path, os.stat_result] = {}  # 在途文件扫描时的 stat，成功后写入清单
+        skipped = 0
+
+        accept = getattr(task, "accept_file", None)
+        if not callable(accept):
+            accept = None
+        recursive = bool(self._params.get("recursive", False))
+
+        def jobs() -> Iterator[Job]:
+            # 边扫描边处理：total 随扫描增长，扫描结束后才是最终值
+            nonlocal skipped
+            for item in iter_files(in_dir, accept, recursive=recursive, output_root=out_dir):
+                self.total += 1
+                if manifest is not None:
+                    try:
+                        st = item.entry.stat() if item.entry is not None else item.path.stat()
+                    except OSError:
+                        st = None
+                    if st is not None:
+                        if manifest.is_up_to_date(item.path, st):
+                            skipped += 1
+                            self._report(TaskResult(True, f"跳过(未变化): {item.path.name}"))
+                            continue
+                        stats[item.path] = st
+                yield item.path, (out_dir / item.rel_dir if item.rel_dir else out_dir)
+            self._on_log(f"扫描完成: 共 {self.total} 个文件" + (f"，其中 {skipped} 个未变化" if skipped else ""))
+
+        # 只有能估算单个文件内存的 task（图片）才按预算控制
+        memory_budget = 0
+        if callable(getattr(task, "estimate_memory", None)):
+            memory_budget = memory_budget_bytes(self._params.get("memory_budget_mb", AUTO_MEMORY_BUDGET))
+        budget_text = f", 内存预算={memory_budget // 2**20} MB" if memory_budget else ""
+
+        # 预读（慢速 / 网络存储）：0 表示关闭
+        prefetch_ahead = max(0, int(self._params.get("prefetch", 0) or 0))
+        prefetch_mb = int(self._params.get("prefetch_mb", 0) or prefetch.DEFAULT_PREFETCH_MB)
+
+        if stage_configs:
+            kinds = {"thread": "线程", "process": "进程"}
+            run_text = "流水线=" + ", ".join(
+                f"{name}×{cfg.workers}{kinds[cfg.backend]}" for name, cfg in stage_configs.items()
+            )
+        else:
+            run_text = f"并发数={'自动' if concurrency == AUTO_CONCURRENCY else concurrency}, 方式={backend}"
+        self._on_log(f"开始扫描: {in_dir}{' (含子文件夹)' if recursive else ''}, {run_text}{budget_text}")
+        self._on_progress(0, 0)
+
+        try:
+            if stage_configs:
+                self.stats.pipeline = PipelineStats({name: (cfg.workers, cfg.backend) for name, cfg in stage_configs.items()})
+                results = iter_pipeline(
+                    self._task_id,
+                    self._params,
+                    task,
+                    jobs(),
+                    stage_configs,
+                    int(self._params.get("pipeline_queue", 0) or pipeline.DEFAULT_QUEUE_DEPTH),
+                    self.control,
+                    self._on_log,
+                    memory_budget,
+                    prefetch_ahead,
+                    prefetch_mb * 1024 * 1024,
+                    self.stats.pipeline,
+                )
+            else:
+                results = iter_results(
+                    self._task_id,
+                    self._params,
+                    task,
+                    jobs(),
+                    concurrency,
+                    backend,
+                    int(self._params.get("chunk_size", DEFAULT_CHUNK_SIZE) or DEFAULT_CHUNK_SIZE),
+                    int(self._params.get("inflight_factor", DEFAULT_INFLIGHT_FACTOR) or DEFAULT_INFLIGHT_FACTOR),
+                    self.control,
+                    self._on_log,
+                    memory_budget,
+                    prefetch_ahead,
+                    prefetch_mb * 1024 * 1024,
+                )
+            # 写盘完成（已改名为最终文件）后才记入清单
+            for p, result in writer.write_behind(results, fsync, write_buffer_mb * 1024 * 1024):
+                st = stats.pop(p, None)
+                output_paths = result_output_paths(result)
+                if manifest is not None and st is not None and output_paths and result_ok(result):
+                    manifest.record(p, st, output_paths)
+                self._report(result, p)
+        finally:
+            if manifest is not None:
+                manifest.close()
+
+        self._finish_stats()
+
+        if self.control.cancelled:
+            self._on_log(f"已取消: 已处理 {self.processed} 个，其余文件未处理")
+            return self._output_dir
+
+        self._on_log("全部处理完成")
+        return self._output_dir
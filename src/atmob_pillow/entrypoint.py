@@ -1,7 +1,16 @@
 from __future__ import annotations
 
-from atmob_pillow.main import main
+import multiprocessing
+
+from atmob_pillow import startup_timing
 
 
 if __name__ == "__main__":
+    # 打包后的 exe 使用进程池时必须先调用（否则子进程会重新启动整个 GUI）
+    multiprocessing.freeze_support()
+    # --startup-timing：在 import Qt 与界面模块之前开始计时
+    startup_timing.start()
+
+    from atmob_pillow.main import main
+
     main()
@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+import json
+import os
+import shutil
+import subprocess
+import threading
+from dataclasses import dataclass
+
+from .utils_paths import user_cache_dir
+
+
+# ffmpeg 能力探测：每次运行在预检时解析一次可执行文件路径（resolve_binaries），-encoders / -muxers 的结果按
+# “路径 + 修改时间 + 大小”缓存到磁盘，ffmpeg 没换就不再重新查询。
+# 用于批处理开始前的预检：缺编码器 / 封装格式时整批立即报错，而不是每个文件各启动一次 ffmpeg 再失败。
+
+CACHE_NAME = "ffmpeg_caps.json"
+
+_lock = threading.Lock()
+_memory: dict[str, FfmpegCaps] = {}
+_binaries: dict[str, str] = {}  # 可执行文件名 -> 已找到的路径（找不到的不记，下次再查）
+
+BINARIES = ("ffmpeg", "ffprobe")
+
+
+@dataclass(frozen=True)
+class FfmpegCaps:
+    ffmpeg: str
+    encoders: frozenset[str]
+    muxers: frozenset[str]
+
+
+def find_binary(name: str) -> str | None:
+    """ffmpeg / ffprobe 的路径：沿用本次运行预检时找到的，没有时在 PATH 中查找。"""
+    path = _binaries.get(name)
+    if path is None:
+        path = shutil.which(name)
+        if path is not None:
+            _binaries[name] = path
+    return path
+
+
+def resolve_binaries() -> None:
+    """每次运行的预检开始时调用：重新在 PATH 中查找（GUI 里装好 ffmpeg 或改了 PATH 后不用重启）。"""
+    for name in BINARIES:
+        _binaries.pop(name, None)
+        find_binary(name)
+
+
+def _parse_list(output: str) -> frozenset[str]:
+    """解析 `ffmpeg -encoders` / `-muxers` 的输出：分隔线（---）之后每行为 “标志 名称 说明”。"""
+    names: set[str] = set()
+    started = False
+    for line in output.splitlines():
+        fields = line.split()
+        if not started:
+            started = bool(fields) and set(fields[0]) == {"-"}
+            continue
+        if len(fields) >= 2:
+            names.update(n for n in fields[1].split(",") if n)
+    return frozenset(names)
+
+
+def _query(ffmpeg: str, option: str) -> frozenset[str]:
+    proc = subprocess.run([ffmpeg, "-hide_banner", option], capture_output=True, text=True, timeout=60)
+    return _parse_list(proc.stdout)
+
+
+def _cache_key(ffmpeg: str) -> str | None:
+    try:
+        st = os.stat(ffmpeg)
+    except OSError:
+        return None
+    return f"{os.path.abspath(ffmpeg)}|{st.st_mtime_ns}|{st.st_size}"
+
+
+def _load_disk() -> dict:
+    try:
+        with open(user_cache_dir() / CACHE_NAME, encoding="utf-8") as f:
+            data = json.load(f)
+        return data if isinstance(data, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_disk(data: dict) -> None:
+    try:
+        path = user_cache_dir() / CACHE_NAME
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp, path)
+    except OSError:
+        # 缓存写不了只是下次再查一遍
+        pass
+
+
+def get_caps() -> FfmpegCaps | None:
+    """当前 ffmpeg 支持的编码器与封装格式；找不到 ffmpeg 时返回 None。"""
+    ffmpeg = find_binary("ffmpeg")
+    if ffmpeg is None:
+        return None
+    key = _cache_key(ffmpeg)
+    if key is None:
+        return None
+
+    with _lock:
+        caps = _memory.get(key)
+        if caps is not None:
+            return caps
+
+        disk = _load_disk()
+        entry = disk.get(key)
+        if entry:
+            caps = FfmpegCaps(ffmpeg, frozenset(entry["encoders"]), frozenset(entry["muxers"]))
+        else:
+            caps = FfmpegCaps(ffmpeg, _query(ffmpeg, "-encoders"), _query(ffmpeg, "-muxers"))
+            # 同一路径只保留最新一份（ffmpeg 升级后旧记录作废）
+            path_prefix = key.rsplit("|", 2)[0] + "|"
+            disk = {k: v for k, v in disk.items() if not k.startswith(path_prefix)}
+            disk[key] = {"encoders": sorted(caps.encoders), "muxers": sorted(caps.muxers)}
+            _save_disk(disk)
+
+        _memory[key] = caps
+        return caps
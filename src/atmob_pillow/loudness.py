@@ -0,0 +1,177 @@
+from __future__ import annotations
+
+import json
+import os
+import re
+import sqlite3
+import subprocess
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+from .utils_paths import user_cache_dir
+
+
+# EBU R128 两遍响度标准化：
+# 第一遍用 loudnorm 测量输入的响度（与目标值无关），结果按“文件身份 + 剪切范围”缓存；
+# 之后转成任何格式、任何目标响度，都只需要第二遍：带上测量值做线性标准化并编码。
+
+CACHE_NAME = "loudness.sqlite"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS measurements (
+    input TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    cut TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (input, size, mtime_ns, cut)
+)
+"""
+
+_SAMPLE_RATE_RE = re.compile(r"Audio: [^\n]*?(\d+) Hz")
+
+
+@dataclass(frozen=True)
+class LoudnessMeasurement:
+    input_i: float  # 综合响度 LUFS
+    input_tp: float  # 真峰值 dBTP
+    input_lra: float  # 响度范围 LU
+    input_thresh: float  # 门限 LUFS
+    sample_rate: int  # 源采样率；loudnorm 内部会升到 192kHz，输出时要还原
+
+
+def measure(ffmpeg: str, input_path: Path, input_args: list[str] | None = None, run=None) -> LoudnessMeasurement:
+    """第一遍：loudnorm 只测量不输出。run 为执行命令的函数（返回 returncode, stderr），便于取消。"""
+    cmd = [
+        ffmpeg,
+        "-hide_banner",
+        "-nostats",
+        *(input_args or []),
+        "-i",
+        str(input_path),
+        "-map",
+        "0:a:0",
+        "-af",
+        "loudnorm=print_format=json",
+        "-f",
+        "null",
+        "-",
+    ]
+    if run is None:
+        proc = subprocess.run(cmd, capture_output=True, text=True)
+        returncode, stderr = proc.returncode, proc.stderr
+    else:
+        returncode, stderr = run(cmd)
+    if returncode != 0:
+        raise RuntimeError(stderr.strip().splitlines()[-1] if stderr.strip() else f"ffmpeg 退出码 {returncode}")
+
+    # loudnorm 的 JSON 在 stderr 末尾
+    start = stderr.rfind("{")
+    end = stderr.rfind("}")
+    if start < 0 or end < start:
+        raise RuntimeError("无法解析响度测量结果")
+    data = json.loads(stderr[start : end + 1])
+
+    m = _SAMPLE_RATE_RE.search(stderr)
+    return LoudnessMeasurement(
+        input_i=float(data["input_i"]),
+        input_tp=float(data["input_tp"]),
+        input_lra=float(data["input_lra"]),
+        input_thresh=float(data["input_thresh"]),
+        sample_rate=int(m.group(1)) if m else 0,
+    )
+
+
+def normalize_filter(m: LoudnessMeasurement, target_i: float, target_tp: float, target_lra: float) -> str:
+    """第二遍的 loudnorm 滤镜：带测量值，线性标准化（不做动态压缩，音色不变）。"""
+    return (
+        f"loudnorm=I={target_i:g}:TP={target_tp:g}:LRA={target_lra:g}"
+        f":measured_I={m.input_i:g}:measured_TP={m.input_tp:g}"
+        f":measured_LRA={m.input_lra:g}:measured_thresh={m.input_thresh:g}"
+        ":linear=true"
+    )
+
+
+class LoudnessCache:
+    """测量结果缓存（用户缓存目录下的 SQLite），多线程 / 多进程共用：每次操作单独连接。"""
+
+    def __init__(self, path: str | Path | None = None) -> None:
+        self.path = Path(path) if path else user_cache_dir() / CACHE_NAME
+        db = self._connect()
+        try:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(_SCHEMA)
+            db.commit()
+        finally:
+            db.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(str(self.path), timeout=30)
+
+    @staticmethod
+    def _key(input_path: Path, cut: str) -> tuple:
+        st = os.stat(input_path)
+        return os.path.abspath(input_path), st.st_size, st.st_mtime_ns, cut
+
+    def get(self, input_path: Path, cut: str = "") -> LoudnessMeasurement | None:
+        db = self._connect()
+        try:
+            row = db.execute(
+                "SELECT data FROM measurements WHERE input=? AND size=? AND mtime_ns=? AND cut=?",
+                self._key(input_path, cut),
+            ).fetchone()
+        finally:
+            db.close()
+        if row is None:
+            return None
+        try:
+            return LoudnessMeasurement(**json.loads(row[0]))
+        except (TypeError, ValueError):
+            return None
+
+    def put(self, input_path: Path, m: LoudnessMeasurement, cut: str = "") -> None:
+        input_key, size, mtime_ns, cut = self._key(input_path, cut)
+        db = self._connect()
+        try:
+            # 同一文件只保留当前版本（文件改动后旧测量作废）
+            db.execute("DELETE FROM measurements WHERE input=? AND cut=?", (input_key, cut))
+            db.execute(
+                "INSERT INTO measurements VALUES (?, ?, ?, ?, ?)",
+                (input_key, size, mtime_ns, cut, json.dumps(asdict(m))),
+            )
+            db.commit()
+        finally:
+            db.close()
+
+
+def measure_cached(
+    cache: LoudnessCache | None,
+    ffmpeg: str,
+    input_path: Path,
+    input_args: list[str] | None = None,
+    run=None,
+    refresh: bool = False,
+    source: Path | None = None,
+) -> tuple[LoudnessMeasurement, bool]:
+    """先查缓存，没有再测量并写入；返回 (测量结果, 是否来自缓存)。
+
+    input_args 为 -i 之前的剪切参数（-ss/-t），同时作为缓存 key 的一部分。
+    source 为实际交给 ffmpeg 读取的文件（预读到本地的副本）；缓存始终按 input_path 记录。
+    """
+    cut = " ".join(input_args or [])
+    if cache is not None and not refresh:
+        try:
+            m = cache.get(input_path, cut)
+        except (OSError, sqlite3.Error):
+            m = None
+        if m is not None:
+            return m, True
+
+    m = measure(ffmpeg, source or input_path, input_args, run)
+    if cache is not None:
+        try:
+            cache.put(input_path, m, cut)
+        except (OSError, sqlite3.Error):
+            # 缓存写不了只影响下次速度
+            pass
+    return m, False
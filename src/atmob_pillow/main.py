@@ -2,16 +2,26 @@ from __future__ import annotations
 
 import sys
 
+from PySide6.QtCore import QTimer
 from PySide6.QtWidgets import QApplication
 
+from . import startup_timing
 from .ui_mainwindow import MainWindow
 
 
+def _report_startup(app: QApplication) -> None:
+    startup_timing.finish()
+    app.quit()
+
+
 def main() -> None:
     app = QApplication(sys.argv)
     win = MainWindow()
     win.apply_style()
     win.show()
+    if startup_timing.enabled():
+        # 冷启动计时模式：事件循环处理完首次显示 / 绘制后输出报告并退出
+        QTimer.singleShot(0, lambda: _report_startup(app))
     sys.exit(app.exec())
 
 
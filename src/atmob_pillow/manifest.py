@@ -0,0 +1,166 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sqlite3
+from pathlib import Path
+from typing import Iterable
+
+
+# 增量清单：每个输出目录一份 SQLite，记录“哪个输入、用什么参数、生成了哪个输出”。
+# 重跑时只处理新增 / 变化的输入，以及参数变化后需要重建的输出；
+# 只在成功后写入记录，崩溃留下的半截文件没有记录，下次会重新生成。
+MANIFEST_NAME = ".atmob_manifest.sqlite"
+
+# 不影响输出内容的参数，不参与参数指纹
+_NON_OUTPUT_PARAMS = {"overwrite", "ffmpeg_threads", "write_fsync"}
+
+# 累积多少条记录提交一次
+_COMMIT_EVERY = 200
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    task_id TEXT NOT NULL,
+    input TEXT NOT NULL,
+    input_size INTEGER NOT NULL,
+    input_mtime_ns INTEGER NOT NULL,
+    input_hash TEXT,
+    params_hash TEXT NOT NULL,
+    output TEXT NOT NULL,
+    output_size INTEGER NOT NULL,
+    PRIMARY KEY (task_id, input)
+);
+CREATE TABLE IF NOT EXISTS outputs (
+    task_id TEXT NOT NULL,
+    input TEXT NOT NULL,
+    output TEXT NOT NULL,
+    output_size INTEGER NOT NULL,
+    PRIMARY KEY (task_id, input, output)
+);
+"""
+
+
+def params_fingerprint(task) -> str:
+    """task 的参数指纹：task 上所有公开属性（即实际生效的参数）的哈希。"""
+    data = {
+        k: v
+        for k, v in sorted(vars(task).items())
+        if not k.startswith("_") and k not in _NON_OUTPUT_PARAMS
+    }
+    raw = json.dumps({"task": getattr(task, "id", type(task).__name__), "params": data}, sort_keys=True, default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def file_digest(path: str | Path) -> str:
+    h = hashlib.blake2b(digest_size=20)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+class Manifest:
+    """单个输出目录的增量清单。只在执行线程内使用（非线程安全）。"""
+
+    def __init__(self, out_dir: str | Path, task, use_hash: bool = False) -> None:
+        self.path = Path(out_dir) / MANIFEST_NAME
+        self._task_id = getattr(task, "id", type(task).__name__)
+        self._params_hash = params_fingerprint(task)
+        self._use_hash = use_hash
+        self._pending = 0
+
+        self._db = sqlite3.connect(str(self.path))
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        self._db.commit()
+        self._db.close()
+
+    def __enter__(self) -> Manifest:
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    @staticmethod
+    def _key(input_path: Path) -> str:
+        return os.path.abspath(input_path)
+
+    def is_up_to_date(self, input_path: Path, st: os.stat_result) -> bool:
+        """输入未变化、参数相同、且上次的每个输出都仍完整存在时返回 True。"""
+        key = self._key(input_path)
+        row = self._db.execute(
+            "SELECT input_size, input_mtime_ns, input_hash, params_hash FROM entries WHERE task_id=? AND input=?",
+            (self._task_id, key),
+        ).fetchone()
+        if row is None:
+            return False
+
+        size, mtime_ns, input_hash, params_hash = row
+        if params_hash != self._params_hash or size != st.st_size:
+            return False
+
+        outputs = self._db.execute(
+            "SELECT output, output_size FROM outputs WHERE task_id=? AND input=?",
+            (self._task_id, key),
+        ).fetchall()
+        if not outputs:
+            # 旧版清单只记了第一个输出，不知道是否还有别的输出：重建一次
+            return False
+        for output, output_size in outputs:
+            try:
+                if os.stat(output).st_size != output_size:
+                    return False
+            except OSError:
+                return False
+
+        if mtime_ns == st.st_mtime_ns:
+            return True
+
+        # 只有修改时间变了（复制 / touch）：开启内容哈希时按内容判断
+        if self._use_hash and input_hash and file_digest(input_path) == input_hash:
+            self._db.execute(
+                "UPDATE entries SET input_mtime_ns=? WHERE task_id=? AND input=?",
+                (st.st_mtime_ns, self._task_id, self._key(input_path)),
+            )
+            self._bump()
+            return True
+        return False
+
+    def record(self, input_path: Path, st: os.stat_result, output_paths: Iterable[Path]) -> None:
+        """记录输入与它的全部输出；有输出不存在时不记录（下次重建）。"""
+        try:
+            outputs = [(os.path.abspath(p), os.stat(p).st_size) for p in output_paths]
+        except OSError:
+            return
+        if not outputs:
+            return
+        key = self._key(input_path)
+        input_hash = file_digest(input_path) if self._use_hash else None
+        self._db.execute(
+            "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                self._task_id,
+                key,
+                st.st_size,
+                st.st_mtime_ns,
+                input_hash,
+                self._params_hash,
+                *outputs[0],
+            ),
+        )
+        self._db.execute("DELETE FROM outputs WHERE task_id=? AND input=?", (self._task_id, key))
+        self._db.executemany(
+            "INSERT OR REPLACE INTO outputs VALUES (?, ?, ?, ?)",
+            [(self._task_id, key, output, output_size) for output, output_size in outputs],
+        )
+        self._bump()
+
+    def _bump(self) -> None:
+        self._pending += 1
+        if self._pending >= _COMMIT_EVERY:
+            self._db.commit()
+            self._pending = 0
@@ -0,0 +1,448 @@
+from __future__ import annotations
+
+import struct
+from array import array
+from dataclasses import dataclass, field
+from typing import IO, Iterator
+from xml.sax.saxutils import escape
+
+
+# MIDI -> MusicXML 快速路径：不经 music21，直接解析 SMF、按网格量化、逐小节流式写出 MusicXML。
+# 只覆盖常见的简单文件（见 prepare 的检查），超出范围时抛 Unsupported，由调用方改用 music21。
+
+# quantize_mode -> 每个四分音符的网格数（同时作为 MusicXML 的 divisions）
+GRID_UNITS = {"1/8": 2, "1/16": 4, "1/32": 8}
+
+
+class Unsupported(Exception):
+    """文件超出快速路径支持的范围。"""
+
+
+@dataclass
+class MidiTrack:
+    name: str = ""
+    channels: set[int] = field(default_factory=set)
+    # 音符：起止 tick 与音高分三个数组存放，量化时整列计算
+    starts: array = field(default_factory=lambda: array("q"))
+    ends: array = field(default_factory=lambda: array("q"))
+    pitches: array = field(default_factory=lambda: array("B"))
+
+
+@dataclass
+class MidiFile:
+    division: int  # tick / 四分音符
+    tracks: list[MidiTrack]
+    time_signatures: list[tuple[int, int, int]]  # (tick, 分子, 分母)
+    key_signatures: list[tuple[int, int, int]]  # (tick, 升降号数, 0 大调 / 1 小调)
+    tempos: list[tuple[int, int]]  # (tick, 微秒 / 四分音符)
+
+
+# ---- 解析 Standard MIDI File ----
+
+
+def _read_vlq(data: bytes, pos: int) -> tuple[int, int]:
+    value = 0
+    while True:
+        b = data[pos]
+        pos += 1
+        value = (value << 7) | (b & 0x7F)
+        if not b & 0x80:
+            return value, pos
+
+
+def _read_track(data: bytes, midi: MidiFile) -> MidiTrack:
+    track = MidiTrack()
+    open_notes: dict[tuple[int, int], list[int]] = {}  # (通道, 音高) -> 未结束音符的起点（先开先关）
+    pos = 0
+    tick = 0
+    status = 0
+    n = len(data)
+
+    def note_off(ch: int, pitch: int) -> None:
+        stack = open_notes.get((ch, pitch))
+        if stack:
+            track.starts.append(stack.pop(0))
+            track.ends.append(tick)
+            track.pitches.append(pitch)
+
+    while pos < n:
+        delta, pos = _read_vlq(data, pos)
+        tick += delta
+        b = data[pos]
+        if b & 0x80:
+            status = b
+            pos += 1
+        elif status < 0x80:
+            raise Unsupported("running status 无效")
+
+        if status == 0xFF:
+            kind = data[pos]
+            length, pos = _read_vlq(data, pos + 1)
+            body = data[pos : pos + length]
+            pos += length
+            status = 0  # meta / sysex 之后不沿用 running status
+            if kind == 0x2F:
+                break
+            if kind == 0x03 and not track.name:
+                track.name = body.decode("utf-8", errors="replace").strip()
+            elif kind == 0x51 and length == 3:
+                midi.tempos.append((tick, int.from_bytes(body, "big")))
+            elif kind == 0x58 and length >= 2:
+                midi.time_signatures.append((tick, body[0], 1 << body[1]))
+            elif kind == 0x59 and length == 2:
+                midi.key_signatures.append((tick, struct.unpack("b", body[:1])[0], body[1]))
+            continue
+        if status in (0xF0, 0xF7):
+            length, pos = _read_vlq(data, pos)
+            pos += length
+            status = 0
+            continue
+
+        if status > 0xF0:
+            raise Unsupported(f"不支持的事件 0x{status:02X}")
+        kind = status & 0xF0
+        ch = status & 0x0F
+        if kind in (0xC0, 0xD0):
+            pos += 1
+            continue
+        d1, d2 = data[pos], data[pos + 1]
+        pos += 2
+        if kind == 0x90 and d2 > 0:
+            track.channels.add(ch)
+            open_notes.setdefault((ch, d1), []).append(tick)
+        elif kind == 0x80 or kind == 0x90:
+            note_off(ch, d1)
+
+    # 没有 note-off 的音符延续到音轨结束
+    for (ch, pitch), stack in open_notes.items():
+        for _ in range(len(stack)):
+            note_off(ch, pitch)
+    return track
+
+
+def read_smf(data: bytes) -> MidiFile:
+    """解析 SMF（格式 0 / 1，按四分音符计 tick）；其它格式或数据损坏时抛 Unsupported。"""
+    if data[:4] != b"MThd" or len(data) < 14:
+        raise Unsupported("不是标准 MIDI 文件")
+    header_len = struct.unpack(">I", data[4:8])[0]
+    fmt, ntracks, division = struct.unpack(">HHH", data[8:14])
+    if fmt not in (0, 1):
+        raise Unsupported(f"不支持 SMF 格式 {fmt}")
+    if division & 0x8000 or division == 0:
+        raise Unsupported("不支持 SMPTE 时间")
+
+    midi = MidiFile(division=division, tracks=[], time_signatures=[], key_signatures=[], tempos=[])
+    pos = 8 + header_len
+    try:
+        while pos + 8 <= len(data) and len(midi.tracks) < ntracks:
+            tag = data[pos : pos + 4]
+            length = struct.unpack(">I", data[pos + 4 : pos + 8])[0]
+            body = data[pos + 8 : pos + 8 + length]
+            pos += 8 + length
+            if tag == b"MTrk":
+                midi.tracks.append(_read_track(body, midi))
+    except (IndexError, struct.error) as e:
+        raise Unsupported(f"MIDI 数据损坏: {e}") from None
+    return midi
+
+
+# ---- 量化与排版 ----
+
+
+@dataclass
+class Part:
+    name: str
+    clef: tuple[str, int]  # (sign, line)
+    chords: list[tuple[int, int, tuple[int, ...]]]  # (起点, 时值, 音高们)，单位为网格
+
+
+@dataclass
+class Score:
+    units: int  # 每个四分音符的网格数
+    beats: int
+    beat_type: int
+    fifths: int | None
+    mode: str
+    tempo_bpm: float | None
+    parts: list[Part]
+
+    @property
+    def measure_units(self) -> int:
+        return self.beats * self.units * 4 // self.beat_type
+
+
+def _single(events: list, what: str):
+    """至多一个、且位于开头的设置（拍号 / 调号 / 速度）；中途变化时不走快速路径。"""
+    values = {e[1:] for e in events}
+    if len(values) > 1 or any(e[0] != 0 for e in events):
+        raise Unsupported(f"{what}有变化")
+    return next(iter(values)) if values else None
+
+
+def _quantize(track: MidiTrack, division: int, units: int) -> list[tuple[int, int, tuple[int, ...]]]:
+    """起点与时值分别取最近的网格（时值至少一格），同一起点的音合成和弦。
+
+    原本首尾相接、只因取整而重叠的音，把前一个截到后一个的起点（演奏中的连奏重叠）；
+    原本就重叠的音需要多声部，不在支持范围内。
+    """
+    half = division // 2
+    starts = array("q", [(t * units + half) // division for t in track.starts])
+    durs = array("q", [max(1, ((e - s) * units + half) // division) for s, e in zip(track.starts, track.ends)])
+
+    order = sorted(range(len(starts)), key=lambda i: (starts[i], track.pitches[i]))
+    chords: list[tuple[int, int, tuple[int, ...]]] = []
+    cur_start = cur_dur = -1
+    cur_end_tick = 0  # 当前和弦原始的最晚结束 tick
+    cur_pitches: list[int] = []
+    for i in order:
+        s, d, p = starts[i], durs[i], track.pitches[i]
+        if s == cur_start:
+            if d != cur_dur:
+                raise Unsupported("同一时刻的音时值不同（需要多声部）")
+            if p not in cur_pitches:
+                cur_pitches.append(p)
+            cur_end_tick = max(cur_end_tick, track.ends[i])
+            continue
+        if cur_pitches:
+            if s < cur_start + cur_dur:
+                if cur_end_tick > track.starts[i]:
+                    raise Unsupported("音符重叠（需要多声部）")
+                cur_dur = s - cur_start
+            chords.append((cur_start, cur_dur, tuple(cur_pitches)))
+        cur_start, cur_dur, cur_pitches, cur_end_tick = s, d, [p], track.ends[i]
+    if cur_pitches:
+        chords.append((cur_start, cur_dur, tuple(cur_pitches)))
+    return chords
+
+
+def _best_clef(track: MidiTrack) -> tuple[str, int]:
+    # 与 music21 的 bestClef 一致的思路：平均音高在中央 C 以上用高音谱号，否则低音谱号
+    avg = sum(track.pitches) / len(track.pitches)
+    return ("G", 2) if avg >= 60 else ("F", 4)
+
+
+def _absorb_tiny_rests(chords: list[tuple[int, int, tuple[int, ...]]], limit: float) -> list[tuple[int, int, tuple[int, ...]]]:
+    """短于 limit 格的休止并入前一个音（与 music21 路径的“去除小休止符”一致）。"""
+    out = []
+    for i, (start, dur, pitches) in enumerate(chords):
+        if i + 1 < len(chords):
+            gap = chords[i + 1][0] - (start + dur)
+            if 0 < gap < limit:
+                dur += gap
+        out.append((start, dur, pitches))
+    return out
+
+
+def prepare(midi: MidiFile, units: int, tiny_rest: float = 0.0) -> Score:
+    """检查是否在支持范围内并完成量化；不支持时抛 Unsupported（此时还没有写任何文件）。
+
+    支持范围：拍号 / 调号 / 速度各至多一个且在开头；每个有音符的音轨只用一个非打击乐通道；
+    量化后每个音轨都是单声部（允许同起同止的和弦）。
+    tiny_rest > 0 时，短于该时值（四分音符 = 1）的休止并入前一个音。
+    """
+    ts = _single(midi.time_signatures, "拍号") or (4, 4)
+    ks = _single(midi.key_signatures, "调号")
+    tempo = _single(midi.tempos, "速度")
+
+    beats, beat_type = ts
+    if beats <= 0 or (beats * units * 4) % beat_type:
+        raise Unsupported(f"拍号 {beats}/{beat_type} 与量化网格不匹配")
+
+    parts: list[Part] = []
+    for track in midi.tracks:
+        if not track.pitches:
+            continue
+        if len(track.channels) > 1:
+            raise Unsupported("单个音轨使用了多个通道")
+        if 9 in track.channels:
+            raise Unsupported("打击乐通道")
+        chords = _quantize(track, midi.division, units)
+        if tiny_rest > 0:
+            chords = _absorb_tiny_rests(chords, tiny_rest * units)
+        parts.append(Part(track.name, _best_clef(track), chords))
+    if not parts:
+        raise Unsupported("没有音符")
+
+    return Score(
+        units=units,
+        beats=beats,
+        beat_type=beat_type,
+        fifths=ks[0] if ks else None,
+        mode="minor" if ks and ks[1] else "major",
+        tempo_bpm=round(60_000_000 / tempo[0], 2) if tempo else None,
+        parts=parts,
+    )
+
+
+# ---- 流式写出 MusicXML ----
+
+# 与 music21 从 MIDI 读入时的默认拼写一致：黑键 C# E- F# G# B-
+_SPELLING = [("C", 0), ("C", 1), ("D", 0), ("E", -1), ("E", 0), ("F", 0), ("F", 1), ("G", 0), ("G", 1), ("A", 0), ("B", -1), ("B", 0)]
+_SHARP_ORDER = "FCGDAEB"
+_ACCIDENTALS = {-1: "flat", 0: "natural", 1: "sharp"}
+
+
+def _note_types(units: int) -> list[tuple[int, str, bool]]:
+    """可直接记谱的时值（网格数，类型，是否附点），从长到短。"""
+    out = []
+    for k, name in enumerate(("whole", "half", "quarter", "eighth", "16th", "32nd")):
+        # 全音符 = 4 个四分音符，之后每级减半；不足一格的跳过
+        base, rem = divmod(units * 16, 1 << (k + 2))
+        if base < 1 or rem:
+            continue
+        if base % 2 == 0:
+            out.append((base * 3 // 2, name, True))
+        out.append((base, name, False))
+    return sorted(out, key=lambda t: -t[0])
+
+
+def _split(length: int, types: list[tuple[int, str, bool]]) -> list[tuple[int, str, bool]]:
+    """把一段时值拆成若干可记谱的时值（从长到短贪心）。"""
+    pieces = []
+    while length > 0:
+        piece = next(t for t in types if t[0] <= length)
+        pieces.append(piece)
+        length -= piece[0]
+    return pieces
+
+
+def _key_alters(fifths: int | None) -> dict[str, int]:
+    if not fifths:
+        return {}
+    if fifths > 0:
+        return {step: 1 for step in _SHARP_ORDER[:fifths]}
+    return {step: -1 for step in _SHARP_ORDER[::-1][:-fifths]}
+
+
+def _measures(score: Score, part: Part) -> Iterator[list[tuple[int, tuple[int, ...], str, bool, str]]]:
+    """逐小节产出 (时值, 音高们 / 空为休止, 类型 / 空为整小节休止, 附点, 延音线 start/stop/both/"")。"""
+    mlen = score.measure_units
+    types = _note_types(score.units)
+    # 各声部小节数一致：都补齐到最长声部的最后一小节
+    end = max(p.chords[-1][0] + p.chords[-1][1] for p in score.parts)
+    total = -(-end // mlen) * mlen
+
+    events: list[tuple[int, int, tuple[int, ...]]] = []
+    cursor = 0
+    for start, dur, pitches in part.chords:
+        if start > cursor:
+            events.append((cursor, start - cursor, ()))
+        events.append((start, dur, pitches))
+        cursor = start + dur
+    if total > cursor:
+        events.append((cursor, total - cursor, ()))
+
+    measure: list = []
+    measure_end = mlen
+    for start, dur, pitches in events:
+        pos = start
+        while pos < start + dur:
+            if pos >= measure_end:
+                yield measure
+                measure = []
+                measure_end += mlen
+            seg = min(start + dur, measure_end) - pos
+            if not pitches and seg == mlen:
+                # 整小节休止
+                measure.append((seg, (), "", False, ""))
+                pos += seg
+                continue
+            # 小节内按可记谱时值拆开；音符跨小节 / 被拆开时用延音线连起来
+            for length, name, dotted in _split(seg, types):
+                tie = ""
+                if pitches:
+                    first = pos == start
+                    last = pos + length == start + dur
+                    tie = "" if first and last else "start" if first else "stop" if last else "both"
+                measure.append((length, pitches, name, dotted, tie))
+                pos += length
+    if measure:
+        yield measure
+
+
+def _write_note(out: IO[str], pitch: int | None, chord: bool, length: int, name: str, dotted: bool, tie: str, accidental: str) -> None:
+    out.write("      <note>\n")
+    if chord:
+        out.write("        <chord />\n")
+    if pitch is None:
+        out.write("        <rest />\n")
+    else:
+        step, alter = _SPELLING[pitch % 12]
+        out.write(f"        <pitch>\n          <step>{step}</step>\n")
+        if alter:
+            out.write(f"          <alter>{alter}</alter>\n")
+        out.write(f"          <octave>{pitch // 12 - 1}</octave>\n        </pitch>\n")
+    out.write(f"        <duration>{length}</duration>\n")
+    ties = {"start": ("start",), "stop": ("stop",), "both": ("stop", "start")}.get(tie, ())
+    for t in ties:
+        out.write(f'        <tie type="{t}" />\n')
+    out.write(f"        <type>{name}</type>\n")
+    if dotted:
+        out.write("        <dot />\n")
+    if accidental:
+        out.write(f"        <accidental>{accidental}</accidental>\n")
+    if ties:
+        out.write("        <notations>\n")
+        for t in ties:
+            out.write(f'          <tied type="{t}" />\n')
+        out.write("        </notations>\n")
+    out.write("      </note>\n")
+
+
+def write_musicxml(out: IO[str], score: Score) -> None:
+    """逐小节写出 MusicXML 4.0（partwise），不在内存中构建整棵树。"""
+    out.write('<?xml version="1.0" encoding="utf-8"?>\n')
+    out.write(
+        '<!DOCTYPE score-partwise  PUBLIC "-//Recordare//DTD MusicXML 4.0 Partwise//EN" '
+        '"http://www.musicxml.org/dtds/partwise.dtd">\n'
+    )
+    out.write('<score-partwise version="4.0">\n')
+    out.write("  <identification>\n    <encoding>\n      <software>atmob_pillow</software>\n    </encoding>\n  </identification>\n")
+    out.write("  <part-list>\n")
+    for i, part in enumerate(score.parts, 1):
+        out.write(f'    <score-part id="P{i}">\n      <part-name>{escape(part.name)}</part-name>\n    </score-part>\n')
+    out.write("  </part-list>\n")
+
+    key = _key_alters(score.fifths)
+    for i, part in enumerate(score.parts, 1):
+        out.write(f'  <part id="P{i}">\n')
+        for number, measure in enumerate(_measures(score, part), 1):
+            out.write(f'    <measure number="{number}">\n')
+            if number == 1:
+                out.write(f"      <attributes>\n        <divisions>{score.units}</divisions>\n")
+                if score.fifths is not None:
+                    out.write(f"        <key>\n          <fifths>{score.fifths}</fifths>\n          <mode>{score.mode}</mode>\n        </key>\n")
+                out.write(f"        <time>\n          <beats>{score.beats}</beats>\n          <beat-type>{score.beat_type}</beat-type>\n        </time>\n")
+                sign, line = part.clef
+                out.write(f"        <clef>\n          <sign>{sign}</sign>\n          <line>{line}</line>\n        </clef>\n      </attributes>\n")
+                if score.tempo_bpm is not None:
+                    bpm = f"{score.tempo_bpm:g}"
+                    out.write(
+                        "      <direction>\n        <direction-type>\n"
+                        f'          <metronome parentheses="no">\n            <beat-unit>quarter</beat-unit>\n            <per-minute>{bpm}</per-minute>\n          </metronome>\n'
+                        f'        </direction-type>\n        <sound tempo="{bpm}" />\n      </direction>\n'
+                    )
+
+            # 临时记号：本小节内同一音级 + 八度最近一次显示的变音，初始为调号
+            shown: dict[tuple[str, int], int] = {}
+            for length, pitches, name, dotted, tie in measure:
+                if not pitches:
+                    if name:
+                        _write_note(out, None, False, length, name, dotted, "", "")
+                    else:
+                        out.write(f'      <note>\n        <rest measure="yes" />\n        <duration>{length}</duration>\n      </note>\n')
+                    continue
+                for j, pitch in enumerate(pitches):
+                    step, alter = _SPELLING[pitch % 12]
+                    octave = pitch // 12 - 1
+                    accidental = ""
+                    # 延音线接续的音不重复标记，也不改变本小节的临时记号状态
+                    if tie not in ("stop", "both"):
+                        if alter != shown.get((step, octave), key.get(step, 0)):
+                            accidental = _ACCIDENTALS[alter]
+                        shown[(step, octave)] = alter
+                    _write_note(out, pitch, j > 0, length, name, dotted, tie, accidental)
+            out.write("    </measure>\n")
+        out.write("  </part>\n")
+    out.write("</score-partwise>\n")
+
@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from .tasks.common import TaskResult
+
+
+# 分阶段流水线：把图片 task 的 process_one 拆成 decode → transform → encode 三段，
+# 每段有自己的 worker 池（线程或进程），段与段之间是有界队列（见 engine.iter_pipeline）。
+# 编码（PNG optimize、WebP）往往比解码慢好几倍，可以只给编码段加 worker。写盘仍由 writer 负责。
+#
+# task 提供 stage_decode / stage_transform / stage_encode(item) 即支持流水线：
+# 每段就地更新 item（中间结果放在 item.data），返回 None 表示交给下一段；
+# 返回 TaskResult 表示该文件到此结束（跳过 / 失败），encode 段必须返回 TaskResult。
+PIPELINE_STAGES = ("decode", "transform", "encode")
+
+STAGE_BACKENDS = ("thread", "process")
+
+# 每段输入队列（上一段已完成、等待本段处理）的默认上限
+DEFAULT_QUEUE_DEPTH = 4
+
+
+@dataclass
+class StageItem:
+    """在各段之间传递的单个文件；进程段会把它 pickle 过去再传回来。"""
+
+    input_path: Path
+    output_dir: Path
+    timings: dict[str, float] = field(default_factory=dict)  # 阶段 -> 秒，与 StageTimer.timings 相同
+    data: dict = field(default_factory=dict)  # 段之间的中间结果（已解码图片、输出路径等）
+
+
+@dataclass(frozen=True)
+class StageConfig:
+    workers: int = 1
+    backend: str = "thread"
+
+
+def supports_pipeline(task) -> bool:
+    return all(callable(getattr(task, f"stage_{name}", None)) for name in PIPELINE_STAGES)
+
+
+def parse_pipeline(raw: str) -> dict[str, StageConfig]:
+    """解析各段的 worker 设置，例如 "decode=2, transform=1, encode=4:process"。
+
+    每项为 段名=worker 数[:thread|process]；未写的段 1 个线程。空串返回 {}（不用流水线）。
+    """
+    configs: dict[str, StageConfig] = {}
+    for part in (raw or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        name, sep, value = part.partition("=")
+        name = name.strip().lower()
+        if not sep or name not in PIPELINE_STAGES:
+            raise ValueError(f"流水线设置应为 段名=worker 数[:thread|process]，段名为 {'/'.join(PIPELINE_STAGES)}: {part}")
+        count, _, backend = value.partition(":")
+        backend = (backend.strip() or "thread").lower()
+        if backend not in STAGE_BACKENDS:
+            raise ValueError(f"未知的执行方式: {backend}")
+        workers = int(count)
+        if workers < 1:
+            raise ValueError(f"worker 数至少为 1: {part}")
+        configs[name] = StageConfig(workers=workers, backend=backend)
+    if not configs:
+        return {}
+    return {name: configs.get(name, StageConfig()) for name in PIPELINE_STAGES}
+
+
+def run_stage(task, stage: str, item: StageItem) -> TaskResult | None:
+    """执行一段；异常转成失败结果，不中断整批。"""
+    try:
+        return getattr(task, f"stage_{stage}")(item)
+    except Exception as e:
+        return TaskResult(False, f"失败: {item.input_path.name} ({e})", None, timings=item.timings)
+
+
+def run_stages(task, input_path: Path, output_dir: Path) -> TaskResult:
+    """在当前线程依次执行各段：支持流水线的 task 的 process_one 就是这个。"""
+    item = StageItem(Path(input_path), Path(output_dir))
+    for stage in PIPELINE_STAGES:
+        result = run_stage(task, stage, item)
+        if result is not None:
+            return result
+    return TaskResult(False, f"失败: {item.input_path.name} (encode 段没有返回结果)", None, timings=item.timings)
@@ -0,0 +1,170 @@
+from __future__ import annotations
+
+import io
+import os
+import shutil
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Iterable, Iterator
+
+
+# 输入预读：输入在慢速 / 网络存储（NAS、SMB）上时，计算 worker 打开文件会卡在 IO 等待上。
+# 开启后由一个小 IO 线程池按处理顺序提前读取后面的 N 个文件，计算 worker 拿到的是已经在本机的数据：
+# - memory：整个文件读进内存，task 从 BytesIO 解码（Pillow、MIDI）
+# - file：复制到本地临时目录，外部程序（ffmpeg / ffprobe）改读本地副本
+# task 用 input_prefetch = "memory" / "file" 声明支持的方式，未声明的 task 不预读。
+
+PREFETCH_MODES = ("memory", "file")
+
+# 预读数据（含已派发、尚未处理完的文件）合计的默认上限（MB）
+DEFAULT_PREFETCH_MB = 256
+
+# 同时读取的文件数上限
+IO_THREADS = 4
+
+# 本进程内已预读的数据：输入路径 -> 文件内容（memory）或本地副本路径（file）
+_payloads: dict[Path, bytes | Path] = {}
+_payloads_lock = threading.Lock()
+
+
+def put(path: Path, payload: bytes | Path) -> None:
+    with _payloads_lock:
+        _payloads[Path(path)] = payload
+
+
+def take(path: Path) -> bytes | Path | None:
+    """取出（并移出本进程）预读数据，用于随任务发给进程池子进程。"""
+    with _payloads_lock:
+        return _payloads.pop(Path(path), None)
+
+
+def discard(path: Path) -> None:
+    """文件处理完后释放预读数据，本地副本一并删除。"""
+    payload = take(path)
+    if isinstance(payload, Path):
+        try:
+            payload.unlink()
+        except OSError:
+            pass
+
+
+def _peek(path: Path) -> bytes | Path | None:
+    with _payloads_lock:
+        return _payloads.get(Path(path))
+
+
+def input_source(path: Path) -> io.BytesIO | Path:
+    """给 Image.open 等接受文件对象的解码器：预读到内存时返回 BytesIO，否则返回路径。"""
+    payload = _peek(path)
+    if isinstance(payload, bytes):
+        return io.BytesIO(payload)
+    return payload if payload is not None else Path(path)
+
+
+def read_input(path: Path) -> bytes:
+    payload = _peek(path)
+    if isinstance(payload, bytes):
+        return payload
+    return Path(payload if payload is not None else path).read_bytes()
+
+
+def input_file(path: Path) -> Path:
+    """给 ffmpeg 等只接受路径的外部程序：有本地副本时返回副本路径，否则返回原路径。"""
+    payload = _peek(path)
+    return payload if isinstance(payload, Path) else Path(path)
+
+
+class Prefetcher:
+    """按顺序预读 jobs 中的输入文件，读完一个产出一个（产出顺序不变）。
+
+    预读数据计入 held，文件处理完（release）后扣除；held 达到 budget 时不再发起新的读取，
+    先把已读完的产出，都产出后等待在途文件处理完。单个文件大于 budget 时也照常读取。
+    """
+
+    def __init__(self, mode: str, ahead: int, budget: int) -> None:
+        self.mode = mode if mode in PREFETCH_MODES else "memory"
+        self._ahead = max(1, int(ahead))
+        self._budget = max(1, int(budget))
+        self._pool = ThreadPoolExecutor(max_workers=min(IO_THREADS, self._ahead), thread_name_prefix="prefetch")
+        self._scratch = Path(tempfile.mkdtemp(prefix="atmob_prefetch_")) if self.mode == "file" else None
+        self._cond = threading.Condition()
+        self._sizes: dict[Path, int] = {}  # 已预读、尚未处理完的文件 -> 字节数
+        self._held = 0
+        self._count = 0
+        self.files = 0
+        self.bytes_read = 0
+
+    def _load(self, path: Path) -> None:
+        if self._scratch is not None:
+            with self._cond:
+                self._count += 1
+                n = self._count
+            local = self._scratch / f"{n}{path.suffix}"
+            shutil.copyfile(path, local)
+            payload: bytes | Path = local
+            size = os.path.getsize(local)
+        else:
+            payload = path.read_bytes()
+            size = len(payload)
+        put(path, payload)
+        with self._cond:
+            self._sizes[path] = size
+            self._held += size
+            self.files += 1
+            self.bytes_read += size
+
+    def release(self, path: Path) -> None:
+        """文件处理完（或被撤销）时调用，可在任意线程；被撤销的文件的预读数据在这里丢弃。"""
+        discard(path)
+        with self._cond:
+            size = self._sizes.pop(path, 0)
+            if size:
+                self._held -= size
+                self._cond.notify_all()
+
+    def full(self) -> bool:
+        """预读额度已用满：此时从 iter 取下一个文件可能要等 release，调用方须保证有别的线程会 release。"""
+        with self._cond:
+            return self._held >= self._budget
+
+    def iter(self, jobs: Iterable[tuple[Path, Path]]) -> Iterator[tuple[Path, Path]]:
+        pending: deque[tuple[tuple[Path, Path], Future]] = deque()
+
+        def head() -> tuple[Path, Path]:
+            job, fut = pending.popleft()
+            try:
+                fut.result()
+            except OSError:
+                # 读不了就不预读，交给 task 按原路径打开并报告错误
+                pass
+            return job
+
+        for job in jobs:
+            while self.full():
+                if pending:
+                    yield head()
+                    continue
+                # 预读的都已派发：等在途文件处理完腾出额度
+                with self._cond:
+                    while self._held >= self._budget:
+                        self._cond.wait()
+            pending.append((job, self._pool.submit(self._load, Path(job[0]))))
+            while pending and (len(pending) >= self._ahead or pending[0][1].done()):
+                yield head()
+        while pending:
+            yield head()
+
+    def close(self) -> None:
+        """整批结束：丢弃未处理（被取消）的预读数据并删除本地临时目录。"""
+        self._pool.shutdown(wait=True, cancel_futures=True)
+        with self._cond:
+            leftover = list(self._sizes)
+            self._sizes.clear()
+            self._held = 0
+        for path in leftover:
+            discard(path)
+        if self._scratch is not None:
+            shutil.rmtree(self._scratch, ignore_errors=True)
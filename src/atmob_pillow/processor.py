@@ -1,94 +1,245 @@
 from __future__ import annotations
 
+import io
+import zlib
 from dataclasses import dataclass
-from pathlib import Path
 
 from PIL import Image
 
 
 @dataclass(frozen=True)
-class ProcessResult:
-    ok: bool
-    message: str
-    output_path: Path | None = None
+class ResizePreset:
+    resample: str  # 默认重采样滤镜（RESAMPLE_FILTERS 的 key）
+    reducing_gap: float | None  # 先按整数倍 reduce 再滤波；None 表示单次滤波
+    draft_factor: int  # JPEG 按 DCT 缩放解码到 ≥ 目标尺寸 × 该倍数；0 表示完整解码
+
+
+# 速度/质量预设：
+# - quality：完整解码 + 单次滤波（原行为）
+# - balanced：JPEG 解码到目标 2 倍以上，再 reduce + LANCZOS，肉眼几乎无差别
+# - fast：JPEG 直接解码到接近目标尺寸，reduce + BILINEAR，适合缩略图
+RESIZE_PRESETS: dict[str, ResizePreset] = {
+    "quality": ResizePreset(resample="lanczos", reducing_gap=None, draft_factor=0),
+    "balanced": ResizePreset(resample="lanczos", reducing_gap=3.0, draft_factor=2),
+    "fast": ResizePreset(resample="bilinear", reducing_gap=2.0, draft_factor=1),
+}
+
+RESAMPLE_FILTERS: dict[str, int] = {
+    "lanczos": Image.LANCZOS,
+    "bicubic": Image.BICUBIC,
+    "bilinear": Image.BILINEAR,
+    "box": Image.BOX,
+    "nearest": Image.NEAREST,
+}
+
+
+def target_size(w: int, h: int, target_w: int, target_h: int) -> tuple[int, int] | None:
+    """计算输出尺寸；无需缩放时返回 None。
+
+    * target_w>0,target_h>0：强制拉伸到指定宽高
+    * 仅 target_w>0：按宽缩放，高度按原比例计算
+    * 仅 target_h>0：按高缩放，宽度按原比例计算
+    """
+    tw = int(target_w)
+    th = int(target_h)
+    if tw > 0 and th > 0:
+        size = (tw, th)
+    elif tw > 0:
+        size = (tw, max(1, int(round(h * (tw / float(w))))))
+    elif th > 0:
+        size = (max(1, int(round(w * (th / float(h))))), th)
+    else:
+        return None
+    return None if size == (w, h) else size
+
+
+def _preset(resize_mode: str) -> ResizePreset:
+    return RESIZE_PRESETS.get((resize_mode or "quality").lower(), RESIZE_PRESETS["quality"])
+
 
+def apply_draft(
+    img: Image.Image, target_w: int, target_h: int, resize_mode: str = "quality"
+) -> tuple[int, int] | None:
+    """计算输出尺寸，并按预设为 JPEG 设置 draft（缩小解码）。
 
-def process_one_image(
-    input_path: str | Path,
-    output_dir: str | Path,
+    需在 load() 之前调用；返回值传给 resize_image(size=...)，draft 后 img.size 已变小，不能再据此计算。
+    """
+    preset = _preset(resize_mode)
+    w, h = img.size
+    size = target_size(w, h, target_w, target_h)
+    if size is None:
+        return None
+
+    tw, th = size
+    if preset.draft_factor and tw < w and th < h:
+        # JPEG：在 DCT 域按 1/2、1/4、1/8 缩小解码，省掉大部分解码时间和内存
+        # （draft 保证结果不小于请求尺寸；非 JPEG 调用无效果）
+        img.draft(img.mode, (tw * preset.draft_factor, th * preset.draft_factor))
+    return size
+
+
+def resize_image(
+    img: Image.Image,
     target_w: int,
     target_h: int,
-    quality: int,
-) -> ProcessResult:
-    """处理单张图片
-
-    - 缩放：使用 LANCZOS 重采样。
-      * target_w>0,target_h>0：强制拉伸到指定宽高（例如 3000x3000）
-      * 仅 target_w>0：按宽缩放，高度按原比例计算
-      * 仅 target_h>0：按高缩放，宽度按原比例计算
-    - 输出：保持原扩展名，文件名加 _resized
-    - 质量：不再仅限 JPEG，会尽量应用到支持 quality 的格式；不支持则忽略。
+    resize_mode: str = "quality",
+    resample: str = "",
+    size: tuple[int, int] | None = None,
+) -> Image.Image:
+    """按预设缩放；未先调用 apply_draft 时必须在图片解码（load）之前调用，JPEG 才能走 draft 快速路径。"""
+    preset = _preset(resize_mode)
+    flt = RESAMPLE_FILTERS.get((resample or preset.resample).lower(), Image.LANCZOS)
+
+    if size is None:
+        size = apply_draft(img, target_w, target_h, resize_mode)
+    if size is None:
+        return img
+    return img.resize(size, resample=flt, reducing_gap=preset.reducing_gap)
+
+
+def pixel_bytes(mode: str, size: tuple[int, int]) -> int:
+    """Pillow 在内存中存放一张图的字节数：多通道模式（RGB 也一样）每像素占 4 字节，L/P/1 占 1 字节。"""
+    w, h = size
+    if mode in ("1", "L", "P"):
+        per_pixel = 1
+    elif mode.startswith("I;16"):
+        per_pixel = 2
+    else:
+        per_pixel = 4
+    return w * h * per_pixel
+
+
+def estimate_footprint(
+    img: Image.Image, target_w: int, target_h: int, resize_mode: str = "quality", flatten: bool = False
+) -> int:
+    """只读文件头估算处理这张图的内存峰值（字节）：解码后的原图 + 缩放结果（+ 转 JPEG 时的 RGB 副本）。
+
+    img 为 Image.open 返回的未解码图片；JPEG 按预设会缩小解码时，按 draft 后的尺寸计算。
     """
+    size = apply_draft(img, target_w, target_h, resize_mode)
+    total = pixel_bytes(img.mode, img.size)
+    final = img.size
+    if size is not None:
+        total += pixel_bytes(img.mode, size)
+        final = size
+    if flatten:
+        total += pixel_bytes("RGB", final)
+    return total
+
+
+def flatten_for_jpeg(img: Image.Image) -> Image.Image:
+    """JPEG 不支持透明：有 alpha 时以白底合成，避免黑底；其它模式转 RGB。"""
+    if img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info):
+        background = Image.new("RGB", img.size, (255, 255, 255))
+        if img.mode == "P":
+            img = img.convert("RGBA")
+        # alpha 通道
+        background.paste(img, mask=img.split()[-1])
+        return background
+    return img.convert("RGB")
+
 
-    in_path = Path(input_path)
-    out_dir = Path(output_dir)
-    out_dir.mkdir(parents=True, exist_ok=True)
-
-    stem = in_path.stem
-    suffix = in_path.suffix  # 保持原扩展名（含点）
-    out_path = out_dir / f"{stem}_resized{suffix}"
-
-    if out_path.exists():
-        return ProcessResult(ok=True, message=f"跳过(已存在): {out_path.name}", output_path=out_path)
-
-    try:
-        with Image.open(in_path) as img:
-            w, h = img.size
-
-            tw = int(target_w)
-            th = int(target_h)
-
-            # 计算缩放比例：输出严格到指定宽高（会改变比例/拉伸），并使用 LANCZOS
-            # 如果你希望“不拉伸、保持比例”，应改回 fit 逻辑（min 比例）
-            if tw > 0 and th > 0:
-                if (w, h) != (tw, th):
-                    img = img.resize((tw, th), resample=Image.LANCZOS)
-            elif tw > 0 >= th:
-                # 只指定宽：按原比例计算高
-                new_h = max(1, int(round(h * (tw / float(w)))))
-                img = img.resize((tw, new_h), resample=Image.LANCZOS)
-            elif th > 0 >= tw:
-                # 只指定高：按原比例计算宽
-                new_w = max(1, int(round(w * (th / float(h)))))
-                img = img.resize((new_w, th), resample=Image.LANCZOS)
-
-            suffix_lower = suffix.lower()
-            save_kwargs: dict = {}
-
-            q = int(quality)
-
-            # 尽量对更多格式应用“质量/压缩”
-            # - JPEG: quality + optimize
-            # - WebP: quality
-            # - PNG: Pillow 不用 quality，使用 compress_level(0-9)，这里做一个简单映射
-            if suffix_lower in {".jpg", ".jpeg"}:
-                save_kwargs["quality"] = q
-                save_kwargs["optimize"] = True
-            elif suffix_lower == ".webp":
-                save_kwargs["quality"] = q
-            elif suffix_lower == ".png":
-                # quality(1-100) -> compress_level(9-0)
-                compress_level = int(round((100 - q) * 9 / 99))
-                compress_level = max(0, min(9, compress_level))
-                save_kwargs["compress_level"] = compress_level
-                save_kwargs["optimize"] = True
-            else:
-                # 其它格式：尝试传 quality（若不支持会在 except 中失败，因此这里不强行加）
-                pass
-
-            img.save(out_path, **save_kwargs)
-
-        return ProcessResult(ok=True, message=f"成功: {in_path.name} -> {out_path.name}", output_path=out_path)
-
-    except Exception as e:  # 单图失败不中断，由 Worker 捕获/记录
-        return ProcessResult(ok=False, message=f"失败: {in_path.name} ({e})", output_path=None)
+@dataclass(frozen=True)
+class EncoderProfile:
+    png_level: int | None  # zlib 压缩级别 0-9；None 表示按质量映射
+    png_strategy: int  # zlib 策略（Pillow 的 compress_type，如 zlib.Z_RLE）；-1 为 zlib 默认
+    png_optimize: bool  # 逐行尝试各种滤波并用最高压缩级别：体积最小，往往也是整批最慢的一步
+    jpeg_optimize: bool  # 多一遍统计，生成最优 Huffman 表（无损，代价小）
+    jpeg_progressive: bool
+    jpeg_subsampling: int  # 色度抽样：-1 为 Pillow 默认（4:2:0），0 为 4:4:4，1 为 4:2:2，2 为 4:2:0
+    webp_method: int  # 0（最快）- 6（最慢、最小），Pillow 默认 4
+
+
+# 编码速度/体积预设（只影响 PNG / JPEG / WebP）：
+# - default：原有行为，JPEG / PNG 都 optimize，PNG 压缩级别按质量映射
+# - fastest：PNG 最低压缩级别 + RLE 策略，不做任何额外的优化遍，WebP method 0
+# - balanced：PNG 用 zlib 默认级别、不 optimize，WebP method 2；体积通常只大几个百分点，编码快数倍
+# - smallest：PNG optimize、JPEG 渐进式、WebP method 6
+ENCODER_PROFILES: dict[str, EncoderProfile] = {
+    "default": EncoderProfile(
+        png_level=None,
+        png_strategy=-1,
+        png_optimize=True,
+        jpeg_optimize=True,
+        jpeg_progressive=False,
+        jpeg_subsampling=-1,
+        webp_method=4,
+    ),
+    "fastest": EncoderProfile(
+        png_level=1,
+        png_strategy=zlib.Z_RLE,
+        png_optimize=False,
+        jpeg_optimize=False,
+        jpeg_progressive=False,
+        jpeg_subsampling=2,
+        webp_method=0,
+    ),
+    "balanced": EncoderProfile(
+        png_level=6,
+        png_strategy=-1,
+        png_optimize=False,
+        jpeg_optimize=True,
+        jpeg_progressive=False,
+        jpeg_subsampling=-1,
+        webp_method=2,
+    ),
+    "smallest": EncoderProfile(
+        png_level=9,
+        png_strategy=-1,
+        png_optimize=True,
+        jpeg_optimize=True,
+        jpeg_progressive=True,
+        jpeg_subsampling=-1,
+        webp_method=6,
+    ),
+}
+
+DEFAULT_ENCODER_PROFILE = "default"
+
+
+def encoder_profile(name: str) -> EncoderProfile:
+    return ENCODER_PROFILES.get((name or DEFAULT_ENCODER_PROFILE).lower(), ENCODER_PROFILES[DEFAULT_ENCODER_PROFILE])
+
+
+def save_kwargs_for(out_ext: str, quality: int, profile: str = DEFAULT_ENCODER_PROFILE) -> dict:
+    """把“质量/压缩率(1-100)”与编码预设（ENCODER_PROFILES）映射成 Pillow 的保存参数。
+
+    - JPEG: quality + optimize / progressive / subsampling
+    - WebP: quality + method
+    - PNG: Pillow 不用 quality，使用 compress_level(0-9)；预设未指定级别时按质量做一个简单映射
+    - 其它格式：不传参数（传了不支持的参数会保存失败）
+    """
+    ext = out_ext.lower()
+    q = int(quality)
+    p = encoder_profile(profile)
+    if ext in {".jpg", ".jpeg"}:
+        kwargs = {"quality": q, "optimize": p.jpeg_optimize}
+        if p.jpeg_progressive:
+            kwargs["progressive"] = True
+        if p.jpeg_subsampling >= 0:
+            kwargs["subsampling"] = p.jpeg_subsampling
+        return kwargs
+    if ext == ".webp":
+        return {"quality": q, "method": p.webp_method}
+    if ext == ".png":
+        if p.png_level is None:
+            # quality(1-100) -> compress_level(9-0)
+            compress_level = int(round((100 - q) * 9 / 99))
+            compress_level = max(0, min(9, compress_level))
+        else:
+            compress_level = p.png_level
+        kwargs = {"compress_level": compress_level, "optimize": p.png_optimize}
+        if p.png_strategy >= 0:
+            kwargs["compress_type"] = p.png_strategy
+        return kwargs
+    return {}
+
+
+def encode_image(img: Image.Image, out_ext: str, save_kwargs: dict) -> bytes:
+    """编码到内存，与写盘分开计时；格式按扩展名推断（与 img.save(path) 一致）。"""
+    fmt = Image.registered_extensions().get(out_ext.lower())
+    if fmt is None:
+        raise ValueError(f"不支持的输出格式: {out_ext}")
+    buf = io.BytesIO()
+    img.save(buf, format=fmt, **save_kwargs)
+    return buf.getvalue()
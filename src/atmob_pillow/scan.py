@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Iterable, Iterator
+
+
+@dataclass(frozen=True)
+class ScanItem:
+    path: Path
+    rel_dir: str  # 相对输入根目录的子目录，"" 表示根目录
+    entry: os.DirEntry | None = None  # scandir 得到的目录项（stat 结果可复用）
+
+
+def _same_dir(a: str, b: str) -> bool:
+    return os.path.normcase(os.path.abspath(a)) == os.path.normcase(os.path.abspath(b))
+
+
+def iter_files(
+    root: str | Path,
+    accept: Callable[[Path], bool] | None = None,
+    recursive: bool = False,
+    output_root: str | Path | None = None,
+) -> Iterator[ScanItem]:
+    """基于 os.scandir 的流式扫描：边遍历边产出，调用方可以在第一个文件就开始处理。
+
+    - 直接使用目录项自带的类型信息判断文件/目录，不再对每个文件额外 stat
+    - recursive=True 时递归子目录（不跟随目录符号链接，避免环）
+    - 输出目录 output_root 位于输入目录内部时整棵跳过
+    - 某个目录恰好就是它自己的输出目录（输出到输入目录本身）时，先完整读出该目录再产出，
+      避免把本次运行刚写出的文件再扫进来
+    """
+
+    root_str = os.fspath(root)
+    out_str = os.fspath(output_root) if output_root is not None else None
+    out_is_root = out_str is not None and _same_dir(root_str, out_str)
+
+    stack: list[tuple[str, str]] = [(root_str, "")]
+    while stack:
+        dir_path, rel_dir = stack.pop()
+        try:
+            it = os.scandir(dir_path)
+        except OSError:
+            continue
+
+        with it:
+            # 输出与输入是同一棵目录树：当前目录也会被写入，先拿快照
+            entries: Iterable[os.DirEntry] = list(it) if out_is_root else it
+
+            sub_dirs: list[tuple[str, str]] = []
+            for entry in entries:
+                try:
+                    if entry.is_file():
+                        p = Path(entry.path)
+                        if accept is None or accept(p):
+                            yield ScanItem(p, rel_dir, entry)
+                    elif recursive and entry.is_dir(follow_symlinks=False):
+                        if out_str is not None and not out_is_root and _same_dir(entry.path, out_str):
+                            continue
+                        sub_rel = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+                        sub_dirs.append((entry.path, sub_rel))
+                except OSError:
+                    continue
+
+        # 反序压栈，保证子目录按读取顺序处理
+        stack.extend(reversed(sub_dirs))
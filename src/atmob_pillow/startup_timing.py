@@ -0,0 +1,168 @@
+from __future__ import annotations
+
+import json
+import os
+import sys
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Iterator
+
+
+# 冷启动计时：统计从入口开始到主窗口首次显示的耗时，以及其间各个包 import 的耗时。
+# 用法：python -m atmob_pillow --startup-timing（或设置环境变量 ATMOB_STARTUP_TIMING=1），
+# 窗口显示后输出报告并退出。打包成无控制台的 exe 时没有 stderr，可令 ATMOB_STARTUP_TIMING=报告文件路径。
+# 不用 python -X importtime：打包后的 exe 无法传解释器参数。
+
+FLAG = "--startup-timing"
+ENV = "ATMOB_STARTUP_TIMING"
+
+_recorder: ImportRecorder | None = None
+
+
+class _TimedLoader:
+    """包装模块的 loader，计时 create_module（扩展模块的加载）与 exec_module（执行模块代码）。"""
+
+    def __init__(self, loader, recorder: ImportRecorder, name: str) -> None:
+        self._loader = loader
+        self._recorder = recorder
+        self._name = name
+
+    def create_module(self, spec):
+        with self._recorder.measure(self._name):
+            return self._loader.create_module(spec)
+
+    def exec_module(self, module) -> None:
+        with self._recorder.measure(self._name):
+            self._loader.exec_module(module)
+
+    def __getattr__(self, attr):
+        # 资源读取等其它接口原样转给真正的 loader
+        return getattr(self._loader, attr)
+
+
+class ImportRecorder:
+    """放在 sys.meta_path 最前面：自己不查找模块，只给其余 finder 找到的 loader 套上计时。"""
+
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        self.target = "-"  # 报告输出位置："-" 为 stderr，否则为文件路径
+        self.self_time: dict[str, float] = defaultdict(float)
+        self._stack: list[float] = []
+        self._finding = False
+
+    @contextmanager
+    def measure(self, name: str) -> Iterator[None]:
+        # 只记自身耗时（扣除其间嵌套的 import），各包相加不会重复计算
+        self._stack.append(0.0)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            children = self._stack.pop()
+            if self._stack:
+                self._stack[-1] += elapsed
+            self.self_time[name] += elapsed - children
+
+    def find_spec(self, fullname, path=None, target=None):
+        if self._finding:
+            return None
+        self._finding = True
+        try:
+            for finder in sys.meta_path:
+                if finder is self or not hasattr(finder, "find_spec"):
+                    continue
+                spec = finder.find_spec(fullname, path, target)
+                if spec is not None:
+                    break
+            else:
+                return None
+        finally:
+            self._finding = False
+        loader = spec.loader
+        if loader is not None and hasattr(loader, "exec_module"):
+            spec.loader = _TimedLoader(loader, self, fullname)
+        return spec
+
+    def by_package(self) -> dict[str, float]:
+        totals: dict[str, float] = defaultdict(float)
+        for name, seconds in self.self_time.items():
+            totals[name.partition(".")[0]] += seconds
+        return dict(sorted(totals.items(), key=lambda kv: kv[1], reverse=True))
+
+    def report(self, first_window_s: float, top: int = 10) -> str:
+        packages = self.by_package()
+        import_total = sum(packages.values())
+        lines = [
+            f"首个窗口显示: {first_window_s * 1000:.0f} ms（其中 import {import_total * 1000:.0f} ms，"
+            f"{len(self.self_time)} 个模块）",
+            "按包统计（自身耗时）:",
+        ]
+        for name, seconds in list(packages.items())[:top]:
+            lines.append(f"  {name:<24} {seconds * 1000:8.1f} ms")
+        lines.append("最慢的模块:")
+        slowest = sorted(self.self_time.items(), key=lambda kv: kv[1], reverse=True)[:top]
+        for name, seconds in slowest:
+            lines.append(f"  {name:<40} {seconds * 1000:8.1f} ms")
+        # 最后一行为 JSON，便于脚本 / CI 记录并跟踪
+        lines.append(
+            json.dumps(
+                {
+                    "event": "startup",
+                    "first_window_ms": round(first_window_s * 1000, 1),
+                    "import_ms": round(import_total * 1000, 1),
+                    "packages_ms": {k: round(v * 1000, 1) for k, v in packages.items()},
+                },
+                ensure_ascii=False,
+            )
+        )
+        return "\n".join(lines)
+
+
+def _target() -> str:
+    """"-" 为 stderr，其它非空值为文件路径，空串表示未开启。"""
+    value = os.environ.get(ENV, "").strip()
+    if value in ("", "0"):
+        return "-" if FLAG in sys.argv[1:] else ""
+    return "-" if value == "1" else value
+
+
+def start() -> bool:
+    """在入口处、import Qt 之前调用；请求了计时则开始记录。"""
+    global _recorder
+    if _recorder is not None:
+        return True
+    target = _target()
+    if not target:
+        return False
+    if FLAG in sys.argv:
+        # 不把参数传给 Qt
+        sys.argv.remove(FLAG)
+    _recorder = ImportRecorder()
+    _recorder.target = target
+    sys.meta_path.insert(0, _recorder)
+    return True
+
+
+def enabled() -> bool:
+    return _recorder is not None
+
+
+def finish() -> None:
+    """主窗口首次显示后调用：输出报告。"""
+    global _recorder
+    recorder = _recorder
+    if recorder is None:
+        return
+    first_window_s = time.perf_counter() - recorder.started
+    if recorder in sys.meta_path:
+        sys.meta_path.remove(recorder)
+    _recorder = None
+
+    text = recorder.report(first_window_s)
+    if recorder.target != "-":
+        with open(recorder.target, "a", encoding="utf-8") as f:
+            f.write(text + "\n")
+    elif sys.stderr is not None:
+        print(text, file=sys.stderr, flush=True)
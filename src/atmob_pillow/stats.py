@@ -0,0 +1,253 @@
+from __future__ import annotations
+
+import heapq
+import math
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+
+
+# 各阶段耗时的统一命名（秒），TaskResult.timings 的 key：
+# - open：打开文件 / 读文件头
+# - analyze：预分析（响度测量等第一遍扫描，命中缓存时接近 0）
+# - decode：解码（图片像素 / MIDI 解析）
+# - transform：缩放、合成、量化等处理
+# - encode：编码（图片编码到内存 / 生成 MusicXML）
+# - write：写盘
+# - subprocess：外部进程（ffmpeg）的墙钟时间
+STAGES = ("open", "analyze", "decode", "transform", "encode", "write", "subprocess")
+
+# 直方图分桶：相邻桶相差 5%，从 1 微秒起
+_BUCKET_BASE = 1.05
+_MIN_SECONDS = 1e-6
+
+_PERCENTILES = (("p50", 0.50), ("p95", 0.95), ("p99", 0.99))
+
+
+class StageTimer:
+    """累计单个文件各阶段耗时：with timer.stage("decode"): ...
+
+    传入 timings 时累加到该 dict（流水线各段共用同一个文件的 timings）。
+    """
+
+    def __init__(self, timings: dict[str, float] | None = None) -> None:
+        self.timings: dict[str, float] = {} if timings is None else timings
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = self.timings.get(name, 0.0) + time.perf_counter() - start
+
+
+class _Histogram:
+    """对数分桶直方图：分位数相对误差约 5%，内存与文件数无关（百万文件也不增长）。"""
+
+    def __init__(self) -> None:
+        self._counts: dict[int, int] = {}
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds: float) -> None:
+        idx = 0 if seconds <= _MIN_SECONDS else int(math.log(seconds / _MIN_SECONDS, _BUCKET_BASE)) + 1
+        self._counts[idx] = self._counts.get(idx, 0) + 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, q: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = max(1, math.ceil(q * self.count))
+        seen = 0
+        for idx in sorted(self._counts):
+            seen += self._counts[idx]
+            if seen >= rank:
+                # 取桶上界，不超过实际最大值
+                return min(self.max, _MIN_SECONDS * _BUCKET_BASE**idx)
+        return self.max
+
+    def to_dict(self) -> dict:
+        data = {"count": self.count, "total": round(self.total, 6)}
+        for name, q in _PERCENTILES:
+            data[name] = round(self.percentile(q), 6)
+        data["max"] = round(self.max, 6)
+        return data
+
+
+def _fmt_seconds(seconds: float) -> str:
+    if seconds < 1:
+        return f"{seconds * 1000:.1f}ms"
+    return f"{seconds:.2f}s"
+
+
+class PipelineStats:
+    """分阶段流水线每一段的统计：worker 利用率、输入队列（等待本段处理的文件）的平均 / 最大深度。
+
+    某段利用率高、输入队列常满，说明它是瓶颈，应给它加 worker；队列总是空的段 worker 有富余。
+    """
+
+    def __init__(self, stages: dict[str, tuple[int, str]]) -> None:
+        self.stages = dict(stages)  # 段名 -> (worker 数, thread / process)
+        self._busy = {name: 0.0 for name in stages}
+        self._items = {name: 0 for name in stages}
+        self._depth = {name: 0 for name in stages}
+        self._max_depth = {name: 0 for name in stages}
+        self._depth_area = {name: 0.0 for name in stages}  # 深度 × 持续时间
+        self._start = self._last = time.perf_counter()
+
+    def stage_done(self, name: str, seconds: float) -> None:
+        self._busy[name] += seconds
+        self._items[name] += 1
+
+    def queue_depths(self, depths: dict[str, int]) -> None:
+        """队列深度变化时调用；按时间加权求平均。"""
+        now = time.perf_counter()
+        elapsed = now - self._last
+        self._last = now
+        for name, depth in depths.items():
+            self._depth_area[name] += self._depth[name] * elapsed
+            self._depth[name] = depth
+            self._max_depth[name] = max(self._max_depth[name], depth)
+
+    def to_dict(self) -> dict:
+        wall = max(self._last - self._start, 1e-9)
+        return {
+            name: {
+                "workers": workers,
+                "backend": backend,
+                "files": self._items[name],
+                "busy_seconds": round(self._busy[name], 6),
+                "utilization": round(self._busy[name] / (workers * wall), 3),
+                "queue_avg": round(self._depth_area[name] / wall, 3),
+                "queue_max": self._max_depth[name],
+            }
+            for name, (workers, backend) in self.stages.items()
+        }
+
+    def report_lines(self) -> list[str]:
+        lines = []
+        for name, d in self.to_dict().items():
+            kind = "进程" if d["backend"] == "process" else "线程"
+            lines.append(
+                f"  流水线 {name}（{d['workers']} {kind}）: 利用率 {d['utilization'] * 100:.0f}%，"
+                f"等待队列 平均 {d['queue_avg']:.1f} / 最大 {d['queue_max']}"
+            )
+        return lines
+
+
+class RunStats:
+    """整批的耗时统计：各阶段 p50/p95/p99、吞吐（文件/秒、MB/秒）、最慢的 N 个文件。
+
+    只统计带 timings 的结果（实际处理过的文件）；跳过的文件与异常字符串不计入。
+    """
+
+    def __init__(self, slowest_n: int = 5) -> None:
+        self._slowest_n = slowest_n
+        self._stages: dict[str, _Histogram] = {}
+        self._per_file = _Histogram()
+        self._slowest: list[tuple[float, str]] = []  # 最小堆，只保留 N 个
+        self.files = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self._start = time.perf_counter()
+        self._end: float | None = None
+        self.pipeline: PipelineStats | None = None  # 按分阶段流水线执行时的各段统计
+        self.encoder_profile = ""  # 图片 task 的编码预设（processor.ENCODER_PROFILES），报告中单列编码代价
+
+    def add(self, path: Path, result) -> None:
+        timings = getattr(result, "timings", None)
+        if not timings:
+            return
+
+        self.files += 1
+        self.bytes_in += int(getattr(result, "bytes_in", 0) or 0)
+        self.bytes_out += int(getattr(result, "bytes_out", 0) or 0)
+
+        for stage, seconds in timings.items():
+            hist = self._stages.get(stage)
+            if hist is None:
+                hist = self._stages[stage] = _Histogram()
+            hist.add(seconds)
+
+        total = sum(timings.values())
+        self._per_file.add(total)
+        item = (total, str(path))
+        if len(self._slowest) < self._slowest_n:
+            heapq.heappush(self._slowest, item)
+        elif self._slowest and total > self._slowest[0][0]:
+            heapq.heapreplace(self._slowest, item)
+
+    def finish(self) -> None:
+        self._end = time.perf_counter()
+
+    @property
+    def wall_seconds(self) -> float:
+        return (self._end if self._end is not None else time.perf_counter()) - self._start
+
+    def _stage_names(self) -> list[str]:
+        known = [s for s in STAGES if s in self._stages]
+        return known + sorted(s for s in self._stages if s not in STAGES)
+
+    def to_dict(self) -> dict:
+        wall = self.wall_seconds
+        rate = (lambda v: round(v / wall, 3)) if wall > 0 else (lambda v: 0.0)
+        return {
+            "files": self.files,
+            "wall_seconds": round(wall, 3),
+            "files_per_sec": rate(self.files),
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "mb_in_per_sec": rate(self.bytes_in / 1e6),
+            "mb_out_per_sec": rate(self.bytes_out / 1e6),
+            "per_file": self._per_file.to_dict(),
+            "stages": {name: self._stages[name].to_dict() for name in self._stage_names()},
+            "slowest": [{"path": p, "seconds": round(s, 6)} for s, p in sorted(self._slowest, reverse=True)],
+            "pipeline": self.pipeline.to_dict() if self.pipeline is not None else None,
+            "encoder": self._encoder_cost(),
+        }
+
+    def _encoder_cost(self) -> dict | None:
+        """本批编码预设的代价：编码总耗时与输出字节数（对比不同预设时看这两项）。"""
+        hist = self._stages.get("encode")
+        if not self.encoder_profile or hist is None or not hist.count:
+            return None
+        return {
+            "profile": self.encoder_profile,
+            "files": hist.count,
+            "encode_seconds": round(hist.total, 6),
+            "encode_seconds_per_file": round(hist.total / hist.count, 6),
+            "bytes_out": self.bytes_out,
+            "bytes_out_per_file": self.bytes_out // max(1, self.files),
+        }
+
+    def report_lines(self) -> list[str]:
+        if not self.files:
+            return []
+
+        d = self.to_dict()
+        lines = [
+            f"统计: 处理 {d['files']} 个文件，用时 {_fmt_seconds(d['wall_seconds'])}，"
+            f"{d['files_per_sec']:.1f} 个/秒，读 {d['mb_in_per_sec']:.2f} MB/s，写 {d['mb_out_per_sec']:.2f} MB/s"
+        ]
+        for name in self._stage_names():
+            hist = self._stages[name]
+            parts = " ".join(f"{label} {_fmt_seconds(hist.percentile(q))}" for label, q in _PERCENTILES)
+            lines.append(f"  {name}: {parts}，合计 {_fmt_seconds(hist.total)}")
+        if self._slowest:
+            slowest = "，".join(f"{Path(p).name} {_fmt_seconds(s)}" for s, p in sorted(self._slowest, reverse=True))
+            lines.append(f"  最慢: {slowest}")
+        encoder = d["encoder"]
+        if encoder is not None:
+            lines.append(
+                f"  编码配置 {encoder['profile']}: 编码合计 {_fmt_seconds(encoder['encode_seconds'])}"
+                f"（平均 {_fmt_seconds(encoder['encode_seconds_per_file'])}/个），"
+                f"输出 {encoder['bytes_out'] / 1e6:.2f} MB（平均 {encoder['bytes_out_per_file'] / 1e3:.1f} KB/个）"
+            )
+        if self.pipeline is not None:
+            lines.extend(self.pipeline.report_lines())
+        return lines
@@ -1,9 +1,10 @@
 from __future__ import annotations
 
-from .image_resize import ImageResizeTask
-
 
 def list_tasks() -> list[object]:
+    # 按需导入：import atmob_pillow.tasks.* 不应连带加载 Pillow
+    from .image_resize import ImageResizeTask
+
     return [
         ImageResizeTask(),
     ]
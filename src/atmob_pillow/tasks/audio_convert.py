@@ -1,13 +1,22 @@
 from __future__ import annotations
 
-import shutil
+import json
+import os
+import sqlite3
 import subprocess
-from dataclasses import dataclass
+import threading
+from dataclasses import dataclass, replace
 from pathlib import Path
-from typing import Optional
 
 from atmob_pillow.audio_format_map import AUDIO_FORMAT_PRESETS
 
+from ..ffmpeg_caps import find_binary, get_caps, resolve_binaries
+from ..loudness import LoudnessCache, measure_cached, normalize_filter
+from ..prefetch import input_file
+from ..stats import StageTimer
+from ..writer import commit, discard, temp_path
+from .common import TaskResult, parse_ext_list
+
 
 AUDIO_EXTENSIONS = {
     ".sou",
@@ -41,29 +50,138 @@ AUDIO_EXTENSIONS = {
 }
 
 
-@dataclass
-class TaskResult:
-    success: bool
-    message: str
-    output_path: Optional[Path] = None
+@dataclass(frozen=True)
+class AudioTarget:
+    fmt: str  # 输出扩展名（不含点），如 "mp3"
+    codec: str = ""  # 空表示不指定，由 ffmpeg 决定
+    bitrate_kbps: int = 0  # 0 表示不指定
+    sample_rate_hz: int = 0  # 0 表示不指定
 
 
-class AudioConvertTask:
-    id = "audio.convert"
-    name = "音频转换"
-    description = "音频格式互转（依赖 ffmpeg）"
+def parse_output_targets(raw: str) -> list[AudioTarget]:
+    """解析多格式输出规格，例如 "mp3:192, m4a:128:44100, ogg"。
+
+    每项为 格式[:码率kbps[:采样率Hz]]，编码器取 AUDIO_FORMAT_PRESETS 的推荐值；同一格式只能出现一次。
+    """
+    targets: list[AudioTarget] = []
+    seen: set[str] = set()
+    for part in (raw or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        fields = [f.strip() for f in part.split(":")]
+        fmt = fields[0].lower().lstrip(".")
+        if not fmt:
+            raise ValueError(f"缺少输出格式: {part}")
+        if fmt in seen:
+            raise ValueError(f"输出格式重复: {fmt}")
+        seen.add(fmt)
+        bitrate = int(fields[1].lower().rstrip("k")) if len(fields) > 1 and fields[1] else 0
+        sample_rate = int(fields[2]) if len(fields) > 2 and fields[2] else 0
+        preset = AUDIO_FORMAT_PRESETS.get(fmt)
+        codec = (preset.codec if preset else "") or ""
+        targets.append(AudioTarget(fmt=fmt, codec=codec, bitrate_kbps=bitrate, sample_rate_hz=sample_rate))
+    return targets
+
+
+# ffmpeg 编码器名 -> ffprobe 报告的 codec_name（未列出的两者相同，例如 pcm_s16le、flac、aac）
+_ENCODER_CODEC_NAMES = {
+    "libmp3lame": "mp3",
+    "libvorbis": "vorbis",
+    "libopus": "opus",
+    "libspeex": "speex",
+    "libopencore_amrnb": "amr_nb",
+    "libgsm": "gsm",
+    "dca": "dts",
+}
+
+
+def parse_time(value: str) -> float:
+    """把 "HH:MM:SS(.ms)"、"MM:SS" 或 "SS" 转成秒；格式不对时抛 ValueError。"""
+    parts = value.strip().split(":")
+    if not parts or len(parts) > 3:
+        raise ValueError(f"时间格式不对: {value}")
+    seconds = 0.0
+    for part in parts:
+        seconds = seconds * 60 + float(part)
+    return seconds
+
+
+def fast_cut_args(cut_start: str, cut_end: str) -> list[str] | None:
+    """放在 -i 之前的 -ss/-t 剪切参数；不剪切时返回 []，时间无法解析或区间为空时返回 None。"""
+    if not (cut_start or cut_end):
+        return []
+    try:
+        start = parse_time(cut_start) if cut_start else 0.0
+        end = parse_time(cut_end) if cut_end else None
+    except ValueError:
+        return None
+    if end is not None and end <= start:
+        return None
+
+    args: list[str] = []
+    if start > 0:
+        args += ["-ss", f"{start:g}"]
+    # 输入端定位后时间戳从 0 开始，-to 的含义会变，改用时长 -t
+    if end is not None:
+        args += ["-t", f"{end - start:g}"]
+    return args
+
+
+def open_loudness_cache() -> LoudnessCache | None:
+    """打开响度测量缓存；缓存目录不可用时返回 None（每次重新测量）。"""
+    try:
+        return LoudnessCache()
+    except (OSError, sqlite3.Error):
+        return None
+
+
+def _file_size(path: Path) -> int:
+    try:
+        return path.stat().st_size
+    except OSError:
+        return 0
+
+
+class FfmpegAudioTask:
+    """调用 ffmpeg 的音频 task 的公共部分：按 input_filter_mode 过滤输入，登记运行中的 ffmpeg 以便取消。
+
+    子类需要有 input_filter_mode / input_filter_custom 参数，ffmpeg 一律经 _run_ffmpeg 启动。
+    """
 
     def __init__(self) -> None:
-        self.output_format: str = "mp3"
-        self.audio_codec: str = ""  # 空表示自动
-        self.channels: int = 0  # 0 表示不指定
-        self.bitrate_kbps: int = 0  # 0 表示不指定
-        self.sample_rate_hz: int = 0  # 0 表示不指定
-        self.volume_db: str = ""  # e.g. "-10dB"，空表示无更改
-        self.cut_start: str = ""  # "HH:MM:SS" 或 "SS"，空表示无
-        self.cut_end: str = ""  # "HH:MM:SS" 或 "SS"，空表示无
-        self.input_filter_mode: str = "all"  # all/only_mp3/only_wav/custom
-        self.input_filter_custom: str = ""  # e.g. "mp3,wav,flac"
+        # 正在运行的 ffmpeg 子进程：取消时统一终止
+        # 可重入：进程池子进程里 cancel 由 SIGTERM 处理函数调用，可能正好打断持锁的 _run_ffmpeg
+        self._procs: set[subprocess.Popen] = set()
+        self._procs_lock = threading.RLock()
+        self._cancelled = False
+
+    def cancel(self) -> None:
+        """终止所有正在运行的 ffmpeg，之后的文件直接返回取消。"""
+        with self._procs_lock:
+            self._cancelled = True
+            procs = list(self._procs)
+        for proc in procs:
+            try:
+                proc.kill()
+            except OSError:
+                pass
+
+    def _run_ffmpeg(self, cmd: list[str]) -> tuple[int, str]:
+        with self._procs_lock:
+            if self._cancelled:
+                return -1, "已取消"
+            proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+            self._procs.add(proc)
+        if self._cancelled:
+            # 启动期间被取消（取消时它还没登记）
+            proc.kill()
+        try:
+            _, stderr = proc.communicate()
+        finally:
+            with self._procs_lock:
+                self._procs.discard(proc)
+        return proc.returncode, stderr or ""
 
     def accept_file(self, file_path: Path) -> bool:
         suffix = file_path.suffix.lower()
@@ -76,84 +194,310 @@ class AudioConvertTask:
         if mode == "only_wav":
             return suffix == ".wav"
         if mode == "custom":
-            raw = self.input_filter_custom or ""
-            exts = set()
-            for part in raw.split(","):
-                p = part.strip().lower()
-                if not p:
-                    continue
-                if not p.startswith("."):
-                    p = "." + p
-                exts.add(p)
+            exts = parse_ext_list(self.input_filter_custom or "")
             # 自定义为空则视为不过滤
             return (not exts) or (suffix in exts)
 
         return True
 
-    def _build_output_path(self, input_path: Path, output_dir: Path) -> Path:
-        out_ext = (self.output_format or "mp3").lower().lstrip(".")
+
+class AudioConvertTask(FfmpegAudioTask):
+    id = "audio.convert"
+    name = "音频转换"
+    description = "音频格式互转（依赖 ffmpeg）"
+    resource_profile = "subprocess"  # 每个文件一个 ffmpeg 进程，自动并发时同时协调 -threads
+    input_prefetch = "file"  # 开启预读时先复制到本地临时目录，ffmpeg / ffprobe 读本地副本
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.output_format: str = "mp3"
+        self.audio_codec: str = ""  # 空表示自动
+        self.channels: int = 0  # 0 表示不指定
+        self.bitrate_kbps: int = 0  # 0 表示不指定
+        self.sample_rate_hz: int = 0  # 0 表示不指定
+        self.volume_db: str = ""  # e.g. "-10dB"，空表示无更改
+        self.cut_start: str = ""  # "HH:MM:SS" 或 "SS"，空表示无
+        self.cut_end: str = ""  # "HH:MM:SS" 或 "SS"，空表示无
+        # fast：-ss/-t 放在 -i 之前直接定位到起点（转码时仍是逐帧精确的，流复制时按数据包对齐）
+        # accurate：-ss/-to 放在 -i 之后，从头解码到起点，并且不走流复制，保证采样级精确
+        self.cut_accuracy: str = "fast"
+        # 源编码与目标一致、且无需改码率/采样率/声道/音量时，直接复制音频流（-c:a copy），不重新编码
+        self.stream_copy: bool = True
+        self.input_filter_mode: str = "all"  # all/only_mp3/only_wav/custom
+        self.input_filter_custom: str = ""  # e.g. "mp3,wav,flac"
+        self.overwrite: bool = False  # True：输出已存在也重新生成（增量清单判定需要重建时）
+        # 多格式输出：非空时忽略 output_format / audio_codec，一次解码同时输出多个格式，见 parse_output_targets
+        self.output_formats: str = ""
+        # 每个 ffmpeg 的线程数；0 表示按并发数自动分配（核数 / 并发数），并发为 1 时交给 ffmpeg 自己决定
+        self.ffmpeg_threads: int = 0
+        self._auto_threads = 0
+        # 响度标准化（EBU R128 两遍 loudnorm）：开启后忽略 volume_db；
+        # 第一遍的测量结果按文件缓存，同一文件换格式/换目标响度重新导出时只需跑编码这一遍
+        self.loudnorm: bool = False
+        self.loudnorm_i: float = -16.0  # 目标综合响度 LUFS（广播常用 -23，播客/流媒体常用 -16）
+        self.loudnorm_tp: float = -1.5  # 真峰值上限 dBTP
+        self.loudnorm_lra: float = 11.0  # 响度范围 LU
+        self._loudness_cache: LoudnessCache | None = None
+        self._loudness_cache_opened = False
+        self.write_fsync: str = "none"  # 输出改名为最终文件名前的 fsync 策略，见 writer.FSYNC_POLICIES
+
+    def set_parallelism(self, n: int) -> None:
+        """并发数确定/变化时由执行器调用：多个 ffmpeg 同时运行时分摊 CPU，避免线程数超额。"""
+        self._auto_threads = 0 if n <= 1 else max(1, (os.cpu_count() or 1) // n)
+
+    def _build_output_path(self, input_path: Path, output_dir: Path, fmt: str | None = None) -> Path:
+        out_ext = (fmt or self.output_format or "mp3").lower().lstrip(".")
         # 方案A：输出文件名包含源文件名全名，避免 stem 冲突
         return Path(output_dir) / f"{input_path.name}_converted.{out_ext}"
 
+    def _targets(self) -> list[AudioTarget]:
+        if (self.output_formats or "").strip():
+            targets = parse_output_targets(self.output_formats)
+            # 未单独指定码率/采样率的目标沿用任务设置
+            return [
+                AudioTarget(
+                    fmt=t.fmt,
+                    codec=t.codec,
+                    bitrate_kbps=t.bitrate_kbps or int(self.bitrate_kbps),
+                    sample_rate_hz=t.sample_rate_hz or int(self.sample_rate_hz),
+                )
+                for t in targets
+            ]
+
+        fmt = (self.output_format or "mp3").lower().lstrip(".")
+        preset = AUDIO_FORMAT_PRESETS.get(fmt)
+        # 编码器：用户选了优先；否则使用推荐；否则不指定
+        codec = self.audio_codec or (preset.codec if preset else "") or ""
+        return [AudioTarget(fmt, codec, int(self.bitrate_kbps), int(self.sample_rate_hz))]
+
+    def _input_cut_args(self) -> list[str] | None:
+        """快速剪切：放在 -i 之前的 -ss/-t；需要精确剪切或时间无法解析时返回 None（改用输出端剪切）。"""
+        if (self.cut_start or self.cut_end) and (self.cut_accuracy or "fast").lower() == "accurate":
+            return None
+        return fast_cut_args(self.cut_start, self.cut_end)
+
+    def _loudness_filter(self, ffmpeg: str, input_path: Path, timer: StageTimer) -> tuple[str, int]:
+        """第二遍用的 loudnorm 滤镜和源采样率；测量优先取缓存，没有时先跑第一遍。测量失败抛 RuntimeError。"""
+        if not self._loudness_cache_opened:
+            self._loudness_cache = open_loudness_cache()
+            self._loudness_cache_opened = True
+        # 测量统一用输入端剪切：精确剪切只差不到一帧，对整体响度没有影响，缓存也能和分析任务共用
+        cut = fast_cut_args(self.cut_start, self.cut_end) or []
+        with timer.stage("analyze"):
+            m, _ = measure_cached(
+                self._loudness_cache, ffmpeg, input_path, cut, run=self._run_ffmpeg, source=input_file(input_path)
+            )
+        audio_filter = normalize_filter(m, float(self.loudnorm_i), float(self.loudnorm_tp), float(self.loudnorm_lra))
+        return audio_filter, m.sample_rate
+
+    def _can_copy(self, target: AudioTarget, source: dict | None) -> bool:
+        """目标编码与源一致、且没有任何需要重新编码的改动时可以直接复制音频流。"""
+        if source is None or not target.codec or target.bitrate_kbps > 0:
+            return False
+        if source.get("codec_name") != _ENCODER_CODEC_NAMES.get(target.codec, target.codec):
+            return False
+        if target.sample_rate_hz > 0 and int(source.get("sample_rate") or 0) != target.sample_rate_hz:
+            return False
+        if int(self.channels) > 0 and int(source.get("channels") or 0) != int(self.channels):
+            return False
+        return True
+
+    def _probe(self, input_path: Path) -> dict | None:
+        """用 ffprobe 读取第一条音频流的编码/采样率/声道；没有 ffprobe 或读取失败时返回 None。"""
+        ffprobe = find_binary("ffprobe")
+        if ffprobe is None:
+            return None
+        cmd = [
+            ffprobe,
+            "-v",
+            "error",
+            "-select_streams",
+            "a:0",
+            "-show_entries",
+            "stream=codec_name,sample_rate,channels",
+            "-of",
+            "json",
+            str(input_file(input_path)),
+        ]
+        try:
+            proc = subprocess.run(cmd, capture_output=True, text=True, timeout=60)
+            streams = json.loads(proc.stdout or "{}").get("streams") or []
+        except (OSError, ValueError, subprocess.TimeoutExpired):
+            return None
+        if proc.returncode != 0 or not streams:
+            return None
+        return streams[0]
+
+    def _output_args(self, target: AudioTarget, output_cut: bool, copy: bool) -> list[str]:
+        """单个输出的参数（ffmpeg 的输出选项只作用于紧随其后的那个输出文件）。"""
+        args: list[str] = []
+
+        # 精确剪切：放在 -i 之后，从头解码到起点
+        if output_cut:
+            if self.cut_start:
+                args += ["-ss", self.cut_start]
+            if self.cut_end:
+                args += ["-to", self.cut_end]
+
+        # 输出容器（推荐）
+        preset = AUDIO_FORMAT_PRESETS.get(target.fmt)
+        if preset and preset.container:
+            args += ["-f", preset.container]
+
+        if copy:
+            return args + ["-c:a", "copy"]
+
+        if target.codec:
+            args += ["-c:a", target.codec]
+        threads = int(self.ffmpeg_threads) or self._auto_threads
+        if threads > 0:
+            args += ["-threads", str(threads)]
+
+        # 声道/采样率/码率：只有用户设置才传
+        if int(self.channels) > 0:
+            args += ["-ac", str(int(self.channels))]
+        if target.sample_rate_hz > 0:
+            args += ["-ar", str(target.sample_rate_hz)]
+        if target.bitrate_kbps > 0:
+            args += ["-b:a", f"{target.bitrate_kbps}k"]
+        return args
+
+    def preflight(self) -> str:
+        """整批开始前检查一次 ffmpeg 及所选格式/编码器是否可用；返回错误信息，可用时返回空串。"""
+        resolve_binaries()
+        try:
+            targets = self._targets()
+        except ValueError as e:
+            return f"输出格式设置有误: {e}"
+        if not targets:
+            return "未设置输出格式"
+
+        try:
+            caps = get_caps()
+        except (OSError, subprocess.SubprocessError) as e:
+            return f"无法运行 ffmpeg: {e}"
+        if caps is None:
+            return "未找到 ffmpeg：请先安装并确保在 PATH 中"
+
+        for t in targets:
+            preset = AUDIO_FORMAT_PRESETS.get(t.fmt)
+            if preset and preset.container and preset.container not in caps.muxers:
+                return f"当前 ffmpeg 不支持输出格式 {t.fmt}（缺少封装 {preset.container}）"
+            if t.codec and t.codec not in caps.encoders:
+                return f"当前 ffmpeg 不支持编码器 {t.codec}（输出格式 {t.fmt}）：请换用其它格式/编码器，或安装包含该编码器的 ffmpeg"
+        return ""
+
     def process_one(self, input_path: Path, output_dir: Path) -> TaskResult:
-        if shutil.which("ffmpeg") is None:
+        ffmpeg = find_binary("ffmpeg")
+        if ffmpeg is None:
             return TaskResult(False, "未找到 ffmpeg：请先安装并确保在 PATH 中", None)
 
+        try:
+            targets = self._targets()
+        except ValueError as e:
+            return TaskResult(False, f"失败: {input_path.name} ({e})", None)
+        if not targets:
+            return TaskResult(False, f"失败: {input_path.name} (未设置输出格式)", None)
+
         out_dir = Path(output_dir)
         out_dir.mkdir(parents=True, exist_ok=True)
 
-        out_path = self._build_output_path(input_path, out_dir)
-        if out_path.exists():
-            return TaskResult(True, f"跳过(已存在): {out_path.name}", out_path)
+        out_paths = [self._build_output_path(input_path, out_dir, t.fmt) for t in targets]
+        if not self.overwrite and all(p.exists() for p in out_paths):
+            return TaskResult(True, f"跳过(已存在): {', '.join(p.name for p in out_paths)}", out_paths[0], output_paths=out_paths)
 
-        out_ext = out_path.suffix.lower().lstrip(".")
-        preset = AUDIO_FORMAT_PRESETS.get(out_ext)
+        timer = StageTimer()
+
+        input_cut = self._input_cut_args()
+        output_cut = input_cut is None
+
+        audio_filter = ""
+        if self.loudnorm:
+            try:
+                audio_filter, source_rate = self._loudness_filter(ffmpeg, input_path, timer)
+            except RuntimeError as e:
+                if self._cancelled:
+                    return TaskResult(False, f"已取消: {input_path.name}", None)
+                return TaskResult(False, f"失败: {input_path.name} (响度测量失败: {e})", None, timings=timer.timings)
+            # loudnorm 内部按 192kHz 处理，未指定采样率的输出还原成源采样率
+            if source_rate > 0:
+                targets = [t if t.sample_rate_hz else replace(t, sample_rate_hz=source_rate) for t in targets]
+        elif self.volume_db:
+            audio_filter = f"volume={self.volume_db}"
+
+        # 流复制：有滤镜或需要精确剪切时不可能复制，也就不必 probe
+        copies = [False] * len(targets)
+        if self.stream_copy and not audio_filter and not output_cut:
+            with timer.stage("open"):
+                source = self._probe(input_path)
+            copies = [self._can_copy(t, source) for t in targets]
 
         cmd = [
-            "ffmpeg",
+            ffmpeg,
             "-y",
             "-hide_banner",
             "-loglevel",
             "error",
-            "-i",
-            str(input_path),
         ]
+        # -threads 放在 -i 之前限制解码线程，输出端（_output_args）再限制编码线程
+        threads = int(self.ffmpeg_threads) or self._auto_threads
+        if threads > 0:
+            cmd += ["-threads", str(threads)]
+        cmd += input_cut or []
+        # 开启预读时读本地副本
+        cmd += ["-i", str(input_file(input_path))]
 
-        # 剪切（精度优先，放在 -i 之后）
-        if self.cut_start:
-            cmd += ["-ss", self.cut_start]
-        if self.cut_end:
-            cmd += ["-to", self.cut_end]
+        # ffmpeg 先写到临时名（保留扩展名），全部成功后再改名：失败 / 取消不会留下半截的输出
+        tmp_paths = [temp_path(p) for p in out_paths]
 
-        # 输出容器（推荐）
-        if preset and preset.container:
-            cmd += ["-f", preset.container]
+        if len(targets) == 1:
+            # 音量（dB）或响度标准化
+            if audio_filter:
+                cmd += ["-filter:a", audio_filter]
+            cmd += self._output_args(targets[0], output_cut, copies[0]) + [str(tmp_paths[0])]
+        else:
+            # 多格式：一个输入、多个输出，源文件只解码一次；
+            # 有滤镜时先处理一次再 asplit 分给各输出，避免每个输出各跑一遍滤镜
+            labels = [f"[a{i}]" for i in range(len(targets))]
+            if audio_filter:
+                cmd += ["-filter_complex", f"[0:a]{audio_filter},asplit={len(targets)}{''.join(labels)}"]
+            for i, (target, tmp_path) in enumerate(zip(targets, tmp_paths)):
+                cmd += ["-map", labels[i] if audio_filter else "0:a"]
+                cmd += self._output_args(target, output_cut, copies[i]) + [str(tmp_path)]
 
-        # 编码器：用户选了优先；否则使用推荐；否则不指定
-        codec_to_use = self.audio_codec or (preset.codec if preset else "")
-        if codec_to_use:
-            cmd += ["-c:a", codec_to_use]
-
-        # 声道/采样率/码率：只有用户设置才传
-        if int(self.channels) > 0:
-            cmd += ["-ac", str(int(self.channels))]
-        if int(self.sample_rate_hz) > 0:
-            cmd += ["-ar", str(int(self.sample_rate_hz))]
-        if int(self.bitrate_kbps) > 0:
-            cmd += ["-b:a", f"{int(self.bitrate_kbps)}k"]
+        with timer.stage("subprocess"):
+            returncode, stderr = self._run_ffmpeg(cmd)
+        try:
+            if returncode == 0:
+                with timer.stage("write"):
+                    for tmp_path, out_path in zip(tmp_paths, out_paths):
+                        commit(tmp_path, out_path, self.write_fsync)
+        except OSError as e:
+            returncode, stderr = -1, f"写入失败: {e}"
+        finally:
+            for tmp_path in tmp_paths:
+                discard(tmp_path)
 
-        # 音量（dB）
-        if self.volume_db:
-            cmd += ["-filter:a", f"volume={self.volume_db}"]
+        if returncode == 0:
+            msg = f"成功: {input_path.name} -> {', '.join(p.name for p in out_paths)}"
+            if any(copies):
+                msg += " (流复制)"
+            return TaskResult(
+                True,
+                msg,
+                out_paths[0],
+                output_paths=out_paths,
+                timings=timer.timings,
+                bytes_in=_file_size(input_path),
+                bytes_out=sum(_file_size(p) for p in out_paths),
+            )
 
-        cmd.append(str(out_path))
+        if self._cancelled:
+            # 被终止的 ffmpeg 只留下了临时文件（已删除），最终文件名上没有半截文件
+            return TaskResult(False, f"已取消: {input_path.name}", None)
 
-        try:
-            subprocess.run(cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-            return TaskResult(True, f"成功: {input_path.name} -> {out_path.name}", out_path)
-        except subprocess.CalledProcessError as e:
-            err = (e.stderr or "").strip()
-            msg = f"失败: {input_path.name}"
-            if err:
-                msg += f" ({err})"
-            return TaskResult(False, msg, None)
+        err = stderr.strip()
+        msg = f"失败: {input_path.name}"
+        if err:
+            msg += f" ({err})"
+        return TaskResult(False, msg, None, timings=timer.timings)
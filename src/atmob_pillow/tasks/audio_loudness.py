@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+from ..ffmpeg_caps import find_binary, resolve_binaries
+from ..loudness import LoudnessCache, measure_cached
+from ..prefetch import input_file
+from ..stats import StageTimer
+from .audio_convert import FfmpegAudioTask, fast_cut_args, open_loudness_cache
+from .common import TaskResult
+
+
+class AudioLoudnessAnalyzeTask(FfmpegAudioTask):
+    """只做响度测量（loudnorm 第一遍）并写入缓存，不输出文件。
+
+    先对整批素材跑一遍分析，之后 audio.convert 开启响度标准化时直接命中缓存，只需编码一遍。
+    """
+
+    id = "audio.loudness_analyze"
+    name = "响度分析"
+    description = "测量音频响度（EBU R128）并缓存，供响度标准化转换复用（依赖 ffmpeg）"
+    resource_profile = "subprocess"
+    input_prefetch = "file"
+
+    def __init__(self) -> None:
+        super().__init__()
+        # 剪切范围需与之后转换时一致，才能命中同一条缓存
+        self.cut_start: str = ""
+        self.cut_end: str = ""
+        self.remeasure: bool = False  # True：忽略缓存重新测量
+        self.input_filter_mode: str = "all"  # all/only_mp3/only_wav/custom
+        self.input_filter_custom: str = ""
+
+        self._cache: LoudnessCache | None = None
+        self._cache_opened = False
+
+    def preflight(self) -> str:
+        resolve_binaries()
+        if find_binary("ffmpeg") is None:
+            return "未找到 ffmpeg：请先安装并确保在 PATH 中"
+        if fast_cut_args(self.cut_start, self.cut_end) is None:
+            return f"剪切时间设置有误: {self.cut_start or '-'} ~ {self.cut_end or '-'}"
+        return ""
+
+    def process_one(self, input_path: Path, output_dir: Path) -> TaskResult:
+        ffmpeg = find_binary("ffmpeg")
+        if ffmpeg is None:
+            return TaskResult(False, "未找到 ffmpeg：请先安装并确保在 PATH 中", None)
+        if not self._cache_opened:
+            self._cache = open_loudness_cache()
+            self._cache_opened = True
+
+        timer = StageTimer()
+        cut = fast_cut_args(self.cut_start, self.cut_end) or []
+        try:
+            with timer.stage("analyze"):
+                m, cached = measure_cached(
+                    self._cache,
+                    ffmpeg,
+                    input_path,
+                    cut,
+                    run=self._run_ffmpeg,
+                    refresh=bool(self.remeasure),
+                    source=input_file(input_path),
+                )
+        except RuntimeError as e:
+            if self._cancelled:
+                return TaskResult(False, f"已取消: {input_path.name}", None)
+            return TaskResult(False, f"失败: {input_path.name} ({e})", None, timings=timer.timings)
+
+        msg = f"{input_path.name}: {m.input_i:.1f} LUFS, 真峰值 {m.input_tp:.1f} dBTP, LRA {m.input_lra:.1f} LU"
+        if cached:
+            msg = f"跳过(已测量): {msg}"
+        else:
+            msg = f"成功: {msg}"
+        try:
+            bytes_in = input_path.stat().st_size
+        except OSError:
+            bytes_in = 0
+        return TaskResult(True, msg, None, timings=timer.timings, bytes_in=bytes_in)
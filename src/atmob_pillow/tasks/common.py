@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional
+
+
+def normalize_ext(ext: str) -> str:
+    e = (ext or "").strip().lower()
+    if not e:
+        return ""
+    if not e.startswith("."):
+        e = "." + e
+    return e
+
+
+@lru_cache(maxsize=64)
+def parse_ext_list(raw: str) -> frozenset[str]:
+    """解析 "png,jpg,.webp" 这类自定义后缀过滤。
+
+    accept_file 会对每个文件调用；同一个过滤串只解析一次。
+    """
+    exts: set[str] = set()
+    for part in (raw or "").split(","):
+        p = normalize_ext(part)
+        if p:
+            exts.add(p)
+    return frozenset(exts)
+
+
+@dataclass
+class TaskResult:
+    success: bool
+    message: str
+    output_path: Optional[Path] = None
+    # 一个输入生成多个文件时的全部输出（output_path 为其中第一个）；为空时只有 output_path
+    output_paths: list[Path] = field(default_factory=list)
+    timings: dict[str, float] = field(default_factory=dict)  # 阶段 -> 秒，见 stats.STAGES
+    bytes_in: int = 0
+    bytes_out: int = 0
+    # 已编码、尚未写盘的输出 (最终路径, 内容)：由执行器的写入线程原子写入后清空，见 writer.write_behind
+    outputs: list[tuple[Path, bytes]] = field(default_factory=list)
+
+
+def result_output_paths(result) -> list[Path]:
+    """结果对应的全部输出文件：output_paths，没有时为 [output_path]。"""
+    paths = list(getattr(result, "output_paths", None) or [])
+    if not paths:
+        output_path = getattr(result, "output_path", None)
+        if output_path:
+            paths.append(output_path)
+    return paths
+
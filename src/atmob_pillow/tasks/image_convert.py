@@ -1,44 +1,22 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
 from pathlib import Path
-from typing import Optional
 
 from PIL import Image
 
-
-@dataclass
-class TaskResult:
-    success: bool
-    message: str
-    output_path: Optional[Path] = None
-
-
-def _normalize_ext(ext: str) -> str:
-    e = (ext or "").strip().lower()
-    if not e:
-        return ""
-    if not e.startswith("."):
-        e = "." + e
-    return e
-
-
-def _parse_custom_exts(raw: str) -> set[str]:
-    exts: set[str] = set()
-    for part in (raw or "").split(","):
-        p = part.strip().lower()
-        if not p:
-            continue
-        if not p.startswith("."):
-            p = "." + p
-        exts.add(p)
-    return exts
+from ..pipeline import StageItem, run_stages
+from ..prefetch import input_source
+from ..processor import encode_image, estimate_footprint, flatten_for_jpeg, save_kwargs_for
+from ..stats import StageTimer
+from .common import TaskResult, normalize_ext, parse_ext_list
 
 
 class ImageConvertTask:
     id = "image.convert"
     name = "图片转换"
     description = "按后缀过滤并转换图片格式（Pillow），支持透明 PNG 转 JPG 白底处理"
+    resource_profile = "cpu"
+    input_prefetch = "memory"  # 开启预读时从内存解码
 
     def __init__(self) -> None:
         self.input_filter_mode: str = "all"  # all/only_png/only_jpg/custom
@@ -46,6 +24,8 @@ class ImageConvertTask:
 
         self.output_format: str = "jpg"  # jpg/png/webp
         self.quality: int = 90  # 1-100
+        self.encoder_profile: str = "default"  # 编码速度/体积预设，见 processor.ENCODER_PROFILES
+        self.overwrite: bool = False  # True：输出已存在也重新生成（增量清单判定需要重建时）
 
     def accept_file(self, file_path: Path) -> bool:
         suffix = file_path.suffix.lower()
@@ -58,63 +38,70 @@ class ImageConvertTask:
         if mode == "only_jpg":
             return suffix in {".jpg", ".jpeg"}
         if mode == "custom":
-            exts = _parse_custom_exts(self.input_filter_custom)
+            exts = parse_ext_list(self.input_filter_custom)
             return (not exts) or (suffix in exts)
 
         return True
 
     def _build_output_path(self, input_path: Path, output_dir: Path) -> Path:
-        out_ext = _normalize_ext(self.output_format)
+        out_ext = normalize_ext(self.output_format)
         if out_ext in {".jpeg"}:
             out_ext = ".jpg"
         return Path(output_dir) / f"{input_path.name}_converted{out_ext}"
 
+    def estimate_memory(self, input_path: Path) -> int:
+        flatten = self._build_output_path(input_path, Path()).suffix in {".jpg", ".jpeg"}
+        with Image.open(input_source(input_path)) as img:
+            return estimate_footprint(img, 0, 0, flatten=flatten)
+
     def process_one(self, input_path: Path, output_dir: Path) -> TaskResult:
-        out_dir = Path(output_dir)
+        return run_stages(self, input_path, output_dir)
+
+    def stage_decode(self, item: StageItem) -> TaskResult | None:
+        out_dir = item.output_dir
         out_dir.mkdir(parents=True, exist_ok=True)
 
-        out_path = self._build_output_path(input_path, out_dir)
-        if out_path.exists():
+        out_path = self._build_output_path(item.input_path, out_dir)
+        if out_path.exists() and not self.overwrite:
             return TaskResult(True, f"跳过(已存在): {out_path.name}", out_path)
 
+        timer = StageTimer(item.timings)
+        item.data["bytes_in"] = item.input_path.stat().st_size
+        with timer.stage("open"):
+            src = Image.open(input_source(item.input_path))
+        # 解码成功后才交给下一段；损坏的输入在这里就关闭文件句柄 / 预读缓冲
         try:
-            with Image.open(input_path) as img:
-                out_ext = out_path.suffix.lower()
-                save_kwargs: dict = {}
-
-                # 透明 PNG -> JPG：白底合成
-                if out_ext in {".jpg", ".jpeg"}:
-                    if img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info):
-                        background = Image.new("RGB", img.size, (255, 255, 255))
-                        if img.mode == "P":
-                            img = img.convert("RGBA")
-                        # alpha 通道
-                        background.paste(img, mask=img.split()[-1])
-                        img = background
-                    else:
-                        img = img.convert("RGB")
-
-                    save_kwargs["quality"] = int(self.quality)
-                    save_kwargs["optimize"] = True
-
-                elif out_ext == ".png":
-                    # PNG：用 compress_level 映射 quality(1-100)->(9-0)
-                    q = int(self.quality)
-                    compress_level = int(round((100 - q) * 9 / 99))
-                    compress_level = max(0, min(9, compress_level))
-                    save_kwargs["compress_level"] = compress_level
-                    save_kwargs["optimize"] = True
-
-                elif out_ext == ".webp":
-                    save_kwargs["quality"] = int(self.quality)
-
-                else:
-                    # 其他格式：尽量直接保存
-                    pass
-
-                img.save(out_path, **save_kwargs)
-
-            return TaskResult(True, f"成功: {input_path.name} -> {out_path.name}", out_path)
-
-        except Exception as e:
-            return TaskResult(False, f"失败: {input_path.name} ({e})", None)
+            with timer.stage("decode"):
+                src.load()
+        except BaseException:
+            src.close()
+            raise
+        item.data.update(out_path=out_path, image=src)
+        return None
+
+    def stage_transform(self, item: StageItem) -> TaskResult | None:
+        # 透明 PNG -> JPG：白底合成
+        if item.data["out_path"].suffix.lower() in {".jpg", ".jpeg"}:
+            with StageTimer(item.timings).stage("transform"):
+                src = item.data["image"]
+                item.data["image"] = flatten_for_jpeg(src)
+                src.close()
+        return None
+
+    def stage_encode(self, item: StageItem) -> TaskResult | None:
+        out_path = item.data["out_path"]
+        out_ext = out_path.suffix.lower()
+        img = item.data.pop("image")
+        with StageTimer(item.timings).stage("encode"):
+            data = encode_image(img, out_ext, save_kwargs_for(out_ext, self.quality, self.encoder_profile))
+        img.close()
+
+        return TaskResult(
+            True,
+            f"成功: {item.input_path.name} -> {out_path.name}",
+            out_path,
+            timings=item.timings,
+            bytes_in=item.data["bytes_in"],
+            bytes_out=len(data),
+            outputs=[(out_path, data)],
+        )
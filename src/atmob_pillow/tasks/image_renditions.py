@@ -0,0 +1,173 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from pathlib import Path
+
+from PIL import Image
+
+from ..pipeline import StageItem, run_stages
+from ..prefetch import input_source
+from ..processor import (
+    apply_draft,
+    encode_image,
+    estimate_footprint,
+    flatten_for_jpeg,
+    pixel_bytes,
+    resize_image,
+    save_kwargs_for,
+)
+from ..stats import StageTimer
+from .common import TaskResult, normalize_ext
+
+
+@dataclass(frozen=True)
+class Rendition:
+    size: int  # 最长边像素（原图更小时不放大）
+    ext: str  # 输出扩展名，如 ".webp"
+    quality: int
+
+
+def parse_renditions(raw: str) -> list[Rendition]:
+    """解析规格串，例如 "1080:webp:85, 512:jpg:80, 128:png"。
+
+    每项为 最长边:格式[:质量]，质量缺省 90；同一尺寸 + 格式只能出现一次（输出文件名相同）。
+    结果按尺寸从大到小排列（便于逐级缩小）。
+    """
+    items: list[Rendition] = []
+    seen: set[tuple[int, str]] = set()
+    for part in (raw or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        fields = [f.strip() for f in part.split(":")]
+        if len(fields) < 2:
+            raise ValueError(f"规格格式应为 最长边:格式[:质量]: {part}")
+        ext = normalize_ext(fields[1])
+        if ext == ".jpeg":
+            ext = ".jpg"
+        size = int(fields[0])
+        if (size, ext) in seen:
+            raise ValueError(f"输出规格重复（尺寸与格式相同）: {size}:{ext.lstrip('.')}")
+        seen.add((size, ext))
+        quality = int(fields[2]) if len(fields) > 2 and fields[2] else 90
+        items.append(Rendition(size=size, ext=ext, quality=quality))
+    items.sort(key=lambda r: r.size, reverse=True)
+    return items
+
+
+def _fit_long_edge(w: int, h: int, size: int) -> tuple[int, int]:
+    if size <= 0 or max(w, h) <= size:
+        return w, h
+    if w >= h:
+        return size, max(1, int(round(h * size / float(w))))
+    return max(1, int(round(w * size / float(h)))), size
+
+
+class ImageRenditionsTask:
+    id = "image.renditions"
+    name = "多规格输出"
+    description = "一次解码，按多组 尺寸/格式/质量 输出（逐级缩小，Pillow）"
+    resource_profile = "cpu"
+    input_prefetch = "memory"  # 开启预读时从内存解码
+
+    def __init__(self) -> None:
+        self.renditions: str = "1080:webp:85,512:jpg:80,128:png:90"
+        self.resize_mode: str = "quality"  # quality/balanced/fast，见 processor.RESIZE_PRESETS
+        self.resample: str = ""  # 空表示跟随预设
+        self.encoder_profile: str = "default"  # 编码速度/体积预设（各规格共用），见 processor.ENCODER_PROFILES
+        self.overwrite: bool = False  # True：输出已存在也重新生成（增量清单判定需要重建时）
+
+    def accept_file(self, file_path: Path) -> bool:
+        return file_path.suffix.lower() in {".jpg", ".jpeg", ".png", ".webp", ".bmp", ".tif", ".tiff"}
+
+    def _build_output_path(self, input_path: Path, output_dir: Path, r: Rendition) -> Path:
+        # 包含源扩展名与尺寸，避免冲突
+        return Path(output_dir) / f"{input_path.name}_{r.size}{r.ext}"
+
+    def estimate_memory(self, input_path: Path) -> int:
+        # 原图与最大规格同时在内存中，下一级缩小时再多一份（不超过最大规格）
+        renditions = parse_renditions(self.renditions)
+        if not renditions:
+            return 0
+        flatten = any(r.ext == ".jpg" for r in renditions)
+        with Image.open(input_source(input_path)) as img:
+            first = _fit_long_edge(img.width, img.height, renditions[0].size)
+            total = estimate_footprint(img, first[0], 0, self.resize_mode, flatten=flatten)
+            return total + pixel_bytes(img.mode, first)
+
+    def process_one(self, input_path: Path, output_dir: Path) -> TaskResult:
+        return run_stages(self, input_path, output_dir)
+
+    def stage_decode(self, item: StageItem) -> TaskResult | None:
+        input_path = item.input_path
+        out_dir = item.output_dir
+        out_dir.mkdir(parents=True, exist_ok=True)
+
+        try:
+            renditions = parse_renditions(self.renditions)
+        except ValueError as e:
+            return TaskResult(False, f"失败: {input_path.name} ({e})", None)
+        if not renditions:
+            return TaskResult(False, f"失败: {input_path.name} (未设置输出规格)", None)
+
+        out_paths = [self._build_output_path(input_path, out_dir, r) for r in renditions]
+        if not self.overwrite and all(p.exists() for p in out_paths):
+            return TaskResult(True, f"跳过(已存在): {', '.join(p.name for p in out_paths)}", out_paths[0], output_paths=out_paths)
+
+        timer = StageTimer(item.timings)
+        item.data["bytes_in"] = input_path.stat().st_size
+        with timer.stage("open"):
+            src = Image.open(input_source(input_path))
+        # 解码成功后才交给下一段；损坏的输入在这里就关闭文件句柄 / 预读缓冲
+        try:
+            # 最大规格直接从原图缩放（JPEG 可走 draft 缩小解码），之后每一级从上一级继续缩小
+            # 原图只给目标宽度，高度按比例计算，保证与 _fit_long_edge 一致
+            first_w, _ = _fit_long_edge(src.width, src.height, renditions[0].size)
+            with timer.stage("decode"):
+                first_size = apply_draft(src, first_w, 0, self.resize_mode)
+                src.load()
+        except BaseException:
+            src.close()
+            raise
+        item.data.update(renditions=renditions, out_paths=out_paths, image=src, first=(first_w, first_size))
+        return None
+
+    def stage_transform(self, item: StageItem) -> TaskResult | None:
+        src = item.data.pop("image")
+        first_w, first_size = item.data["first"]
+        images: list[Image.Image] = []  # 与 renditions 一一对应，已按需白底合成
+        prev = src
+        with StageTimer(item.timings).stage("transform"):
+            # 按序号判断第一级：原图不大于最大规格时第一级就是原图本身，之后各级仍须从它继续缩小
+            for i, r in enumerate(item.data["renditions"]):
+                if i == 0:
+                    cur = resize_image(src, first_w, 0, self.resize_mode, self.resample, size=first_size)
+                else:
+                    tw, th = _fit_long_edge(prev.width, prev.height, r.size)
+                    cur = resize_image(prev, tw, th, self.resize_mode, self.resample)
+                images.append(flatten_for_jpeg(cur) if r.ext == ".jpg" else cur)
+                prev = cur
+        if all(src is not img for img in images):
+            # 原图不再需要：尽早释放，排队等编码的只有各规格的结果图
+            src.close()
+        item.data["images"] = images
+        return None
+
+    def stage_encode(self, item: StageItem) -> TaskResult | None:
+        out_paths = item.data["out_paths"]
+        outputs: list[tuple[Path, bytes]] = []
+        with StageTimer(item.timings).stage("encode"):
+            for r, out_path, img in zip(item.data["renditions"], out_paths, item.data.pop("images")):
+                outputs.append((out_path, encode_image(img, r.ext, save_kwargs_for(r.ext, r.quality, self.encoder_profile))))
+
+        names = ", ".join(p.name for p in out_paths)
+        return TaskResult(
+            True,
+            f"成功: {item.input_path.name} -> {names}",
+            out_paths[0],
+            output_paths=out_paths,
+            timings=item.timings,
+            bytes_in=item.data["bytes_in"],
+            bytes_out=sum(len(data) for _, data in outputs),
+            outputs=outputs,
+        )
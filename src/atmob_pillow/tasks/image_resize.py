@@ -1,28 +1,31 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
 from pathlib import Path
-from typing import Optional
 
-from ..processor import process_one_image
+from PIL import Image
 
-
-@dataclass
-class TaskResult:
-    success: bool
-    message: str
-    output_path: Optional[Path] = None
+from ..pipeline import StageItem, run_stages
+from ..prefetch import input_source
+from ..processor import apply_draft, encode_image, estimate_footprint, resize_image, save_kwargs_for
+from ..stats import StageTimer
+from .common import TaskResult
 
 
 class ImageResizeTask:
     id = "image.resize"
     name = "图片尺寸调整"
     description = "调整图片到指定尺寸（强制拉伸）"
+    resource_profile = "cpu"
+    input_prefetch = "memory"  # 开启预读时从内存解码
 
     def __init__(self):
         self.target_w = 0
         self.target_h = 0
         self.quality = 100
+        self.encoder_profile = "default"  # 编码速度/体积预设，见 processor.ENCODER_PROFILES
+        self.resize_mode = "quality"  # quality/balanced/fast，见 processor.RESIZE_PRESETS
+        self.resample = ""  # 空表示跟随预设
+        self.overwrite = False  # True：输出已存在也重新生成（增量清单判定需要重建时）
 
     def accept_file(self, file_path: Path) -> bool:
         """判断是否处理该文件"""
@@ -31,19 +34,74 @@ class ImageResizeTask:
             ".jpg", ".jpeg", ".png", ".webp", ".bmp"
         }
 
+    def estimate_memory(self, input_path: Path) -> int:
+        """预计内存峰值（字节），调度器据此控制同时处理的文件数；只读文件头"""
+        with Image.open(input_source(input_path)) as img:
+            return estimate_footprint(img, self.target_w, self.target_h, self.resize_mode)
+
     def process_one(self, input_path: Path, output_dir: Path) -> TaskResult:
-        """处理单个文件"""
-        result = process_one_image(
-            input_path=input_path,
-            output_dir=output_dir,
-            target_w=self.target_w,
-            target_h=self.target_h,
-            quality=self.quality,
-        )
+        """处理单个文件
+
+        - 缩放：默认 LANCZOS 重采样，resize_mode/resample 见 RESIZE_PRESETS。
+          * target_w>0,target_h>0：强制拉伸到指定宽高（例如 3000x3000）
+          * 仅 target_w>0：按宽缩放，高度按原比例计算
+          * 仅 target_h>0：按高缩放，宽度按原比例计算
+        - 输出：保持原扩展名，文件名加 _resized
+        - 质量：尽量应用到支持 quality 的格式，不支持则忽略；编码速度/体积见 ENCODER_PROFILES
+        - overwrite=False 时输出已存在则跳过
+        """
+        return run_stages(self, input_path, output_dir)
+
+    def stage_decode(self, item: StageItem) -> TaskResult | None:
+        out_dir = item.output_dir
+        out_dir.mkdir(parents=True, exist_ok=True)
+
+        # 保持原扩展名，文件名加 _resized
+        suffix = item.input_path.suffix
+        out_path = out_dir / f"{item.input_path.stem}_resized{suffix}"
+        if out_path.exists() and not self.overwrite:
+            return TaskResult(True, f"跳过(已存在): {out_path.name}", out_path)
+
+        timer = StageTimer(item.timings)
+        item.data["bytes_in"] = item.input_path.stat().st_size
+        with timer.stage("open"):
+            src = Image.open(input_source(item.input_path))
+        # 解码成功后才交给下一段；损坏的输入在这里就关闭文件句柄 / 预读缓冲
+        try:
+            with timer.stage("decode"):
+                size = apply_draft(src, self.target_w, self.target_h, self.resize_mode)
+                src.load()
+        except BaseException:
+            src.close()
+            raise
+        item.data.update(out_path=out_path, image=src, size=size)
+        return None
+
+    def stage_transform(self, item: StageItem) -> TaskResult | None:
+        src = item.data["image"]
+        with StageTimer(item.timings).stage("transform"):
+            img = resize_image(src, self.target_w, self.target_h, self.resize_mode, self.resample, size=item.data["size"])
+        if img is not src:
+            src.close()
+        item.data["image"] = img
+        return None
+
+    def stage_encode(self, item: StageItem) -> TaskResult | None:
+        out_path = item.data["out_path"]
+        img = item.data.pop("image")
+        with StageTimer(item.timings).stage("encode"):
+            # 尽量对更多格式应用“质量/压缩”，不支持的格式忽略
+            data = encode_image(img, out_path.suffix, save_kwargs_for(out_path.suffix, self.quality, self.encoder_profile))
+        img.close()
+
         return TaskResult(
-            success=result.ok,
-            message=result.message,
-            output_path=result.output_path,
+            True,
+            f"成功: {item.input_path.name} -> {out_path.name}",
+            out_path,
+            timings=item.timings,
+            bytes_in=item.data["bytes_in"],
+            bytes_out=len(data),
+            outputs=[(out_path, data)],
         )
 
     def get_ui_params(self) -> dict:
@@ -52,4 +110,11 @@ class ImageResizeTask:
             "target_w": {"type": "int", "default": 0, "label": "目标宽度", "min": 0, "max": 10000},
             "target_h": {"type": "int", "default": 0, "label": "目标高度", "min": 0, "max": 10000},
             "quality": {"type": "int", "default": 100, "label": "图片质量", "min": 1, "max": 100, "suffix": "%"},
+            "resize_mode": {"type": "choice", "default": "quality", "label": "速度/质量", "choices": ["quality", "balanced", "fast"]},
+            "encoder_profile": {
+                "type": "choice",
+                "default": "default",
+                "label": "编码配置",
+                "choices": ["default", "fastest", "balanced", "smallest"],
+            },
         }
\ No newline at end of file
@@ -1,113 +1,113 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
 from pathlib import Path
-from typing import Optional
 
 from PIL import Image
 
-
-@dataclass
-class TaskResult:
-    success: bool
-    message: str
-    output_path: Optional[Path] = None
-
-
-def _normalize_ext(ext: str) -> str:
-    e = (ext or "").strip().lower()
-    if not e:
-        return ""
-    if not e.startswith("."):
-        e = "." + e
-    return e
-
-
-def _resize_image(img: Image.Image, target_w: int, target_h: int) -> Image.Image:
-    w, h = img.size
-    tw = int(target_w)
-    th = int(target_h)
-
-    if tw > 0 and th > 0:
-        if (w, h) != (tw, th):
-            return img.resize((tw, th), resample=Image.LANCZOS)
-        return img
-    if tw > 0 and th <= 0:
-        new_h = max(1, int(round(h * (tw / float(w)))))
-        return img.resize((tw, new_h), resample=Image.LANCZOS)
-    if th > 0 and tw <= 0:
-        new_w = max(1, int(round(w * (th / float(h)))))
-        return img.resize((new_w, th), resample=Image.LANCZOS)
-    return img
+from ..pipeline import StageItem, run_stages
+from ..prefetch import input_source
+from ..processor import (
+    apply_draft,
+    encode_image,
+    estimate_footprint,
+    flatten_for_jpeg,
+    resize_image,
+    save_kwargs_for,
+)
+from ..stats import StageTimer
+from .common import TaskResult, normalize_ext
 
 
 class ImageResizeConvertTask:
     id = "image.resize_convert"
     name = "尺寸调整+格式转换"
     description = "先调整尺寸（可拉伸）再转换格式（Pillow），支持透明 PNG 转 JPG 白底处理"
+    resource_profile = "cpu"
+    input_prefetch = "memory"  # 开启预读时从内存解码
 
     def __init__(self) -> None:
         # resize 参数
         self.target_w: int = 0
         self.target_h: int = 0
+        self.resize_mode: str = "quality"  # quality/balanced/fast，见 processor.RESIZE_PRESETS
+        self.resample: str = ""  # 空表示跟随预设
 
         # convert 参数
         self.output_format: str = "jpg"  # jpg/png/webp
         self.quality: int = 90
+        self.encoder_profile: str = "default"  # 编码速度/体积预设，见 processor.ENCODER_PROFILES
+        self.overwrite: bool = False  # True：输出已存在也重新生成（增量清单判定需要重建时）
 
     def accept_file(self, file_path: Path) -> bool:
         return file_path.suffix.lower() in {".jpg", ".jpeg", ".png", ".webp", ".bmp", ".tif", ".tiff"}
 
     def _build_output_path(self, input_path: Path, output_dir: Path) -> Path:
-        out_ext = _normalize_ext(self.output_format)
+        out_ext = normalize_ext(self.output_format)
         if out_ext == ".jpeg":
             out_ext = ".jpg"
         # A1：包含源扩展名，避免冲突
         return Path(output_dir) / f"{input_path.name}_resized_converted{out_ext}"
 
+    def estimate_memory(self, input_path: Path) -> int:
+        flatten = self._build_output_path(input_path, Path()).suffix in {".jpg", ".jpeg"}
+        with Image.open(input_source(input_path)) as img:
+            return estimate_footprint(img, self.target_w, self.target_h, self.resize_mode, flatten=flatten)
+
     def process_one(self, input_path: Path, output_dir: Path) -> TaskResult:
-        out_dir = Path(output_dir)
+        return run_stages(self, input_path, output_dir)
+
+    def stage_decode(self, item: StageItem) -> TaskResult | None:
+        out_dir = item.output_dir
         out_dir.mkdir(parents=True, exist_ok=True)
 
-        out_path = self._build_output_path(input_path, out_dir)
-        if out_path.exists():
+        out_path = self._build_output_path(item.input_path, out_dir)
+        if out_path.exists() and not self.overwrite:
             return TaskResult(True, f"跳过(已存在): {out_path.name}", out_path)
 
+        timer = StageTimer(item.timings)
+        item.data["bytes_in"] = item.input_path.stat().st_size
+        with timer.stage("open"):
+            src = Image.open(input_source(item.input_path))
+        # 解码成功后才交给下一段；损坏的输入在这里就关闭文件句柄 / 预读缓冲
         try:
-            with Image.open(input_path) as img:
-                # resize
-                img = _resize_image(img, self.target_w, self.target_h)
-
-                out_ext = out_path.suffix.lower()
-                save_kwargs: dict = {}
-
-                if out_ext in {".jpg", ".jpeg"}:
-                    # PNG 透明 -> JPG 白底
-                    if img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info):
-                        background = Image.new("RGB", img.size, (255, 255, 255))
-                        if img.mode == "P":
-                            img = img.convert("RGBA")
-                        background.paste(img, mask=img.split()[-1])
-                        img = background
-                    else:
-                        img = img.convert("RGB")
-
-                    save_kwargs["quality"] = int(self.quality)
-                    save_kwargs["optimize"] = True
-
-                elif out_ext == ".png":
-                    q = int(self.quality)
-                    compress_level = int(round((100 - q) * 9 / 99))
-                    compress_level = max(0, min(9, compress_level))
-                    save_kwargs["compress_level"] = compress_level
-                    save_kwargs["optimize"] = True
-
-                elif out_ext == ".webp":
-                    save_kwargs["quality"] = int(self.quality)
-
-                img.save(out_path, **save_kwargs)
-
-            return TaskResult(True, f"成功: {input_path.name} -> {out_path.name}", out_path)
-
-        except Exception as e:
-            return TaskResult(False, f"失败: {input_path.name} ({e})", None)
+            with timer.stage("decode"):
+                size = apply_draft(src, self.target_w, self.target_h, self.resize_mode)
+                src.load()
+        except BaseException:
+            src.close()
+            raise
+        item.data.update(out_path=out_path, image=src, size=size)
+        return None
+
+    def stage_transform(self, item: StageItem) -> TaskResult | None:
+        src = item.data["image"]
+        with StageTimer(item.timings).stage("transform"):
+            # resize
+            img = resize_image(src, self.target_w, self.target_h, self.resize_mode, self.resample, size=item.data["size"])
+
+            # 透明 PNG -> JPG：白底合成
+            if item.data["out_path"].suffix.lower() in {".jpg", ".jpeg"}:
+                img = flatten_for_jpeg(img)
+        if img is not src:
+            # 原图不再需要：尽早释放，排队等编码的只有结果图
+            src.close()
+        item.data["image"] = img
+        return None
+
+    def stage_encode(self, item: StageItem) -> TaskResult | None:
+        out_path = item.data["out_path"]
+        out_ext = out_path.suffix.lower()
+        img = item.data.pop("image")
+        with StageTimer(item.timings).stage("encode"):
+            data = encode_image(img, out_ext, save_kwargs_for(out_ext, self.quality, self.encoder_profile))
+        img.close()
+
+        return TaskResult(
+            True,
+            f"成功: {item.input_path.name} -> {out_path.name}",
+            out_path,
+            timings=item.timings,
+            bytes_in=item.data["bytes_in"],
+            bytes_out=len(data),
+            outputs=[(out_path, data)],
+        )
@@ -1,77 +1,219 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+import importlib.util
+import io
+from functools import lru_cache
 from pathlib import Path
-from typing import Optional
 
+from .. import midi_native
+from ..prefetch import read_input
+from ..stats import StageTimer
+from ..writer import atomic_output
+from .common import TaskResult
 
-@dataclass
-class TaskResult:
-    success: bool
-    message: str
-    output_path: Optional[Path] = None
+
+@lru_cache(maxsize=None)
+def _load_music21():
+    """导入并配置 music21，每个进程只做一次（首次导入要数百毫秒到数秒）。
+
+    只改内存中的设置、不写回用户配置文件：批处理中不弹出下载询问、不打印缺少可选依赖的警告。
+    """
+    import music21
+
+    env = music21.environment.Environment()
+    env["autoDownload"] = "deny"
+    env["warnings"] = 0
+    env["debug"] = 0
+    return music21
 
 
 class MidiToXmlTask:
     id = "midi.to_xml"
     name = "MIDI 转 MusicXML"
     description = "将 MIDI 文件转换为 MusicXML (.musicxml)（依赖 music21）"
+    resource_profile = "cpu"
+    input_prefetch = "memory"
 
     def __init__(self) -> None:
         self.quantize_mode: str = "auto"  # off/auto/1/8/1/16/1/32
         self.remove_tiny_rests: bool = False
+        self.tiny_rest_threshold: float = 0.125  # 短于该时值（四分音符 = 1）的休止符并入前一个音
+        # 按网格量化的简单文件（单声部 / 和弦、拍号调号速度不变）不经 music21，直接解析并流式写出；其它仍走 music21
+        self.fast_path: bool = True
+        self.overwrite: bool = False  # True：输出已存在也重新生成（增量清单判定需要重建时）
+        self.write_fsync: str = "none"  # music21 自己写文件（临时名 + 改名）时的 fsync 策略，见 writer.FSYNC_POLICIES
 
     def accept_file(self, file_path: Path) -> bool:
         return file_path.suffix.lower() in {".mid", ".midi"}
 
-    def process_one(self, input_path: Path, output_dir: Path) -> TaskResult:
+    def preflight(self) -> str:
+        """整批开始前检查 music21 是否可用；返回错误信息，可用时返回空串。"""
+        if importlib.util.find_spec("music21") is None:
+            return "未安装 music21：请先执行 uv pip install music21"
+        return ""
+
+    @staticmethod
+    def warm_up() -> None:
+        """进程池子进程启动时调用：提前导入 music21（进程池因此常驻，跨批次复用）。"""
         try:
-            import music21
+            _load_music21()
         except Exception:
-            return TaskResult(False, "未安装 music21：请先执行 uv pip install music21", None)
+            # 缺依赖时留给 process_one 报告
+            pass
+
+    def _convert_native(self, input_path: Path, timer: StageTimer) -> bytes | None:
+        """快速路径，返回编码好的 MusicXML；文件不在支持范围内时返回 None。"""
+        units = midi_native.GRID_UNITS.get((self.quantize_mode or "").lower())
+        if not self.fast_path or units is None:
+            return None
+        try:
+            with timer.stage("decode"):
+                midi = midi_native.read_smf(read_input(input_path))
+            with timer.stage("transform"):
+                tiny_rest = float(self.tiny_rest_threshold) if self.remove_tiny_rests else 0.0
+                score = midi_native.prepare(midi, units, tiny_rest)
+        except midi_native.Unsupported:
+            return None
+        with timer.stage("encode"):
+            buf = io.StringIO(newline="\n")
+            midi_native.write_musicxml(buf, score)
+            return buf.getvalue().encode("utf-8")
 
+    def process_one(self, input_path: Path, output_dir: Path) -> TaskResult:
+        timer = StageTimer()
         try:
             out_dir = Path(output_dir)
             out_dir.mkdir(parents=True, exist_ok=True)
 
             out_path = out_dir / f"{input_path.stem}.musicxml"
-            if out_path.exists():
+            if out_path.exists() and not self.overwrite:
                 return TaskResult(True, f"跳过(已存在): {out_path.name}", out_path)
 
-            score = music21.converter.parse(str(input_path))
-
-            mode = (self.quantize_mode or "off").lower()
-
-            if mode != "off":
-                if mode == "auto":
-                    # 使用 music21 自带的自动量化逻辑（不指定网格）
-                    for part in score.parts:
-                        part.quantize(inPlace=True)
-                else:
-                    # 指定网格：以 quarterLength 表示
-                    grid_map = {
-                        "1/8": 0.5,
-                        "1/16": 0.25,
-                        "1/32": 0.125,
-                    }
-                    ql = grid_map.get(mode)
-                    if ql is not None:
-                        for part in score.parts:
-                            part.quantize([ql], inPlace=True)
-
-            # 去除小休止符：阈值 1/32 拍 = 0.125（quarterLength）
-            if self.remove_tiny_rests:
-                for part in score.parts:
-                    elements_to_remove = []
-                    for el in part.flatten().notesAndRests:
-                        if isinstance(el, music21.note.Rest) and el.duration.quarterLength < 0.125:
-                            elements_to_remove.append(el)
-                    for el in elements_to_remove:
-                        part.remove(el, recurse=True)
-
-            score.write("musicxml", fp=str(out_path))
-
-            return TaskResult(True, f"成功: {input_path.name} -> {out_path.name}", out_path)
+            data = self._convert_native(input_path, timer)
+            if data is not None:
+                # 由执行器的写入线程落盘
+                return TaskResult(
+                    True,
+                    f"成功: {input_path.name} -> {out_path.name} (快速)",
+                    out_path,
+                    timings=timer.timings,
+                    bytes_in=input_path.stat().st_size,
+                    bytes_out=len(data),
+                    outputs=[(out_path, data)],
+                )
+
+            try:
+                music21 = _load_music21()
+            except Exception:
+                return TaskResult(False, "未安装 music21：请先执行 uv pip install music21", None)
+
+            with timer.stage("decode"):
+                # 指定格式省去按扩展名/内容猜测；不读写 music21 的 pickle 缓存（每个文件只解析一次，缓存只会多一次写盘）
+                # 直接传文件内容：开启预读时不再访问输入所在的存储
+                score = music21.converter.parse(
+                    read_input(input_path), format="midi", forceSource=True, storePickle=False
+                )
+
+            with timer.stage("transform"):
+                self._clean_score(music21, score)
+
+            # music21 直接写文件，编码与写盘无法分开，一并记在 encode；先写临时名，写完再改名
+            with timer.stage("encode"), atomic_output(out_path, self.write_fsync) as tmp:
+                score.write("musicxml", fp=str(tmp))
+
+            return TaskResult(
+                True,
+                f"成功: {input_path.name} -> {out_path.name}",
+                out_path,
+                timings=timer.timings,
+                bytes_in=input_path.stat().st_size,
+                bytes_out=out_path.stat().st_size,
+            )
 
         except Exception as e:
-            return TaskResult(False, f"失败: {input_path.name} ({e})", None)
+            return TaskResult(False, f"失败: {input_path.name} ({e})", None, timings=timer.timings)
+
+    def _clean_score(self, music21, score) -> None:
+        """量化、去除小休止符（原地修改 score）。
+
+        每个声部逐小节（及小节内的 voice）只遍历一次：音符 / 休止符的起点与时值按 music21 quantize
+        的规则取最近的网格，同时把短于阈值的休止符并入前一个音；整个小节处理完后一次性提交改动。
+        """
+        mode = (self.quantize_mode or "off").lower()
+        if mode == "auto":
+            # 与 music21 默认的自动量化相同：十六分与八分三连音两种网格中取误差最小的
+            divisors: tuple[int, ...] = (4, 3)
+        else:
+            units = midi_native.GRID_UNITS.get(mode)
+            divisors = (units,) if units else ()
+        threshold = float(self.tiny_rest_threshold) if self.remove_tiny_rests else 0.0
+        if not divisors and threshold <= 0:
+            return
+
+        for part in score.parts:
+            measures = list(part.getElementsByClass(music21.stream.Measure)) or [part]
+            for measure in measures:
+                for container in (measure, *measure.voices):
+                    self._clean_container(music21, container, divisors, threshold)
+
+    @staticmethod
+    def _clean_container(music21, container, divisors: tuple[int, ...], threshold: float) -> None:
+        nearest = music21.common.nearestMultiple
+
+        def best(value: float, zero_allowed: bool = True, gap: float = 0.0) -> float:
+            # 同 music21 Stream.quantize 的 bestMatch：优先填满到下一个音的间隙，其次误差最小，再其次网格最细
+            found = []
+            for div in divisors:
+                tick = 1 / div
+                match, error, _ = nearest(value, tick)
+                if not zero_allowed and match == 0.0:
+                    match, error = tick, abs(value - tick)
+                remaining = 0.0 if gap % tick == 0 else max(gap - match, 0.0)
+                found.append((remaining, error, tick, match))
+            return min(found)[3]
+
+        items = list(container.notesAndRests)
+        if not items:
+            return
+        offsets = [float(container.elementOffset(el)) for el in items]
+        gaps = [0.0] * len(items)
+        if divisors:
+            offsets = [best(o) for o in offsets]
+            # 到下一个起点不同的元素的距离（列表按起点排序，倒序一遍求出），用于让时值填满间隙
+            nxt = None
+            for i in range(len(items) - 1, -1, -1):
+                if i + 1 < len(items) and offsets[i + 1] > offsets[i]:
+                    nxt = offsets[i + 1]
+                gaps[i] = nxt - offsets[i] if nxt is not None else 0.0
+
+        drops = []
+        last_sounding = None  # 本容器内最近一个音符 / 和弦：吸收其后的小休止符
+        for i, el in enumerate(items):
+            ql = max(float(el.duration.quarterLength), 0.0)
+            is_rest = isinstance(el, music21.note.Rest)
+            if divisors:
+                ql = best(ql, zero_allowed=is_rest or el.duration.isGrace, gap=gaps[i])
+            if is_rest and (ql == 0 or ql < threshold):
+                drops.append(el)
+                if last_sounding is not None and ql > 0:
+                    # 并入前一个音，而不是留下空隙（导出 MusicXML 时空隙会被重新补成休止符）
+                    prev_el, prev_ql = last_sounding
+                    last_sounding = (prev_el, prev_ql + ql)
+                continue
+            if divisors:
+                container.coreSetElementOffset(el, offsets[i])
+            if last_sounding is not None:
+                last_sounding[0].duration.quarterLength = last_sounding[1]
+                last_sounding = None
+            if is_rest:
+                # 保留的休止符之后的小休止符不再并入更早的音
+                if divisors:
+                    el.duration.quarterLength = ql
+            else:
+                last_sounding = (el, ql)
+        if last_sounding is not None:
+            last_sounding[0].duration.quarterLength = last_sounding[1]
+
+        container.coreElementsChanged()
+        if drops:
+            container.remove(drops)
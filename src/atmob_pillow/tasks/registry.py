@@ -1,13 +1,49 @@
 from __future__ import annotations
 
+import importlib
 from dataclasses import dataclass
 from typing import Callable
 
-from .audio_convert import AudioConvertTask
-from .image_convert import ImageConvertTask
-from .image_resize import ImageResizeTask
-from .image_resize_convert import ImageResizeConvertTask
-from .midi_to_xml import MidiToXmlTask
+
+@dataclass(frozen=True)
+class TaskSpec:
+    """task 的轻量元数据：只有 id、名称和实现所在位置，用到时才 import 对应模块（及 Pillow / music21 等依赖）。
+
+    task_id / name 需与 task 类上的 id / name 保持一致。
+    """
+
+    task_id: str
+    name: str
+    module: str  # atmob_pillow.tasks 下的模块名
+    class_name: str
+
+    def load(self) -> type:
+        module = importlib.import_module(f"{__package__}.{self.module}")
+        return getattr(module, self.class_name)
+
+    def create(self) -> object:
+        return self.load()()
+
+
+# 图片工具下的具体功能：GUI 通过 image.tools + active_task_id 分发，命令行可直接使用这些 id
+IMAGE_TASKS: dict[str, TaskSpec] = {
+    spec.task_id: spec
+    for spec in (
+        TaskSpec("image.resize", "图片尺寸调整", "image_resize", "ImageResizeTask"),
+        TaskSpec("image.convert", "图片转换", "image_convert", "ImageConvertTask"),
+        TaskSpec("image.resize_convert", "尺寸调整+格式转换", "image_resize_convert", "ImageResizeConvertTask"),
+        TaskSpec("image.renditions", "多规格输出", "image_renditions", "ImageRenditionsTask"),
+    )
+}
+
+OTHER_TASKS: dict[str, TaskSpec] = {
+    spec.task_id: spec
+    for spec in (
+        TaskSpec("audio.convert", "音频转换", "audio_convert", "AudioConvertTask"),
+        TaskSpec("audio.loudness_analyze", "响度分析", "audio_loudness", "AudioLoudnessAnalyzeTask"),
+        TaskSpec("midi.to_xml", "MIDI 转 MusicXML", "midi_to_xml", "MidiToXmlTask"),
+    )
+}
 
 
 @dataclass(frozen=True)
@@ -18,10 +54,13 @@ class TaskInfo:
 
 
 def list_task_infos() -> list[TaskInfo]:
+    """GUI 左侧的工具列表；只读元数据，不 import 任何 task 模块。"""
+    audio = OTHER_TASKS["audio.convert"]
+    midi = OTHER_TASKS["midi.to_xml"]
     return [
         TaskInfo(task_id="image.tools", name="图片工具", factory=lambda: object()),
-        TaskInfo(task_id=AudioConvertTask.id, name=AudioConvertTask.name, factory=AudioConvertTask),
-        TaskInfo(task_id=MidiToXmlTask.id, name=MidiToXmlTask.name, factory=MidiToXmlTask),
+        TaskInfo(task_id=audio.task_id, name=audio.name, factory=audio.create),
+        TaskInfo(task_id=midi.task_id, name=midi.name, factory=midi.create),
     ]
 
 
@@ -29,22 +68,18 @@ def create_task(task_id: str, params: dict):
     """用于 Worker 创建真正可执行的 task。
 
     - UI 层的 image.tools 是一个“组合工具”，在这里根据 params['active_task_id'] 分发到具体 task。
+    - 具体的图片功能 id（如 image.resize_convert）也可以直接使用（命令行）。
     """
 
     if task_id == "image.tools":
         active = (params.get("active_task_id") or "").strip()
-        if active == "image.resize":
-            return ImageResizeTask()
-        if active == "image.convert":
-            return ImageConvertTask()
-        if active == "image.resize_convert":
-            return ImageResizeConvertTask()
-        return None
+        spec = IMAGE_TASKS.get(active)
+        return spec.create() if spec else None
 
-    if task_id == AudioConvertTask.id:
-        return AudioConvertTask()
+    spec = IMAGE_TASKS.get(task_id) or OTHER_TASKS.get(task_id)
+    return spec.create() if spec else None
 
-    if task_id == MidiToXmlTask.id:
-        return MidiToXmlTask()
 
-    return None
+def list_runnable_task_ids() -> list[str]:
+    """可直接交给 create_task 执行的 task id（命令行使用）。"""
+    return [*IMAGE_TASKS, *OTHER_TASKS]
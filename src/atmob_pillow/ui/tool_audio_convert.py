@@ -1,7 +1,9 @@
 from __future__ import annotations
 
 from PySide6.QtWidgets import (
+    QCheckBox,
     QComboBox,
+    QDoubleSpinBox,
     QGridLayout,
     QHBoxLayout,
     QLabel,
@@ -76,9 +78,13 @@ class AudioConvertToolWidget(QWidget):
         self.ed_cut_end = QLineEdit()
         self.ed_cut_end.setPlaceholderText("时:分:秒 (可选)")
 
+        # 默认快速定位；勾选后从头解码到起点（采样级精确，较慢）
+        self.cb_cut_accurate = QCheckBox("精确剪切")
+
         cut_row_layout.addWidget(self.ed_cut_start)
         cut_row_layout.addWidget(dash)
         cut_row_layout.addWidget(self.ed_cut_end)
+        cut_row_layout.addWidget(self.cb_cut_accurate)
 
         # 输出格式
         lbl_format = QLabel("输出格式")
@@ -87,6 +93,16 @@ class AudioConvertToolWidget(QWidget):
         # 默认选中 MP3
         self.cb_format.setCurrentText("MP3")
 
+        # 源编码与目标一致且无需改码率/采样率/声道/音量时直接复制音频流
+        self.cb_stream_copy = QCheckBox("编码相同时直接复制（不重新编码）")
+        self.cb_stream_copy.setChecked(True)
+
+        # 多格式输出：一次解码同时输出多个格式
+        lbl_multi = QLabel("多格式输出")
+        self.ed_output_formats = QLineEdit()
+        self.ed_output_formats.setPlaceholderText("例如: mp3:192, m4a:128, ogg（格式[:码率[:采样率]]，留空只输出上面的格式）")
+        self.ed_output_formats.textChanged.connect(self._on_output_formats_changed)
+
         # 编解码器
         lbl_codec = QLabel("编解码器")
         self.cb_codec = QComboBox()
@@ -136,10 +152,30 @@ class AudioConvertToolWidget(QWidget):
         for db in [-90, -80, -70, -60, -50, -40, -30, -20, -10]:
             self.cb_volume.addItem(f"{db} dB", f"{db}dB")
 
+        # 响度标准化（两遍 loudnorm，测量结果缓存）：开启后音量设置不生效
+        lbl_loudnorm = QLabel("响度标准化")
+        loudnorm_row = QWidget()
+        loudnorm_row_layout = QHBoxLayout(loudnorm_row)
+        loudnorm_row_layout.setContentsMargins(0, 0, 0, 0)
+        self.cb_loudnorm = QCheckBox("启用，目标")
+        self.sp_loudnorm_i = QDoubleSpinBox()
+        self.sp_loudnorm_i.setRange(-70.0, -5.0)
+        self.sp_loudnorm_i.setSingleStep(0.5)
+        self.sp_loudnorm_i.setDecimals(1)
+        self.sp_loudnorm_i.setSuffix(" LUFS")
+        self.sp_loudnorm_i.setValue(-16.0)
+        self.sp_loudnorm_i.setEnabled(False)
+        self.cb_loudnorm.toggled.connect(self._on_loudnorm_toggled)
+        loudnorm_row_layout.addWidget(self.cb_loudnorm)
+        loudnorm_row_layout.addWidget(self.sp_loudnorm_i)
+        loudnorm_row_layout.addStretch(1)
+
         # 并发数
         lbl_conc = QLabel("并发数")
         self.sp_concurrency = QSpinBox()
-        self.sp_concurrency.setRange(1, 128)
+        self.sp_concurrency.setRange(0, 128)
+        # 0 显示为“自动”：按吞吐自动加减并发数
+        self.sp_concurrency.setSpecialValueText("自动")
         self.sp_concurrency.setValue(1)
 
         layout.addWidget(lbl_filter, 0, 0)
@@ -151,22 +187,38 @@ class AudioConvertToolWidget(QWidget):
         layout.addWidget(cut_row, 2, 1)
         layout.addWidget(lbl_format, 3, 0)
         layout.addWidget(self.cb_format, 3, 1)
-        layout.addWidget(lbl_codec, 4, 0)
-        layout.addWidget(self.cb_codec, 4, 1)
-        layout.addWidget(lbl_channels, 5, 0)
-        layout.addWidget(self.cb_channels, 5, 1)
-        layout.addWidget(lbl_sr, 6, 0)
-        layout.addWidget(self.cb_sample_rate, 6, 1)
-        layout.addWidget(lbl_bitrate, 7, 0)
-        layout.addWidget(self.cb_bitrate, 7, 1)
-        layout.addWidget(lbl_volume, 8, 0)
-        layout.addWidget(self.cb_volume, 8, 1)
-        layout.addWidget(lbl_conc, 9, 0)
-        layout.addWidget(self.sp_concurrency, 9, 1)
+        layout.addWidget(lbl_multi, 4, 0)
+        layout.addWidget(self.ed_output_formats, 4, 1)
+        layout.addWidget(lbl_codec, 5, 0)
+        layout.addWidget(self.cb_codec, 5, 1)
+        layout.addWidget(lbl_channels, 6, 0)
+        layout.addWidget(self.cb_channels, 6, 1)
+        layout.addWidget(lbl_sr, 7, 0)
+        layout.addWidget(self.cb_sample_rate, 7, 1)
+        layout.addWidget(lbl_bitrate, 8, 0)
+        layout.addWidget(self.cb_bitrate, 8, 1)
+        layout.addWidget(lbl_volume, 9, 0)
+        layout.addWidget(self.cb_volume, 9, 1)
+        layout.addWidget(lbl_loudnorm, 10, 0)
+        layout.addWidget(loudnorm_row, 10, 1)
+        layout.addWidget(QLabel(""), 11, 0)
+        layout.addWidget(self.cb_stream_copy, 11, 1)
+        layout.addWidget(lbl_conc, 12, 0)
+        layout.addWidget(self.sp_concurrency, 12, 1)
 
     def _on_filter_changed(self, text: str) -> None:
         self.ed_custom_filter.setVisible(text == "自定义...")
 
+    def _on_output_formats_changed(self, text: str) -> None:
+        # 多格式输出时各格式使用推荐编码器，单一格式的选项不再生效
+        multi = bool(text.strip())
+        self.cb_format.setEnabled(not multi)
+        self.cb_codec.setEnabled(not multi)
+
+    def _on_loudnorm_toggled(self, checked: bool) -> None:
+        self.sp_loudnorm_i.setEnabled(checked)
+        self.cb_volume.setEnabled(not checked)
+
     def get_params(self) -> dict:
         out_ext = self.cb_format.currentText().strip().lower()
         filter_text = self.cb_input_filter.currentText().strip()
@@ -181,13 +233,18 @@ class AudioConvertToolWidget(QWidget):
 
         return {
             "output_format": out_ext,
+            "output_formats": self.ed_output_formats.text().strip(),
             "audio_codec": str(self.cb_codec.currentData() or ""),
             "channels": int(self.cb_channels.currentData() or 0),
             "bitrate_kbps": int(self.cb_bitrate.currentData() or 0),
             "sample_rate_hz": int(self.cb_sample_rate.currentData() or 0),
             "volume_db": str(self.cb_volume.currentData() or ""),
+            "loudnorm": self.cb_loudnorm.isChecked(),
+            "loudnorm_i": float(self.sp_loudnorm_i.value()),
             "cut_start": self.ed_cut_start.text().strip(),
             "cut_end": self.ed_cut_end.text().strip(),
+            "cut_accuracy": "accurate" if self.cb_cut_accurate.isChecked() else "fast",
+            "stream_copy": self.cb_stream_copy.isChecked(),
             "concurrency": int(self.sp_concurrency.value()),
             "input_filter_mode": input_filter_mode,
             "input_filter_custom": self.ed_custom_filter.text().strip(),
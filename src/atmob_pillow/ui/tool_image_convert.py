@@ -46,9 +46,17 @@ class ImageConvertToolWidget(QWidget):
         # 并发数
         lbl_conc = QLabel("并发数")
         self.sp_concurrency = QSpinBox()
-        self.sp_concurrency.setRange(1, 32)
+        self.sp_concurrency.setRange(0, 128)
+        # 0 显示为“自动”：按吞吐自动加减并发数
+        self.sp_concurrency.setSpecialValueText("自动")
         self.sp_concurrency.setValue(1)
 
+        # 并发方式：线程 / 进程（进程可绕开 GIL，编码密集时更快）
+        lbl_backend = QLabel("并发方式")
+        self.cb_backend = QComboBox()
+        self.cb_backend.addItem("线程", "thread")
+        self.cb_backend.addItem("进程", "process")
+
         layout.addWidget(lbl_filter, 0, 0)
         layout.addWidget(self.cb_input_filter, 0, 1)
         layout.addWidget(QLabel(""), 1, 0)
@@ -60,6 +68,8 @@ class ImageConvertToolWidget(QWidget):
         layout.addWidget(self.sp_quality, 3, 1)
         layout.addWidget(lbl_conc, 4, 0)
         layout.addWidget(self.sp_concurrency, 4, 1)
+        layout.addWidget(lbl_backend, 5, 0)
+        layout.addWidget(self.cb_backend, 5, 1)
 
     def _on_filter_changed(self, text: str) -> None:
         self.ed_custom_filter.setVisible(text == "自定义...")
@@ -82,4 +92,5 @@ class ImageConvertToolWidget(QWidget):
             "output_format": out_fmt,
             "quality": int(self.sp_quality.value()),
             "concurrency": int(self.sp_concurrency.value()),
+            "backend": str(self.cb_backend.currentData() or "thread"),
         }
@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+from PySide6.QtWidgets import (
+    QComboBox,
+    QGridLayout,
+    QLabel,
+    QLineEdit,
+    QSpinBox,
+    QWidget,
+)
+
+
+class ImageRenditionsToolWidget(QWidget):
+    def __init__(self, parent=None) -> None:
+        super().__init__(parent)
+
+        layout = QGridLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.setHorizontalSpacing(10)
+        layout.setVerticalSpacing(10)
+
+        layout.addWidget(QLabel("每张图只解码一次，按多组规格输出（从大到小逐级缩小）。"), 0, 0, 1, 2)
+
+        # 规格：最长边:格式[:质量]，逗号分隔
+        lbl_spec = QLabel("输出规格")
+        self.ed_renditions = QLineEdit("1080:webp:85,512:jpg:80,128:png:90")
+        self.ed_renditions.setPlaceholderText("最长边:格式[:质量]，例如 1080:webp:85,512:jpg:80,128:png")
+
+        lbl_mode = QLabel("速度/质量")
+        self.cb_resize_mode = QComboBox()
+        self.cb_resize_mode.addItem("质量优先（完整解码）", "quality")
+        self.cb_resize_mode.addItem("均衡（JPEG 缩小解码 + 预缩小）", "balanced")
+        self.cb_resize_mode.addItem("速度优先（缩略图）", "fast")
+
+        lbl_conc = QLabel("并发数")
+        self.sp_concurrency = QSpinBox()
+        self.sp_concurrency.setRange(0, 128)
+        # 0 显示为“自动”：按吞吐自动加减并发数
+        self.sp_concurrency.setSpecialValueText("自动")
+        self.sp_concurrency.setValue(1)
+
+        lbl_backend = QLabel("并发方式")
+        self.cb_backend = QComboBox()
+        self.cb_backend.addItem("线程", "thread")
+        self.cb_backend.addItem("进程", "process")
+
+        layout.addWidget(lbl_spec, 1, 0)
+        layout.addWidget(self.ed_renditions, 1, 1)
+        layout.addWidget(lbl_mode, 2, 0)
+        layout.addWidget(self.cb_resize_mode, 2, 1)
+        layout.addWidget(lbl_conc, 3, 0)
+        layout.addWidget(self.sp_concurrency, 3, 1)
+        layout.addWidget(lbl_backend, 4, 0)
+        layout.addWidget(self.cb_backend, 4, 1)
+
+    def get_params(self) -> dict:
+        return {
+            "renditions": self.ed_renditions.text().strip(),
+            "resize_mode": str(self.cb_resize_mode.currentData() or "quality"),
+            "concurrency": int(self.sp_concurrency.value()),
+            "backend": str(self.cb_backend.currentData() or "thread"),
+        }
@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from PySide6.QtWidgets import QGridLayout, QLabel, QSpinBox, QWidget
+from PySide6.QtWidgets import QComboBox, QGridLayout, QLabel, QSpinBox, QWidget
 
 
 class ImageResizeToolWidget(QWidget):
@@ -27,16 +27,38 @@ class ImageResizeToolWidget(QWidget):
         self.sp_quality.setRange(1, 100)
         self.sp_quality.setValue(100)
 
+        # 速度/质量预设（见 processor.RESIZE_PRESETS）
+        lbl_mode = QLabel("速度/质量")
+        self.cb_resize_mode = QComboBox()
+        self.cb_resize_mode.addItem("质量优先（完整解码）", "quality")
+        self.cb_resize_mode.addItem("均衡（JPEG 缩小解码 + 预缩小）", "balanced")
+        self.cb_resize_mode.addItem("速度优先（缩略图）", "fast")
+
+        lbl_resample = QLabel("重采样")
+        self.cb_resample = QComboBox()
+        self.cb_resample.addItem("跟随预设", "")
+        self.cb_resample.addItem("LANCZOS", "lanczos")
+        self.cb_resample.addItem("BICUBIC", "bicubic")
+        self.cb_resample.addItem("BILINEAR", "bilinear")
+        self.cb_resample.addItem("BOX", "box")
+        self.cb_resample.addItem("NEAREST", "nearest")
+
         layout.addWidget(lbl_w, 0, 0)
         layout.addWidget(self.sp_width, 0, 1)
         layout.addWidget(lbl_h, 1, 0)
         layout.addWidget(self.sp_height, 1, 1)
         layout.addWidget(lbl_q, 2, 0)
         layout.addWidget(self.sp_quality, 2, 1)
+        layout.addWidget(lbl_mode, 3, 0)
+        layout.addWidget(self.cb_resize_mode, 3, 1)
+        layout.addWidget(lbl_resample, 4, 0)
+        layout.addWidget(self.cb_resample, 4, 1)
 
     def get_params(self) -> dict:
         return {
             "target_w": int(self.sp_width.value()),
             "target_h": int(self.sp_height.value()),
             "quality": int(self.sp_quality.value()),
+            "resize_mode": str(self.cb_resize_mode.currentData() or "quality"),
+            "resample": str(self.cb_resample.currentData() or ""),
         }
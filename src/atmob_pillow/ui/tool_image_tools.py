@@ -13,12 +13,14 @@ from PySide6.QtWidgets import (
     QLabel,
     QLineEdit,
     QPushButton,
+    QSpinBox,
     QStackedWidget,
     QVBoxLayout,
     QWidget,
 )
 
 from .tool_image_convert import ImageConvertToolWidget
+from .tool_image_renditions import ImageRenditionsToolWidget
 from .tool_image_resize import ImageResizeToolWidget
 
 
@@ -67,12 +69,46 @@ class ImageToolsWidget(QWidget):
         # 功能
         lbl_func = QLabel("功能")
         self.cb_func = QComboBox()
-        self.cb_func.addItems(["尺寸调整", "格式转换", "尺寸调整+格式转换"])
+        self.cb_func.addItems(["尺寸调整", "格式转换", "尺寸调整+格式转换", "多规格输出"])
+
+        # 编码速度/体积预设（见 processor.ENCODER_PROFILES）：PNG optimize 往往是整批最慢的一步
+        lbl_encoder = QLabel("编码配置")
+        self.cb_encoder = QComboBox()
+        for profile, text in (
+            ("default", "默认（原行为）"),
+            ("fastest", "最快（体积稍大）"),
+            ("balanced", "均衡（体积略大，快数倍）"),
+            ("smallest", "最小（最慢）"),
+        ):
+            self.cb_encoder.addItem(text, profile)
+
+        # 内存预算：在途图片解码后的预计占用之和不超过该值，超大图自动少并发（见 engine.iter_results）
+        lbl_memory = QLabel("内存预算")
+        self.sp_memory_budget = QSpinBox()
+        self.sp_memory_budget.setRange(0, 1024 * 1024)
+        self.sp_memory_budget.setSingleStep(512)
+        self.sp_memory_budget.setSuffix(" MB")
+        self.sp_memory_budget.setSpecialValueText("自动（物理内存的一半）")
+        self.sp_memory_budget.setValue(0)
+
+        # 预读：输入在 NAS / 网络共享上时提前把后面的文件读进内存，计算不再等 IO
+        lbl_prefetch = QLabel("预读")
+        self.sp_prefetch = QSpinBox()
+        self.sp_prefetch.setRange(0, 64)
+        self.sp_prefetch.setSuffix(" 个文件")
+        self.sp_prefetch.setSpecialValueText("关闭（输入在本机磁盘时无需开启）")
+        self.sp_prefetch.setValue(0)
+
+        # 分阶段流水线：解码 / 缩放 / 编码各用自己的 worker，编码慢时只给编码加（见 pipeline）
+        lbl_pipeline = QLabel("流水线")
+        self.ed_pipeline = QLineEdit()
+        self.ed_pipeline.setPlaceholderText("留空不分段；例如 decode=1,transform=1,encode=3（可加 :process）")
 
         # 子参数页：
         # 0 尺寸调整
         # 1 格式转换
         # 2 组合（同时显示两套参数）
+        # 3 多规格输出
         self.stack = QStackedWidget()
 
         # 注意：同一个 QWidget 不能同时被 addWidget 到两个父布局中。
@@ -105,6 +141,9 @@ class ImageToolsWidget(QWidget):
         self.stack.addWidget(self.page_convert_single)
         self.stack.addWidget(self.page_combo)
 
+        self.page_renditions = ImageRenditionsToolWidget()
+        self.stack.addWidget(self.page_renditions)
+
         # 单文件区域
         self.gb_single = QGroupBox("单文件")
         single_layout = QVBoxLayout(self.gb_single)
@@ -144,8 +183,16 @@ class ImageToolsWidget(QWidget):
         layout.addWidget(self.cb_mode, 0, 1)
         layout.addWidget(lbl_func, 1, 0)
         layout.addWidget(self.cb_func, 1, 1)
-        layout.addWidget(self.stack, 2, 0, 1, 2)
-        layout.addWidget(self.gb_single, 3, 0, 1, 2)
+        layout.addWidget(lbl_encoder, 2, 0)
+        layout.addWidget(self.cb_encoder, 2, 1)
+        layout.addWidget(lbl_memory, 3, 0)
+        layout.addWidget(self.sp_memory_budget, 3, 1)
+        layout.addWidget(lbl_prefetch, 4, 0)
+        layout.addWidget(self.sp_prefetch, 4, 1)
+        layout.addWidget(lbl_pipeline, 5, 0)
+        layout.addWidget(self.ed_pipeline, 5, 1)
+        layout.addWidget(self.stack, 6, 0, 1, 2)
+        layout.addWidget(self.gb_single, 7, 0, 1, 2)
 
         self.cb_func.currentIndexChanged.connect(self.stack.setCurrentIndex)
         self.cb_mode.currentIndexChanged.connect(self._sync_mode)
@@ -179,6 +226,8 @@ class ImageToolsWidget(QWidget):
             return "image.resize"
         if text == "格式转换":
             return "image.convert"
+        if text == "多规格输出":
+            return "image.renditions"
         return "image.resize_convert"
 
     def get_params(self) -> dict:
@@ -188,6 +237,8 @@ class ImageToolsWidget(QWidget):
             base = self.page_resize_single.get_params()
         elif active == "image.convert":
             base = self.page_convert_single.get_params()
+        elif active == "image.renditions":
+            base = self.page_renditions.get_params()
         else:
             base = {}
             base.update(self.page_resize_combo.get_params())
@@ -206,6 +257,10 @@ class ImageToolsWidget(QWidget):
                 "single_file": single_file,
                 "single_out_dir": out_dir,
                 "open_out_dir": bool(self.cb_open_out.isChecked()),
+                "encoder_profile": self.cb_encoder.currentData() or "default",
+                "memory_budget_mb": int(self.sp_memory_budget.value()),
+                "prefetch": int(self.sp_prefetch.value()),
+                "pipeline": self.ed_pipeline.text().strip(),
             }
         )
         return base
@@ -3,7 +3,9 @@ from __future__ import annotations
 from PySide6.QtWidgets import (
     QCheckBox,
     QComboBox,
+    QDoubleSpinBox,
     QGridLayout,
+    QHBoxLayout,
     QLabel,
     QSpinBox,
     QWidget,
@@ -23,21 +25,51 @@ class MidiToXmlToolWidget(QWidget):
 
         lbl_conc = QLabel("并发数")
         self.sp_concurrency = QSpinBox()
-        self.sp_concurrency.setRange(1, 32)
+        self.sp_concurrency.setRange(0, 128)
+        # 0 显示为“自动”：按吞吐自动加减并发数
+        self.sp_concurrency.setSpecialValueText("自动")
         self.sp_concurrency.setValue(1)
 
+        # music21 是纯 Python，线程并发受 GIL 限制，默认用进程
+        lbl_backend = QLabel("并发方式")
+        self.cb_backend = QComboBox()
+        self.cb_backend.addItem("进程", "process")
+        self.cb_backend.addItem("线程", "thread")
+
         lbl_quant = QLabel("量化")
         self.cb_quantize_mode = QComboBox()
         self.cb_quantize_mode.addItems(["不量化", "自动量化", "八分音符", "十六分音符", "三十二分音符"])
         self.cb_quantize_mode.setCurrentText("自动量化")
 
-        self.cb_remove_tiny_rests = QCheckBox("去除小休止符")
+        # 短于阈值（四分音符 = 1）的休止符并入前一个音
+        rests_row = QWidget()
+        rests_row_layout = QHBoxLayout(rests_row)
+        rests_row_layout.setContentsMargins(0, 0, 0, 0)
+        self.cb_remove_tiny_rests = QCheckBox("去除小休止符，短于")
+        self.sp_tiny_rest_threshold = QDoubleSpinBox()
+        self.sp_tiny_rest_threshold.setRange(0.0, 4.0)
+        self.sp_tiny_rest_threshold.setDecimals(3)
+        self.sp_tiny_rest_threshold.setSingleStep(0.125)
+        self.sp_tiny_rest_threshold.setSuffix(" 拍")
+        self.sp_tiny_rest_threshold.setValue(0.125)
+        self.sp_tiny_rest_threshold.setEnabled(False)
+        self.cb_remove_tiny_rests.toggled.connect(self.sp_tiny_rest_threshold.setEnabled)
+        rests_row_layout.addWidget(self.cb_remove_tiny_rests)
+        rests_row_layout.addWidget(self.sp_tiny_rest_threshold)
+        rests_row_layout.addStretch(1)
+
+        # 按网格量化时，简单文件直接解析并写出，不经 music21
+        self.cb_fast_path = QCheckBox("快速转换（按网格量化的简单文件不经 music21）")
+        self.cb_fast_path.setChecked(True)
 
         layout.addWidget(lbl_conc, 1, 0)
         layout.addWidget(self.sp_concurrency, 1, 1)
-        layout.addWidget(lbl_quant, 2, 0)
-        layout.addWidget(self.cb_quantize_mode, 2, 1)
-        layout.addWidget(self.cb_remove_tiny_rests, 3, 0, 1, 2)
+        layout.addWidget(lbl_backend, 2, 0)
+        layout.addWidget(self.cb_backend, 2, 1)
+        layout.addWidget(lbl_quant, 3, 0)
+        layout.addWidget(self.cb_quantize_mode, 3, 1)
+        layout.addWidget(rests_row, 4, 0, 1, 2)
+        layout.addWidget(self.cb_fast_path, 5, 0, 1, 2)
 
     def get_params(self) -> dict:
         mode_text = self.cb_quantize_mode.currentText().strip()
@@ -54,6 +86,9 @@ class MidiToXmlToolWidget(QWidget):
 
         return {
             "concurrency": int(self.sp_concurrency.value()),
+            "backend": str(self.cb_backend.currentData() or "process"),
             "quantize_mode": quantize_mode,
             "remove_tiny_rests": bool(self.cb_remove_tiny_rests.isChecked()),
+            "tiny_rest_threshold": float(self.sp_tiny_rest_threshold.value()),
+            "fast_path": bool(self.cb_fast_path.isChecked()),
         }
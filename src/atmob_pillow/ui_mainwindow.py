@@ -1,10 +1,14 @@
 from __future__ import annotations
 
+import importlib
+from collections import deque
 from pathlib import Path
+from typing import TYPE_CHECKING
 
 from PySide6.QtCore import Qt
 from PySide6.QtGui import QFont
 from PySide6.QtWidgets import (
+    QCheckBox,
     QFileDialog,
     QGroupBox,
     QHBoxLayout,
@@ -23,11 +27,18 @@ from PySide6.QtWidgets import (
 )
 
 from .tasks.registry import list_task_infos
-from .ui.tool_audio_convert import AudioConvertToolWidget
-from .ui.tool_image_tools import ImageToolsWidget
-from .ui.tool_midi_to_xml import MidiToXmlToolWidget
 from .utils_open import open_folder
-from .worker import Worker
+
+if TYPE_CHECKING:
+    from .worker import Worker
+
+
+# 参数页按需构建：首次选中对应工具时才 import 并创建（Worker / 引擎在首次开始处理时才 import）
+TOOL_PAGES: dict[str, tuple[str, str]] = {
+    "image.tools": ("ui.tool_image_tools", "ImageToolsWidget"),
+    "audio.convert": ("ui.tool_audio_convert", "AudioConvertToolWidget"),
+    "midi.to_xml": ("ui.tool_midi_to_xml", "MidiToXmlToolWidget"),
+}
 
 
 APP_QSS = """
@@ -107,6 +118,15 @@ QListWidget::item:selected {
 """
 
 
+# 日志区最多保留的行数（环形缓冲，超出后丢弃最早的行）
+LOG_MAX_LINES = 5000
+
+
+def _is_failure_line(line: str) -> bool:
+    # “仅显示失败”时隐藏逐个文件的成功/跳过记录，其余（失败、提示、汇总）照常显示
+    return not line.startswith(("成功", "跳过"))
+
+
 class MainWindow(QMainWindow):
     def __init__(self) -> None:
         super().__init__()
@@ -117,7 +137,7 @@ class MainWindow(QMainWindow):
 
         self._task_infos = list_task_infos()
         self._task_id_by_row: list[str] = []
-        self._page_index_by_task_id: dict[str, int] = {}
+        self._pages: dict[str, QWidget] = {}
 
         root = QWidget(self)
         self.setCentralWidget(root)
@@ -193,8 +213,14 @@ class MainWindow(QMainWindow):
         row_out_layout.addWidget(self.btn_pick_output)
         row_out_layout.addWidget(self.ed_output, 1)
 
+        self.cb_recursive = QCheckBox("包含子文件夹（输出保持相同的目录结构）")
+        self.cb_incremental = QCheckBox("增量处理（跳过未变化的文件；参数变化或输出不完整时重新生成）")
+        self.cb_incremental.setChecked(True)
+
         col1_layout.addWidget(row_in)
         col1_layout.addWidget(row_out)
+        col1_layout.addWidget(self.cb_recursive)
+        col1_layout.addWidget(self.cb_incremental)
 
         io_layout.addWidget(col1, 1)
         right_layout.addWidget(gb_io)
@@ -205,24 +231,10 @@ class MainWindow(QMainWindow):
         params_outer.setContentsMargins(14, 16, 14, 14)
         params_outer.setSpacing(10)
 
+        # 页面：图片工具（内部再切换 尺寸/转换 + 批量/单文件）、音频、MIDI，见 TOOL_PAGES
         self.params_stack = QStackedWidget()
         params_outer.addWidget(self.params_stack)
 
-        # 页面：图片工具（内部再切换 尺寸/转换 + 批量/单文件）
-        self.image_tools_widget = ImageToolsWidget()
-        idx_img_tools = self.params_stack.addWidget(self.image_tools_widget)
-        self._page_index_by_task_id["image.tools"] = idx_img_tools
-
-        # 页面：音频
-        self.audio_convert_widget = AudioConvertToolWidget()
-        idx_audio = self.params_stack.addWidget(self.audio_convert_widget)
-        self._page_index_by_task_id["audio.convert"] = idx_audio
-
-        # 页面：MIDI
-        self.midi_to_xml_widget = MidiToXmlToolWidget()
-        idx_midi = self.params_stack.addWidget(self.midi_to_xml_widget)
-        self._page_index_by_task_id["midi.to_xml"] = idx_midi
-
         right_layout.addWidget(self.gb_params)
 
         # 控制
@@ -232,8 +244,16 @@ class MainWindow(QMainWindow):
         self.btn_start = QPushButton("开始")
         self.btn_start.setObjectName("StartButton")
         self.btn_start.setMinimumHeight(36)
+        self.btn_pause = QPushButton("暂停")
+        self.btn_pause.setMinimumHeight(36)
+        self.btn_pause.setEnabled(False)
+        self.btn_stop = QPushButton("停止")
+        self.btn_stop.setMinimumHeight(36)
+        self.btn_stop.setEnabled(False)
         ctrl_layout.addStretch(1)
         ctrl_layout.addWidget(self.btn_start)
+        ctrl_layout.addWidget(self.btn_pause)
+        ctrl_layout.addWidget(self.btn_stop)
         ctrl_layout.addStretch(1)
         right_layout.addWidget(gb_ctrl)
 
@@ -250,8 +270,13 @@ class MainWindow(QMainWindow):
 
         self.log = QPlainTextEdit()
         self.log.setReadOnly(True)
+        self.log.setMaximumBlockCount(LOG_MAX_LINES)
+        self._log_lines: deque[str] = deque(maxlen=LOG_MAX_LINES)
+
+        self.cb_only_failures = QCheckBox("仅显示失败")
 
         status_layout.addWidget(self.progress)
+        status_layout.addWidget(self.cb_only_failures)
         status_layout.addWidget(self.log, 1)
 
         right_layout.addWidget(gb_status, 1)
@@ -279,8 +304,23 @@ class MainWindow(QMainWindow):
         self.btn_pick_input.clicked.connect(self.pick_input_dir)
         self.btn_pick_output.clicked.connect(self.pick_output_dir)
         self.btn_start.clicked.connect(self.start_work)
+        self.btn_pause.clicked.connect(self.toggle_pause)
+        self.btn_stop.clicked.connect(self.stop_work)
+        self.cb_only_failures.toggled.connect(lambda _: self._refilter_log())
         self.list_tools.currentRowChanged.connect(lambda _: self._sync_params_page())
 
+    def closeEvent(self, event) -> None:
+        # 关闭窗口时立即终止正在运行的批处理，避免后台线程 / ffmpeg 残留
+        if self._worker and self._worker.isRunning():
+            self._worker.cancel(force=True)
+            self._worker.wait(5000)
+        # 常驻进程池（music21 等）随窗口一起退出；没有开始过处理就没有进程池，也无需 import 引擎
+        if self._worker is not None:
+            from .engine import shutdown_worker_pools
+
+            shutdown_worker_pools()
+        super().closeEvent(event)
+
     def apply_style(self) -> None:
         self.setStyleSheet(APP_QSS)
 
@@ -295,7 +335,28 @@ class MainWindow(QMainWindow):
             self.ed_output.setText(path)
 
     def _append_log(self, text: str) -> None:
-        self.log.appendPlainText(text)
+        self._append_logs([text])
+
+    def _append_logs(self, lines: list[str]) -> None:
+        # Worker 按时间批量发送：一次 appendPlainText + 一次滚动
+        self._log_lines.extend(lines)
+        if self.cb_only_failures.isChecked():
+            lines = [line for line in lines if _is_failure_line(line)]
+        if not lines:
+            return
+        self.log.appendPlainText("\n".join(lines))
+        sb = self.log.verticalScrollBar()
+        sb.setValue(sb.maximum())
+
+    def _clear_log(self) -> None:
+        self._log_lines.clear()
+        self.log.clear()
+
+    def _refilter_log(self) -> None:
+        lines = list(self._log_lines)
+        if self.cb_only_failures.isChecked():
+            lines = [line for line in lines if _is_failure_line(line)]
+        self.log.setPlainText("\n".join(lines))
         sb = self.log.verticalScrollBar()
         sb.setValue(sb.maximum())
 
@@ -305,11 +366,20 @@ class MainWindow(QMainWindow):
             return self._task_id_by_row[row]
         return ""
 
+    def _page(self, task_id: str):
+        page = self._pages.get(task_id)
+        if page is None and task_id in TOOL_PAGES:
+            module_name, class_name = TOOL_PAGES[task_id]
+            module = importlib.import_module(f"{__package__}.{module_name}")
+            page = getattr(module, class_name)()
+            self.params_stack.addWidget(page)
+            self._pages[task_id] = page
+        return page
+
     def _sync_params_page(self) -> None:
-        task_id = self._current_task_id()
-        idx = self._page_index_by_task_id.get(task_id)
-        if idx is not None:
-            self.params_stack.setCurrentIndex(idx)
+        page = self._page(self._current_task_id())
+        if page is not None:
+            self.params_stack.setCurrentWidget(page)
 
     def start_work(self) -> None:
         if self._worker and self._worker.isRunning():
@@ -326,8 +396,9 @@ class MainWindow(QMainWindow):
         batch_output_dir = self.ed_output.text().strip() or str(Path.cwd())
 
         if tool_id == "image.tools":
-            params = self.image_tools_widget.get_params()
-            active_task_id = self.image_tools_widget.get_active_task_id()
+            page = self._page("image.tools")
+            params = page.get_params()
+            active_task_id = page.get_active_task_id()
             params["active_task_id"] = active_task_id
 
             mode = (params.get("image_mode") or "batch").lower()
@@ -352,7 +423,7 @@ class MainWindow(QMainWindow):
                     QMessageBox.warning(self, "提示", "请至少设置宽度或高度其中一个（0 表示不限制）。")
                     return
 
-            self.log.clear()
+            self._clear_log()
             self._append_log("工具: 图片工具")
             self._append_log(f"模式: {mode}")
             self._append_log(f"功能: {active_task_id}")
@@ -363,7 +434,7 @@ class MainWindow(QMainWindow):
 
         elif tool_id == "audio.convert":
             task_id = tool_id
-            params = self.audio_convert_widget.get_params()
+            params = self._page("audio.convert").get_params()
 
             if not batch_input_dir:
                 QMessageBox.warning(self, "提示", "请先选择输入文件夹。")
@@ -375,7 +446,7 @@ class MainWindow(QMainWindow):
                 QMessageBox.warning(self, "提示", "剪切需要同时填写开始和结束时间，或两者都留空。")
                 return
 
-            self.log.clear()
+            self._clear_log()
             self._append_log(f"工具: 音频转换")
             self._append_log(f"输入: {batch_input_dir}")
             self._append_log(f"输出: {batch_output_dir}")
@@ -384,13 +455,13 @@ class MainWindow(QMainWindow):
 
         elif tool_id == "midi.to_xml":
             task_id = tool_id
-            params = self.midi_to_xml_widget.get_params()
+            params = self._page("midi.to_xml").get_params()
 
             if not batch_input_dir:
                 QMessageBox.warning(self, "提示", "请先选择输入文件夹。")
                 return
 
-            self.log.clear()
+            self._clear_log()
             self._append_log(f"工具: MIDI 转 MusicXML")
             self._append_log(f"输入: {batch_input_dir}")
             self._append_log(f"输出: {batch_output_dir}")
@@ -401,11 +472,22 @@ class MainWindow(QMainWindow):
             QMessageBox.warning(self, "提示", "未实现的工具。")
             return
 
+        params["recursive"] = bool(self.cb_recursive.isChecked())
+        params["incremental"] = bool(self.cb_incremental.isChecked())
+
         self.btn_start.setEnabled(False)
+        self.btn_pause.setEnabled(True)
+        self.btn_pause.setText("暂停")
+        self.btn_stop.setEnabled(True)
+        self.btn_stop.setText("停止")
         self.btn_pick_input.setEnabled(False)
         self.btn_pick_output.setEnabled(False)
+        self.cb_recursive.setEnabled(False)
+        self.cb_incremental.setEnabled(False)
         self.list_tools.setEnabled(False)
 
+        from .worker import Worker
+
         self._worker = Worker(
             task_id=task_id,
             params=params,
@@ -413,10 +495,36 @@ class MainWindow(QMainWindow):
             output_dir=output_dir,
         )
         self._worker.progress_changed.connect(self.on_progress)
-        self._worker.log.connect(self._append_log)
+        self._worker.log.connect(self._append_logs)
         self._worker.finished_ok.connect(self.on_finished)
         self._worker.start()
 
+    def toggle_pause(self) -> None:
+        if not (self._worker and self._worker.isRunning()):
+            return
+        if self._worker.is_paused():
+            self._worker.resume()
+            self.btn_pause.setText("暂停")
+            self._append_log("继续处理")
+        else:
+            self._worker.pause()
+            self.btn_pause.setText("继续")
+            self._append_log("已暂停：正在处理的文件完成后停止派发，点“继续”从原位置恢复")
+
+    def stop_work(self) -> None:
+        if not (self._worker and self._worker.isRunning()):
+            return
+        # 第一次：不再派发新文件，等待正在处理的完成；再点一次：立即终止（含 ffmpeg 子进程）
+        if self.btn_stop.text() == "停止":
+            self._worker.cancel()
+            self.btn_pause.setEnabled(False)
+            self.btn_stop.setText("强制停止")
+            self._append_log("正在停止：等待正在处理的文件完成（再次点击可立即终止）")
+        else:
+            self._worker.cancel(force=True)
+            self.btn_stop.setEnabled(False)
+            self._append_log("正在强制停止…")
+
     def on_progress(self, processed: int, total: int) -> None:
         if total <= 0:
             self.progress.setRange(0, 1)
@@ -430,14 +538,20 @@ class MainWindow(QMainWindow):
 
     def on_finished(self, output_dir: str) -> None:
         self.btn_start.setEnabled(True)
+        self.btn_pause.setEnabled(False)
+        self.btn_pause.setText("暂停")
+        self.btn_stop.setEnabled(False)
+        self.btn_stop.setText("停止")
         self.btn_pick_input.setEnabled(True)
         self.btn_pick_output.setEnabled(True)
+        self.cb_recursive.setEnabled(True)
+        self.cb_incremental.setEnabled(True)
         self.list_tools.setEnabled(True)
         self._append_log("任务结束")
 
         # 图片工具：完成后可自动打开输出目录
         tool_id = self._current_task_id()
         if tool_id == "image.tools":
-            params = self.image_tools_widget.get_params()
+            params = self._page("image.tools").get_params()
             if params.get("open_out_dir", False):
                 open_folder(output_dir)
@@ -0,0 +1,28 @@
+from __future__ import annotations
+
+import os
+import platform
+from pathlib import Path
+
+
+APP_DIR_NAME = "atmob_pillow"
+
+
+def user_cache_dir() -> Path:
+    """本机缓存目录（跨运行复用的探测结果等），不存在时创建。
+
+    - Windows：%LOCALAPPDATA%\\atmob_pillow
+    - macOS：~/Library/Caches/atmob_pillow
+    - 其它：$XDG_CACHE_HOME/atmob_pillow，默认 ~/.cache/atmob_pillow
+    """
+    system = platform.system().lower()
+    if system == "windows":
+        base = Path(os.environ.get("LOCALAPPDATA") or Path.home() / "AppData" / "Local")
+    elif system == "darwin":
+        base = Path.home() / "Library" / "Caches"
+    else:
+        base = Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache")
+
+    path = base / APP_DIR_NAME
+    path.mkdir(parents=True, exist_ok=True)
+    return path
@@ -0,0 +1,164 @@
+from __future__ import annotations
+
+import itertools
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterable, Iterator
+
+from .tasks.common import TaskResult
+
+
+# 输出写入：图片等 task 只把编码结果留在内存（TaskResult.outputs），由一个小的写入线程池落盘，
+# 计算 worker 不再卡在写目标盘（网络盘、慢盘）上。
+# 所有输出都先写到同目录下的临时文件，写完再 os.replace 成最终文件名：崩溃、取消或写到一半磁盘满
+# 都不会留下半截的输出文件；ffmpeg、music21 这类自己写文件的也走同样的“临时名 + 改名”。
+#
+# fsync 策略：
+# - none：写完即改名，何时落盘交给操作系统（默认，最快）
+# - file：改名前 fsync 文件内容，断电后不会出现“改名已生效但内容是空的”文件
+# - full：再 fsync 所在目录，改名本身也保证落盘（Windows 无目录 fsync，同 file）
+FSYNC_POLICIES = ("none", "file", "full")
+
+# 已编码、等待写盘的数据合计上限（MB）：超过后暂停取新结果，计算端随之停下
+DEFAULT_WRITE_BUFFER_MB = 128
+
+# 同时写盘的文件数
+WRITER_THREADS = 4
+
+_temp_counter = itertools.count()
+
+
+def normalize_fsync(policy) -> str:
+    policy = (policy or "none").strip().lower()
+    return policy if policy in FSYNC_POLICIES else "none"
+
+
+def temp_path(out_path: Path) -> Path:
+    """out_path 同目录下的隐藏临时名（同目录才能原子改名）；保留扩展名，ffmpeg 等仍按扩展名判断格式。"""
+    out_path = Path(out_path)
+    return out_path.with_name(f".{out_path.stem}.{os.getpid()}-{next(_temp_counter)}.tmp{out_path.suffix}")
+
+
+def _fsync_dir(directory: Path) -> None:
+    if os.name != "posix":
+        return
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def discard(tmp: Path) -> None:
+    try:
+        Path(tmp).unlink(missing_ok=True)
+    except OSError:
+        pass
+
+
+def commit(tmp: Path, out_path: Path, fsync: str = "none") -> None:
+    """把外部程序写好的临时文件改名为 out_path。"""
+    if fsync != "none":
+        with open(tmp, "rb+") as f:
+            os.fsync(f.fileno())
+    os.replace(tmp, out_path)
+    if fsync == "full":
+        _fsync_dir(Path(out_path).parent)
+
+
+def write_atomic(out_path: Path, data: bytes, fsync: str = "none") -> None:
+    tmp = temp_path(out_path)
+    try:
+        with open(tmp, "wb") as f:
+            f.write(data)
+            if fsync != "none":
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp, out_path)
+    except BaseException:
+        discard(tmp)
+        raise
+    if fsync == "full":
+        _fsync_dir(Path(out_path).parent)
+
+
+@contextmanager
+def atomic_output(out_path: Path, fsync: str = "none") -> Iterator[Path]:
+    """给只接受路径的写入方（music21）：在 with 内写到产出的临时路径，正常结束后改名为 out_path。"""
+    tmp = temp_path(out_path)
+    try:
+        yield tmp
+        commit(tmp, out_path, fsync)
+    except BaseException:
+        discard(tmp)
+        raise
+
+
+def write_outputs(input_path: Path, result, fsync: str = "none"):
+    """把 result.outputs 写盘（计入 write 阶段）并清空；写失败时返回失败结果。"""
+    outputs = getattr(result, "outputs", None)
+    if not outputs:
+        return result
+    start = time.perf_counter()
+    try:
+        for out_path, data in outputs:
+            write_atomic(out_path, data, fsync)
+    except OSError as e:
+        return TaskResult(
+            False,
+            f"失败: {Path(input_path).name} (写入失败: {e})",
+            None,
+            timings=result.timings,
+            bytes_in=result.bytes_in,
+        )
+    finally:
+        result.timings["write"] = result.timings.get("write", 0.0) + time.perf_counter() - start
+        result.outputs = []
+    return result
+
+
+def write_behind(
+    results: Iterable[tuple[Path, object]],
+    fsync: str = "none",
+    buffer_bytes: int = DEFAULT_WRITE_BUFFER_MB * 1024 * 1024,
+    threads: int = WRITER_THREADS,
+) -> Iterator[tuple[Path, object]]:
+    """把带 outputs 的结果交给写入线程池，写完（已改名为最终文件）后再产出；没有 outputs 的结果直接产出。
+
+    产出顺序为完成顺序。待写数据超过 buffer_bytes 时先等写完再取下一个结果；单个结果超过也照常写。
+    """
+    pool = ThreadPoolExecutor(max_workers=max(1, int(threads)), thread_name_prefix="writer")
+    pending: dict[Future, int] = {}  # 写入中的结果 -> 待写字节数
+    held = 0
+
+    def finished(block: bool) -> Iterator[tuple[Path, object]]:
+        nonlocal held
+        done, _ = wait(list(pending), timeout=None if block else 0, return_when=FIRST_COMPLETED)
+        for fut in done:
+            held -= pending.pop(fut)
+            yield fut.result()
+
+    def write(p: Path, result) -> tuple[Path, object]:
+        return p, write_outputs(p, result, fsync)
+
+    try:
+        for p, result in results:
+            outputs = getattr(result, "outputs", None)
+            if outputs:
+                size = sum(len(data) for _, data in outputs)
+                pending[pool.submit(write, p, result)] = size
+                held += size
+            else:
+                yield p, result
+            if pending:
+                yield from finished(block=False)
+            while pending and held > buffer_bytes:
+                yield from finished(block=True)
+        while pending:
+            yield from finished(block=True)
+    finally:
+        # 已编码的结果即使整批被中断也写完，不丢已完成的工作
+        pool.shutdown(wait=True)